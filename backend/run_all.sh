@@ -8,7 +8,9 @@ export VIDGO_URL="${VIDGO_URL:-https://vidgo.cemp.top}"
 
 # 你的项目用的是 vid_go.settings -> 对应的 WSGI 入口如下
 APP_MODULE="vid_go.wsgi:application"
-LOG="./logs/gunicorn_$(date +%Y%m%d_%H%M%S).log"
+# VIDGO_SERVER=asgi：改用 uvicorn 运行 vid_go.asgi，媒体/下载走异步流式视图，慢客户端不占线程
+VIDGO_SERVER="${VIDGO_SERVER:-wsgi}"
+LOG="./logs/${VIDGO_SERVER}_$(date +%Y%m%d_%H%M%S).log"
 
 echo "Using $(python -V) at $(which python)"
 
@@ -24,14 +26,24 @@ fi
 # - I/O 密集型任务（下载、FFmpeg）不受 GIL 影响
 # - 内存占用更低
 # - 线程池提供并发能力（apps.py 中配置）
-nohup python -m gunicorn "$APP_MODULE" \
-  --bind "0.0.0.0:${PORT}" \
-  --workers 1 \
-  --threads "$(( 2*$(nproc) + 1 ))" \
-  --worker-class gthread \
-  --timeout 300 \
-  --access-logfile - --log-level info \
-  >> "$LOG" 2>&1 & PID=$!
+if [ "$VIDGO_SERVER" = "asgi" ]; then
+  # 单进程事件循环，同步视图仍在线程池中执行（与 gthread 一样共享进程内状态）
+  nohup python -m uvicorn vid_go.asgi:application \
+    --host 0.0.0.0 --port "${PORT}" \
+    --workers 1 \
+    --timeout-keep-alive 30 \
+    --log-level info \
+    >> "$LOG" 2>&1 & PID=$!
+else
+  nohup python -m gunicorn "$APP_MODULE" \
+    --bind "0.0.0.0:${PORT}" \
+    --workers 1 \
+    --threads "$(( 2*$(nproc) + 1 ))" \
+    --worker-class gthread \
+    --timeout 300 \
+    --access-logfile - --log-level info \
+    >> "$LOG" 2>&1 & PID=$!
+fi
 
 echo "PID=$PID"
 echo "Local:   http://localhost:${PORT}/"
@@ -1,15 +1,35 @@
 import json
+import math
+import struct
 import subprocess
 import numpy as np
 import os
-from typing import List, Tuple, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Waveform pyramid: min/max pairs quantized to int8, one level per zoom step.
+# Level 0 holds PYRAMID_BASE_BINS_PER_SECOND bins per second, each next level halves it, down to
+# about PYRAMID_MIN_BINS bins for the whole file. On disk (<name>.peaks.bin):
+#   PYRAMID_MAGIC | uint32 header length | JSON header | level 0 | level 1 | ...
+# each level being `count` interleaved (min, max) int8 pairs, value / 127 = amplitude.
+PYRAMID_MAGIC = b'VGWF'
+PYRAMID_VERSION = 1
+PYRAMID_BASE_BINS_PER_SECOND = 100
+PYRAMID_MIN_BINS = 512
+PYRAMID_MAX_WIDTH = 20000
+
+# Decoding rate relative to the peak rate, and how many decoded samples are reduced at a time at
+# least. Chunks are rounded to a common multiple of the windows (999,900 samples, 4 MB, for the
+# 99/100/101 peak windows): decoding memory stays a few chunks, whatever the duration
+DECODE_RATE_FACTOR = 100
+CHUNK_SAMPLES = 1 << 16
 
 
 def generate_waveform_peaks(
     audio_path: str,
     output_path: Optional[str] = None,
     samples_per_second: int = 20,
-    bit_depth: int = 16
+    bit_depth: int = 16,
+    pyramid_path: Optional[str] = None
 ) -> List[float]:
     """
     Generate waveform peak data for audio files for frontend visualization
@@ -19,13 +39,15 @@ def generate_waveform_peaks(
         output_path: Optional JSON output file path, auto-generated if not provided
         samples_per_second: Samples per second (controls waveform precision)
         bit_depth: Audio bit depth
+        pyramid_path: Optional min/max pyramid output path (.peaks.bin), written from the same
+            decoded audio; defaults to output_path with .json replaced by .bin
 
     Returns:
         List[float]: Peak data array, each value in range [-1.0, 1.0]
 
     Raises:
         FileNotFoundError: Audio file does not exist
-        subprocess.CalledProcessError: FFmpeg processing failed
+        RuntimeError: FFmpeg processing failed
     """
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
@@ -42,12 +64,23 @@ def generate_waveform_peaks(
     if duration <= 0:
         raise ValueError(f"Invalid audio duration: {duration}")
     
-    # Extract audio data using FFmpeg
-    raw_audio_data = _extract_audio_data(audio_path, samples_per_second)
-    
-    # Calculate peak data
-    peaks = _calculate_peaks(raw_audio_data, samples_per_second, duration)
-    
+    # Decode with FFmpeg and reduce chunk by chunk. The peak window depends on the number of
+    # decoded samples, known only at the end, and the decoded audio is often a little shorter
+    # or longer than the probed duration: one pass computes the peaks for every window within
+    # one of the expected one (a length difference of up to ~1%) and keeps the right one.
+    # Only a decode further off than that needs a second pass.
+    sample_rate = samples_per_second * DECODE_RATE_FACTOR
+    pyramid_window = max(1, sample_rate // PYRAMID_BASE_BINS_PER_SECOND)
+    expected = _samples_per_peak(int(round(duration * sample_rate)), samples_per_second, duration)
+    candidates = sorted({max(1, expected - 1), expected, expected + 1})
+    peaks_by_window, base_pairs, total_samples = _stream_peaks(audio_path, sample_rate, candidates, pyramid_window)
+    window = _samples_per_peak(total_samples, samples_per_second, duration)
+    if window in peaks_by_window:
+        peaks = peaks_by_window[window]
+    else:
+        peaks_by_window, _, _ = _stream_peaks(audio_path, sample_rate, [window])
+        peaks = peaks_by_window[window]
+
     # Save peak data to JSON file
     peak_data = {
         "version": "1.0",
@@ -59,12 +92,135 @@ def generate_waveform_peaks(
     }
     
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(peak_data, f, indent=2)
-    
+        json.dump(peak_data, f, separators=(',', ':'))
+
+    if pyramid_path is None:
+        pyramid_path = pyramid_path_for(output_path)
+    write_pyramid(pyramid_path, build_pyramid(base_pairs, sample_rate / pyramid_window),
+                  duration, os.path.basename(audio_path))
+
     print(f"Waveform peaks generated: {output_path}")
     return peaks
 
 
+def pyramid_path_for(peaks_path: str) -> str:
+    """<name>.peaks.json -> <name>.peaks.bin"""
+    return f"{os.path.splitext(peaks_path)[0]}.bin"
+
+
+def _quantize(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(values * 127.0), -127, 127).astype(np.int8)
+
+
+def _min_max_pairs(samples: np.ndarray, samples_per_bin: int) -> np.ndarray:
+    """int8 (min, max) of each bin of samples; a short last bin is padded with its last sample"""
+    count = math.ceil(len(samples) / samples_per_bin)
+    if count == 0:
+        return np.zeros((0, 2), dtype=np.int8)
+    # Edge padding never widens the range of the last bin
+    padded = np.pad(samples, (0, count * samples_per_bin - len(samples)), mode='edge')
+    frames = padded.reshape(count, samples_per_bin)
+    return np.stack([_quantize(frames.min(axis=1)), _quantize(frames.max(axis=1))], axis=1)
+
+
+def build_pyramid(base_pairs: np.ndarray, bins_per_second: float) -> List[Tuple[float, np.ndarray]]:
+    """
+    Min/max levels on top of level 0 (`base_pairs`, int8 of shape (count, 2))
+
+    Returns:
+        List of (bins_per_second, pairs) from finest to coarsest, pairs being an int8 array of
+        shape (count, 2) with the min and max of each bin
+    """
+    levels = [(bins_per_second, base_pairs)]
+    # Coarser levels merge neighbouring bins of the level below (exact, quantized once)
+    while len(levels[-1][1]) > PYRAMID_MIN_BINS:
+        pairs = levels[-1][1]
+        if len(pairs) % 2:
+            pairs = np.concatenate([pairs, pairs[-1:]])
+        pairs = pairs.reshape(-1, 2, 2)
+        merged = np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1)
+        bins_per_second /= 2
+        levels.append((bins_per_second, merged))
+    return levels
+
+
+def write_pyramid(path: str, levels: List[Tuple[float, np.ndarray]], duration: float, audio_file: str) -> None:
+    """Write the pyramid file atomically (see PYRAMID_MAGIC for the layout)"""
+    header_levels = []
+    offset = 0
+    for bins_per_second, pairs in levels:
+        header_levels.append({'bins_per_second': bins_per_second, 'count': len(pairs), 'offset': offset})
+        offset += pairs.size
+    header = json.dumps({
+        'version': PYRAMID_VERSION,
+        'audio_file': audio_file,
+        'duration': duration,
+        'levels': header_levels,
+    }, separators=(',', ':')).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PYRAMID_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for _, pairs in levels:
+            f.write(np.ascontiguousarray(pairs, dtype=np.int8).tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_pyramid_header(path: str) -> dict:
+    """Pyramid header with 'data_offset', the file position of level 0"""
+    with open(path, 'rb') as f:
+        if f.read(len(PYRAMID_MAGIC)) != PYRAMID_MAGIC:
+            raise ValueError(f"Not a waveform pyramid: {path}")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length).decode('utf-8'))
+    header['data_offset'] = len(PYRAMID_MAGIC) + 4 + length
+    return header
+
+
+def read_pyramid_range(path: str, start: float, end: Optional[float], width: int) -> dict:
+    """
+    Min/max pairs covering [start, end) seconds at the coarsest level that still has at least
+    `width` bins in that range, so the result holds between width and 2 * width pairs
+    (fewer only when even level 0 is coarser than asked). Reads just that slice from disk.
+
+    Returns:
+        dict with the actual slice bounds, its resolution and 'pairs' (int8 array of shape (n, 2))
+    """
+    header = read_pyramid_header(path)
+    duration = float(header['duration'])
+    start = min(max(0.0, start), duration)
+    end = duration if end is None else min(max(start, end), duration)
+    width = min(max(1, width), PYRAMID_MAX_WIDTH)
+    span = end - start
+
+    levels = header['levels']
+    chosen = 0
+    for index, level in enumerate(levels):
+        if level['bins_per_second'] * span >= width:
+            chosen = index
+        else:
+            break
+    level = levels[chosen]
+    bins_per_second = level['bins_per_second']
+    first = min(int(math.floor(start * bins_per_second)), level['count'])
+    last = min(max(first, int(math.ceil(end * bins_per_second))), level['count'])
+
+    with open(path, 'rb') as f:
+        f.seek(header['data_offset'] + level['offset'] + first * 2)
+        data = f.read((last - first) * 2)
+    return {
+        'duration': duration,
+        'level': chosen,
+        'bins_per_second': bins_per_second,
+        'start': first / bins_per_second,
+        'end': last / bins_per_second,
+        'count': last - first,
+        'pairs': np.frombuffer(data, dtype=np.int8).reshape(-1, 2),
+    }
+
+
 def _get_audio_duration(audio_path: str) -> float:
     """Get audio duration in seconds"""
     cmd = [
@@ -82,68 +238,103 @@ def _get_audio_duration(audio_path: str) -> float:
         raise ValueError(f"Failed to get audio duration: {e}")
 
 
-def _extract_audio_data(audio_path: str, sample_rate: int) -> np.ndarray:
-    """Extract raw audio data using FFmpeg"""
+def _samples_per_peak(total_samples: int, samples_per_second: int, duration: float) -> int:
+    """Decoded samples per peak window: the decoded audio split into duration * rate windows"""
+    target_peaks = int(duration * samples_per_second)
+    return max(1, total_samples // target_peaks if target_peaks > 0 else total_samples)
+
+
+def _chunk_samples(*windows: int) -> int:
+    """Samples per chunk: a whole number of every window, close to CHUNK_SAMPLES or one common multiple"""
+    step = math.lcm(*windows)
+    return step * max(1, CHUNK_SAMPLES // step)
+
+
+def _read_chunks(stream, chunk_samples: int):
+    """Yield float32 arrays of chunk_samples samples (the last one may be shorter) from a raw f32le stream"""
+    chunk_bytes = chunk_samples * 4
+    while True:
+        data = stream.read(chunk_bytes)
+        if not data:
+            return
+        usable = len(data) - len(data) % 4
+        if usable:
+            yield np.frombuffer(data[:usable], dtype=np.float32)
+        if len(data) < chunk_bytes:
+            return
+
+
+def _rms_peaks(samples: np.ndarray, window: int) -> np.ndarray:
+    """RMS of each window of samples, the last window possibly shorter, clamped to [-1.0, 1.0]"""
+    full = len(samples) // window * window
+    rms = np.sqrt(np.mean(samples[:full].reshape(-1, window) ** 2, axis=1))
+    if full < len(samples):
+        tail = samples[full:]
+        rms = np.append(rms, np.sqrt(np.mean(tail ** 2)))
+    return np.clip(rms, -1.0, 1.0)
+
+
+def _reduce_stream(stream, windows: Sequence[int], pyramid_window: Optional[int] = None,
+                   chunk_samples: Optional[int] = None) -> Tuple[Dict[int, List[float]], Optional[np.ndarray], int]:
+    """
+    Peaks for each of `windows` (and level 0 of the pyramid) of a raw mono f32le stream,
+    one chunk at a time
+    Every chunk but the last is a whole number of every window, so no window spans two chunks
+
+    Returns:
+        ({window: peaks}, base_pairs or None, number of samples read)
+    """
+    all_windows = tuple(windows) + ((pyramid_window,) if pyramid_window else ())
+    chunk_samples = chunk_samples or _chunk_samples(*all_windows)
+    if chunk_samples % math.lcm(*all_windows):
+        raise ValueError("chunk_samples must be a multiple of every window")
+
+    peaks: Dict[int, List[np.ndarray]] = {window: [] for window in windows}
+    pairs: List[np.ndarray] = []
+    total_samples = 0
+    for chunk in _read_chunks(stream, chunk_samples):
+        total_samples += len(chunk)
+        for window in windows:
+            peaks[window].append(_rms_peaks(chunk, window))
+        if pyramid_window:
+            pairs.append(_min_max_pairs(chunk, pyramid_window))
+
+    peak_lists = {window: np.concatenate(parts).astype(float).tolist() if parts else []
+                  for window, parts in peaks.items()}
+    base_pairs = None
+    if pyramid_window:
+        base_pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int8)
+    return peak_lists, base_pairs, total_samples
+
+
+def _stream_peaks(audio_path: str, sample_rate: int, windows: Sequence[int],
+                  pyramid_window: Optional[int] = None) -> Tuple[Dict[int, List[float]], Optional[np.ndarray], int]:
+    """Decode audio_path to mono float32 at sample_rate through an FFmpeg pipe and reduce it (see _reduce_stream)"""
     cmd = [
         'ffmpeg',
         '-i', audio_path,
         '-f', 'f32le',  # 32-bit float format
         '-ac', '1',     # Mono channel
-        '-ar', str(sample_rate * 100),  # High sample rate for subsequent downsampling
+        '-ar', str(sample_rate),
         '-'
     ]
-    
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
     try:
-        result = subprocess.run(
-            cmd, 
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            check=True
-        )
-        
-        # Convert byte data to float32 array
-        audio_data = np.frombuffer(result.stdout, dtype=np.float32)
-        return audio_data
-        
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"FFmpeg failed to extract audio data: {e}")
-
-
-def _calculate_peaks(audio_data: np.ndarray, samples_per_second: int, duration: float) -> List[float]:
-    """Calculate peaks from raw audio data"""
-    if len(audio_data) == 0:
-        return []
-    
-    # Calculate audio samples per peak point
-    total_samples = len(audio_data)
-    target_peaks = int(duration * samples_per_second)
-    samples_per_peak = total_samples // target_peaks if target_peaks > 0 else total_samples
-    
-    peaks = []
-    
-    # Calculate peaks by segments
-    for i in range(0, total_samples, samples_per_peak):
-        segment = audio_data[i:i + samples_per_peak]
-        if len(segment) > 0:
-            # Use RMS value as peak (smoother than simple max)
-            rms = np.sqrt(np.mean(segment ** 2))
-            # Clamp to [-1.0, 1.0] range
-            peak = np.clip(rms, -1.0, 1.0)
-            peaks.append(float(peak))
-    
-    return peaks
-
-
-def get_waveform_for_file(filename: str) -> Optional[dict]:
-    """
-    Get or generate waveform data for a given audio or video filename
+        result = _reduce_stream(process.stdout, windows, pyramid_window)
+    finally:
+        process.stdout.close()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg failed to extract audio data: exit status {process.returncode}")
+    return result
 
-    Args:
-        filename: Filename (without path, with extension), can be audio or video file
 
-    Returns:
-        dict: Dictionary containing waveform data, None if failed
-    """
+def _find_media_file(filename: str) -> Optional[str]:
+    """Full path of an audio or video file in saved_audio or saved_video, None if not found"""
     # Build full path - try audio directory first, then video directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.join(current_dir, "..", "..")
@@ -190,7 +381,20 @@ def get_waveform_for_file(filename: str) -> Optional[dict]:
     
     if not file_path:
         print(f"Audio/Video file not found in saved_audio or saved_video: {filename}")
+    return file_path
+
+
+def _ensure_waveform_files(filename: str) -> Optional[Tuple[str, str]]:
+    """
+    Generate the peaks JSON and the pyramid of a media file if missing or older than the file
+
+    Returns:
+        (peaks_path, pyramid_path), None if the file is missing or generation failed
+    """
+    file_path = _find_media_file(filename)
+    if not file_path:
         return None
+    project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
     
     # Check if peak data already exists
     base_name = os.path.splitext(filename)[0]
@@ -198,15 +402,34 @@ def get_waveform_for_file(filename: str) -> Optional[dict]:
     os.makedirs(waveform_dir, exist_ok=True)
     peaks_path = os.path.join(waveform_dir, f"{base_name}.peaks.json")
     peaks_path = os.path.normpath(peaks_path)
-    
-    # If peak file doesn't exist or is older than audio/video file, regenerate
-    if not os.path.exists(peaks_path) or os.path.getmtime(peaks_path) < os.path.getmtime(file_path):
+    pyramid_path = pyramid_path_for(peaks_path)
+
+    # If either file doesn't exist or is older than audio/video file, regenerate both
+    source_mtime = os.path.getmtime(file_path)
+    if any(not os.path.exists(p) or os.path.getmtime(p) < source_mtime for p in (peaks_path, pyramid_path)):
         try:
-            generate_waveform_peaks(file_path, peaks_path)
+            generate_waveform_peaks(file_path, peaks_path, pyramid_path=pyramid_path)
         except Exception as e:
             print(f"Failed to generate waveform peaks: {e}")
             return None
-    
+    return peaks_path, pyramid_path
+
+
+def get_waveform_for_file(filename: str) -> Optional[dict]:
+    """
+    Get or generate waveform data for a given audio or video filename
+
+    Args:
+        filename: Filename (without path, with extension), can be audio or video file
+
+    Returns:
+        dict: Dictionary containing waveform data, None if failed
+    """
+    paths = _ensure_waveform_files(filename)
+    if paths is None:
+        return None
+    peaks_path, _ = paths
+
     # Read peak data
     try:
         with open(peaks_path, 'r', encoding='utf-8') as f:
@@ -216,6 +439,25 @@ def get_waveform_for_file(filename: str) -> Optional[dict]:
         return None
 
 
+def get_waveform_range_for_file(filename: str, start: float = 0.0, end: Optional[float] = None,
+                                width: int = 1000) -> Optional[dict]:
+    """
+    Get the min/max waveform of [start, end) seconds at a resolution suited to `width` pixels,
+    generating the pyramid if needed (see read_pyramid_range)
+
+    Returns:
+        dict: Range data with 'pairs', None if failed
+    """
+    paths = _ensure_waveform_files(filename)
+    if paths is None:
+        return None
+    try:
+        return read_pyramid_range(paths[1], start, end, width)
+    except Exception as e:
+        print(f"Failed to read waveform pyramid: {e}")
+        return None
+
+
 if __name__ == "__main__":
     # Test function
     test_audio = "一部关于糖的电影---最甜蜜的慢性杀手就在我们身边(双语字幕).mp3"
@@ -0,0 +1,178 @@
+"""
+LLM 响应缓存
+
+所有LLM调用（断句 split_by_llm、翻译 call_llm、笔记 analyze_subtitles）共用一个SQLite文件缓存，
+键为 (messages, model, temperature, provider) 的哈希值。
+- 单文件存储，WAL模式，跨线程/跨进程安全
+- 按最近访问时间(LRU)淘汰，总大小和条目数均有上限
+- 记录命中/未命中次数，用于评估缓存效果
+
+失败重试的字幕任务因此不会再为已经成功的LLM请求重复付费。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 缓存文件位置，可通过环境变量覆盖
+CACHE_PATH = os.getenv(
+    'VIDGO_LLM_CACHE_PATH',
+    str(Path(__file__).parent.parent / "work_dir" / "llm_cache.sqlite3"),
+)
+MAX_CACHE_BYTES = int(os.getenv('VIDGO_LLM_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB
+MAX_CACHE_ENTRIES = int(os.getenv('VIDGO_LLM_CACHE_MAX_ENTRIES', 200000))
+EVICT_RATIO = 0.9  # 超限后淘汰到上限的90%，避免每次写入都触发淘汰
+EVICT_BATCH = 1000  # 每轮淘汰最多读取的条目数
+
+
+def make_cache_key(messages: List[Dict[str, str]], model: str, temperature: float, provider: str) -> str:
+    """
+    生成缓存键：对完整的messages、模型、温度和服务商(base_url)做sha256
+    """
+    payload = json.dumps(
+        [provider or "", model or "", round(float(temperature), 4), messages],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    基于SQLite的LLM响应缓存，LRU淘汰
+    """
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES, max_entries: int = MAX_CACHE_ENTRIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+
+    def get(self, messages: List[Dict[str, str]], model: str, temperature: float, provider: str) -> Optional[str]:
+        """
+        读取缓存，命中时刷新最近访问时间
+        """
+        key = make_cache_key(messages, model, temperature, provider)
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self._misses += 1
+                    return None
+                self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._hits += 1
+                return row[0]
+            except sqlite3.Error as e:
+                print(f"LLM缓存读取失败: {e}")
+                self._misses += 1
+                return None
+
+    def set(self, messages: List[Dict[str, str]], model: str, temperature: float, provider: str, response: str) -> None:
+        """
+        写入缓存，超出容量时按LRU淘汰
+        """
+        if not response:
+            return
+        key = make_cache_key(messages, model, temperature, provider)
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache "
+                    "(key, provider, model, temperature, response, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, provider or "", model or "", float(temperature), response, size, now, now),
+                )
+                self._writes += 1
+                self._evict_if_needed()
+            except sqlite3.Error as e:
+                print(f"LLM缓存写入失败: {e}")
+
+    def _evict_if_needed(self) -> None:
+        """按最近访问时间淘汰最旧条目，直到总大小和条目数都回到上限的EVICT_RATIO以内（调用方持有锁）"""
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        target_count = int(self.max_entries * EVICT_RATIO)
+        target_bytes = int(self.max_bytes * EVICT_RATIO)
+        # 每次只取最旧的一批，避免把整张表读进内存
+        while count > target_count or total > target_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access ASC LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            removed = []
+            for key, size in rows:
+                if count <= target_count and total <= target_bytes:
+                    break
+                removed.append((key,))
+                count -= 1
+                total -= size
+            self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", removed)
+            self._evictions += len(removed)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        返回缓存统计：命中/未命中次数、命中率、条目数和占用字节数
+        """
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "writes": self._writes,
+                "evictions": self._evictions,
+                "entries": count,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache_instance: Optional[LLMCache] = None
+_cache_instance_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """获取进程内共享的LLM缓存实例"""
+    global _cache_instance
+    if _cache_instance is None:
+        with _cache_instance_lock:
+            if _cache_instance is None:
+                _cache_instance = LLMCache()
+    return _cache_instance
@@ -0,0 +1,244 @@
+"""
+LLM 网关
+
+所有LLM请求（断句、翻译、笔记、连接测试）统一经由此模块发出：
+- 按 (api_key, base_url) 复用 OpenAI 客户端，底层 httpx 连接池保持长连接
+- 按服务商(base_url)做自适应并发控制（AIMD）：
+  请求成功时并发上限线性增加，遇到429/超时/过慢响应时减半，
+  超出上限的请求在网关内排队，所有字幕任务共享同一个上限
+- 可重试错误（429、5xx、超时、连接错误）按指数退避加随机抖动重试，优先遵循 Retry-After
+
+字幕任务内部仍使用线程池，但真正同时在途的请求数由网关决定，总吞吐量因此能贴近服务商的限额，
+而不是在限流时直接失败。
+"""
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import openai
+
+# 并发控制参数，可通过环境变量覆盖
+INITIAL_CONCURRENCY = int(os.getenv('VIDGO_LLM_INITIAL_CONCURRENCY', 4))
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = int(os.getenv('VIDGO_LLM_MAX_CONCURRENCY', 32))
+SLOW_RESPONSE_SECONDS = float(os.getenv('VIDGO_LLM_SLOW_RESPONSE_SECONDS', 120))  # 超过该耗时视为拥塞信号
+DECREASE_COOLDOWN = 5.0  # 两次减半之间的最短间隔（秒），避免同一波429把上限连续砍到底
+
+# 重试参数
+MAX_RETRIES = int(os.getenv('VIDGO_LLM_MAX_RETRIES', 5))
+INITIAL_BACKOFF = 1.0  # seconds
+MAX_BACKOFF = 60.0  # seconds
+
+# 连接池参数
+POOL_MAX_CONNECTIONS = 64
+POOL_MAX_KEEPALIVE = 32
+REQUEST_TIMEOUT = 600.0  # seconds
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class AIMDLimiter:
+    """
+    单个服务商的自适应并发上限（加性增、乘性减）
+    """
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, min_limit: int = MIN_CONCURRENCY, max_limit: int = MAX_CONCURRENCY):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.waiting = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """获取一个并发名额，超出上限时排队等待"""
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, congested: bool = False) -> None:
+        """
+        归还名额并根据本次结果调整上限
+        congested: 是否观察到拥塞信号（429、超时、响应过慢）
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if congested:
+                now = time.monotonic()
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                # 每个成功请求增加 1/limit，相当于每轮并发整体 +1
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+            }
+
+
+class LLMGateway:
+    """
+    进程内共享的LLM请求入口
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, str], openai.OpenAI] = {}
+        self._limiters: Dict[str, AIMDLimiter] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def get_client(self, api_key: str, base_url: str) -> openai.OpenAI:
+        """按 (api_key, base_url) 复用客户端；重试由网关负责，因此关闭SDK自带重试"""
+        key = (api_key or "", base_url or "")
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                http_client = openai.DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                    ),
+                    timeout=REQUEST_TIMEOUT,
+                )
+                client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=http_client)
+                self._clients[key] = client
+            return client
+
+    def _get_limiter(self, base_url: str) -> AIMDLimiter:
+        with self._lock:
+            limiter = self._limiters.get(base_url)
+            if limiter is None:
+                limiter = AIMDLimiter()
+                self._limiters[base_url] = limiter
+                self._stats[base_url] = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+            return limiter
+
+    def _count(self, base_url: str, field: str) -> None:
+        with self._lock:
+            self._stats[base_url][field] += 1
+
+    def chat(self,
+             messages: List[Dict[str, str]],
+             model: str,
+             api_key: str,
+             base_url: str,
+             temperature: Optional[float] = None,
+             max_tokens: Optional[int] = None,
+             timeout: Optional[float] = None,
+             max_retries: int = MAX_RETRIES) -> str:
+        """
+        发送一次chat completion请求并返回消息内容
+        可重试错误会在退避后重试，最终失败时抛出最后一次的异常；不可重试错误（鉴权、参数错误等）直接抛出
+        """
+        content, _ = self.chat_with_usage(messages, model, api_key, base_url, temperature, max_tokens, timeout, max_retries)
+        return content
+
+    def chat_with_usage(self,
+                        messages: List[Dict[str, str]],
+                        model: str,
+                        api_key: str,
+                        base_url: str,
+                        temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None,
+                        timeout: Optional[float] = None,
+                        max_retries: int = MAX_RETRIES) -> Tuple[str, Dict[str, int]]:
+        """
+        同 chat，额外返回服务商报告的token用量 {"prompt_tokens", "completion_tokens", "total_tokens"}（未报告时为空字典）
+        """
+        limiter = self._get_limiter(base_url)
+        client = self.get_client(api_key, base_url)
+        params = {"model": model, "messages": messages}
+        if temperature is not None:
+            params["temperature"] = temperature
+        if max_tokens is not None:
+            params["max_tokens"] = max_tokens
+        if timeout is not None:
+            params["timeout"] = timeout
+
+        attempt = 0
+        while True:
+            limiter.acquire()
+            self._count(base_url, "requests")
+            started = time.monotonic()
+            try:
+                response = client.chat.completions.create(**params)
+            except RETRYABLE_ERRORS as e:
+                congested = isinstance(e, (openai.RateLimitError, openai.APITimeoutError))
+                limiter.release(congested=congested)
+                if isinstance(e, openai.RateLimitError):
+                    self._count(base_url, "rate_limited")
+                if attempt >= max_retries:
+                    self._count(base_url, "failures")
+                    raise
+                wait = self._backoff(attempt, e)
+                attempt += 1
+                self._count(base_url, "retries")
+                print(f"LLM请求失败({type(e).__name__})，{wait:.1f}s 后进行第 {attempt}/{max_retries} 次重试")
+                time.sleep(wait)
+                continue
+            except Exception:
+                limiter.release(congested=False)
+                self._count(base_url, "failures")
+                raise
+            limiter.release(congested=time.monotonic() - started > SLOW_RESPONSE_SECONDS)
+            usage = {}
+            if getattr(response, "usage", None) is not None:
+                usage = {
+                    "prompt_tokens": response.usage.prompt_tokens or 0,
+                    "completion_tokens": response.usage.completion_tokens or 0,
+                    "total_tokens": response.usage.total_tokens or 0,
+                }
+            return response.choices[0].message.content, usage
+
+    @staticmethod
+    def _backoff(attempt: int, error: Exception) -> float:
+        """计算重试等待时间：优先使用Retry-After，否则指数退避 + full jitter"""
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(MAX_BACKOFF, float(retry_after)) + random.uniform(0, 1.0)
+                except ValueError:
+                    pass
+        cap = min(MAX_BACKOFF, INITIAL_BACKOFF * (2 ** attempt))
+        return random.uniform(cap / 2, cap)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """返回各服务商的并发上限、在途/排队请求数以及请求、重试、限流、失败计数"""
+        with self._lock:
+            items = list(self._limiters.items())
+            counters = {url: dict(c) for url, c in self._stats.items()}
+        return {url: {**limiter.snapshot(), **counters[url]} for url, limiter in items}
+
+
+_gateway_instance: Optional[LLMGateway] = None
+_gateway_instance_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """获取进程内共享的LLM网关实例"""
+    global _gateway_instance
+    if _gateway_instance is None:
+        with _gateway_instance_lock:
+            if _gateway_instance is None:
+                _gateway_instance = LLMGateway()
+    return _gateway_instance
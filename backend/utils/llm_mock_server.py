@@ -0,0 +1,223 @@
+"""
+本地模拟的 OpenAI 兼容 LLM 服务（用于性能测试，不产生任何费用）
+
+只实现 POST {base_url}/chat/completions，按提示词内容给出确定性的结果：
+- 断句请求（VIDEO_SPLIT_PROMPT_TEMPLATE）：在句末标点后或每 SPLIT_WORDS 个词处插入 <br>
+- 翻译请求（提示词末尾带 "INPUT:" JSON）：每条原文返回 direct/reflect/free 三个字段
+可配置固定延迟与随机抖动，并按概率或并发上限返回 429（带 Retry-After），用于验证网关的限流与重试。
+
+    server = MockLLMServer(latency_ms=200, rate_limit_ratio=0.05).start()
+    ...  # base_url 设为 server.base_url
+    server.stop()
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+SPLIT_WORDS = 16          # 断句时每句最多词数（CJK按字符计，见 SPLIT_CJK_CHARS）
+SPLIT_CJK_CHARS = 12
+TRANSLATION_PREFIX = "译："
+
+_SPLIT_RE = re.compile(r'<split_this_sentence>\n?(.*?)\n?</split_this_sentence>', re.S)
+_INPUT_MARKER = "\n\nINPUT:\n"
+_SENTENCE_END_RE = re.compile(r'[.?!。？！]$')
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+
+def split_sentences(text: str) -> List[str]:
+    """确定性断句：英文按词、CJK按字符计数，遇到句末标点或达到上限时断开"""
+    sentences = []
+    current: List[str] = []
+    size = 0
+    for token in text.split():
+        current.append(token)
+        cjk = len(_CJK_RE.findall(token))
+        size += cjk * SPLIT_WORDS / SPLIT_CJK_CHARS if cjk else 1
+        if _SENTENCE_END_RE.search(token) or size >= SPLIT_WORDS:
+            sentences.append(" ".join(current))
+            current, size = [], 0
+    if current:
+        sentences.append(" ".join(current))
+    return sentences
+
+
+def translate_items(items: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    """对翻译请求中的每条原文给出确定性的译文"""
+    result = {}
+    for key, item in items.items():
+        original = item.get("original", "")
+        result[key] = {
+            "direct": item.get("direct") or f"{TRANSLATION_PREFIX}{original}",
+            "reflect": "ok",
+            "free": f"{TRANSLATION_PREFIX}{original}",
+        }
+    return result
+
+
+def respond(prompt: str) -> Optional[Dict]:
+    """根据提示词生成回复内容；无法识别的请求返回None"""
+    match = _SPLIT_RE.search(prompt)
+    if match:
+        return {"split": "<br>".join(split_sentences(match.group(1)))}
+    position = prompt.rfind(_INPUT_MARKER)
+    if position >= 0:
+        try:
+            return translate_items(json.loads(prompt[position + len(_INPUT_MARKER):]))
+        except (json.JSONDecodeError, AttributeError):
+            return None
+    return None
+
+
+class MockLLMServer:
+    """
+    在后台线程中运行的模拟LLM服务
+    latency_ms/jitter_ms: 每个请求的延迟 = latency_ms + [0, jitter_ms) 的随机值
+    rate_limit_ratio: 以该概率返回 429
+    max_concurrent: 同时在途的请求超过该值时返回 429（0 表示不限制）
+    """
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency_ms: float = 0,
+                 jitter_ms: float = 0,
+                 rate_limit_ratio: float = 0.0,
+                 max_concurrent: int = 0,
+                 retry_after: float = 0.2,
+                 seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats: Dict[str, int] = {}
+        self.reset_stats()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockLLMServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockLLMServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {
+                "requests": 0,
+                "rate_limited": 0,
+                "split_calls": 0,
+                "translate_calls": 0,
+                "bad_requests": 0,
+                "max_in_flight": 0,
+            }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _admit(self) -> Tuple[bool, float]:
+        """登记一个请求，返回 (是否以 429 拒绝, 延迟秒数)"""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._in_flight += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+            limited = (self.max_concurrent and self._in_flight > self.max_concurrent) or \
+                (self.rate_limit_ratio and self._random.random() < self.rate_limit_ratio)
+            if limited:
+                self._stats["rate_limited"] += 1
+            delay = (self.latency_ms + self._random.random() * self.jitter_ms) / 1000
+        return bool(limited), delay
+
+    def _finish(self, field: Optional[str] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if field:
+                self._stats[field] += 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                limited, delay = server._admit()
+                if limited:
+                    server._finish()
+                    self._send_json(
+                        429,
+                        {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                        {"Retry-After": str(server.retry_after)},
+                    )
+                    return
+                if delay:
+                    time.sleep(delay)
+
+                messages = request.get("messages") or []
+                prompt = messages[-1].get("content", "") if messages else ""
+                content = respond(prompt) if self.path.endswith("/chat/completions") else None
+                if content is None:
+                    server._finish("bad_requests")
+                    self._send_json(400, {"error": {"message": "Unrecognized request (mock)", "type": "invalid_request_error"}})
+                    return
+                server._finish("split_calls" if "split" in content else "translate_calls")
+
+                text = json.dumps(content, ensure_ascii=False)
+                prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+                completion_tokens = len(text) // 4
+                self._send_json(200, {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "mock"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+        return Handler
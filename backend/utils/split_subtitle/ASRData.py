@@ -1,8 +1,13 @@
 import re
 from typing import List
 
+from utils.srt_io import format_srt, ms_to_srt_time, parse_srt, write_chunks, write_srt
+
 
 class ASRDataSeg:
+    # 词级别字幕会有几十万个分段，不为每个实例分配 __dict__
+    __slots__ = ('text', 'start_time', 'end_time', 'direct', 'reflected', 'free')
+
     def __init__(self, text, start_time, end_time, direct="",free="", reflected=""):
         """
         Combine of two type,
@@ -30,15 +35,7 @@ class ASRDataSeg:
 
     def to_srt_ts(self) -> str:
         """Convert to SRT timestamp format"""
-        return f"{self._ms_to_srt_time(self.start_time)} --> {self._ms_to_srt_time(self.end_time)}"
-
-    @staticmethod
-    def _ms_to_srt_time(ms) -> str:
-        """Convert milliseconds to SRT time format (HH:MM:SS,mmm)"""
-        total_seconds, milliseconds = divmod(ms, 1000)
-        minutes, seconds = divmod(total_seconds, 60)
-        hours, minutes = divmod(minutes, 60)
-        return f"{int(hours):02}:{int(minutes):02}:{int(seconds):02},{int(milliseconds):03}"
+        return f"{ms_to_srt_time(self.start_time)} --> {ms_to_srt_time(self.end_time)}"
 
     def to_lrc_ts(self) -> str:
         """Convert to LRC timestamp format"""
@@ -79,21 +76,27 @@ class ASRData:
         """Convert to plain text subtitle format (without timestamps)"""
         return "\n".join(seg.transcript for seg in self.segments)
 
+    def _srt_columns(self, use_translation=False):
+        texts = [
+            seg.free if use_translation and seg.free else seg.text
+            for seg in self.segments
+        ]
+        starts = [seg.start_time for seg in self.segments]
+        ends = [seg.end_time for seg in self.segments]
+        return starts, ends, texts
+
     def to_srt(self, save_path=None, use_translation=False) -> str:
         """Convert to SRT subtitle format"""
-        def get_text(seg):
-            if use_translation and seg.free:
-                return seg.free
-            return seg.text
-        
-        srt_text = "\n".join(
-            f"{n}\n{seg.to_srt_ts()}\n{get_text(seg)}\n"
-            for n, seg in enumerate(self.segments, 1))
+        srt_text = format_srt(*self._srt_columns(use_translation))
         if save_path:
-            with open(save_path, 'w', encoding='utf-8') as f:
-                f.write(srt_text)
+            # 先写临时文件再原子替换，读取方不会看到写了一半的字幕
+            write_chunks(save_path, [srt_text])
         return srt_text
 
+    def save_srt(self, save_path, use_translation=False) -> None:
+        """按块流式写入SRT文件（不在内存中拼出完整字幕文本）"""
+        write_srt(save_path, *self._srt_columns(use_translation))
+
     def to_lrc(self) -> str:
         """Convert to LRC subtitle format"""
         return "\n".join(
@@ -169,38 +172,11 @@ def from_srt(srt_str: str) -> 'ASRData':
     :param srt_str: 包含SRT格式字幕的字符串。
     :return: 解析后的ASRData实例。
     """
-    segments = []
-    srt_time_pattern = re.compile(
-        r'(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})'
-    )
-
-    for block in re.split(r'\n\s*\n', srt_str.strip()):
-        lines = block.splitlines()
-        if len(lines) < 3:
-            print("lines length:",len(lines))
-            raise ValueError(f"无效的SRT块格式: {block}")
-
-        match = srt_time_pattern.match(lines[1])
-        if not match:
-            raise ValueError(f"无效的时间戳格式: {lines[1]}")
-
-        time_parts = list(map(int, match.groups()))
-        start_time = sum([
-            time_parts[0] * 3600000,
-            time_parts[1] * 60000,
-            time_parts[2] * 1000,
-            time_parts[3]
-        ])
-        end_time = sum([
-            time_parts[4] * 3600000,
-            time_parts[5] * 60000,
-            time_parts[6] * 1000,
-            time_parts[7]
-        ])
-
-        text = '\n'.join(lines[2:]).strip()
-        segments.append(ASRDataSeg(text, start_time, end_time))
-
+    cues = parse_srt(srt_str)
+    segments = [
+        ASRDataSeg(text, start_time, end_time)
+        for text, start_time, end_time in zip(cues.texts, cues.starts.tolist(), cues.ends.tolist())
+    ]
     return ASRData(segments)
 
 def from_vtt(vtt_str: str) -> 'ASRData':
@@ -0,0 +1,270 @@
+"""
+列式ASRData
+
+词级别的字幕（几个小时的音频有几十万个token）如果每个token都是一个ASRDataSeg对象，
+内存和遍历开销都很大。这里按列存储：
+- 开始/结束时间为两个 int64 数组
+- 所有文本拼成一个字符串，用 offsets 数组记录每段的起止位置
+- 每段的display宽度与拼接时的补空格信息做成前缀和，任意区间的display宽度 O(1) 得到
+
+切片共享底层数组和文本，不复制数据；按下标访问得到带 __slots__ 的只读视图 ASRSegView，
+与 ASRDataSeg 有相同的 text/start_time/end_time 等属性，可以直接交给原有按分段遍历的代码。
+"""
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from utils.split_subtitle.ASRData import ASRData, ASRDataSeg
+from utils.split_subtitle.cnt_tokens import cnt_display_words, is_digit, is_english_char, is_english_punctuation
+from utils.srt_io import format_srt, ms_to_srt_time, parse_srt, write_chunks, write_srt
+
+
+class ASRSegView:
+    """
+    ColumnarASRData 中单个分段的只读视图，接口与 ASRDataSeg 一致（翻译字段恒为空）
+    """
+    __slots__ = ('_data', '_index')
+
+    def __init__(self, data: 'ColumnarASRData', index: int):
+        self._data = data
+        self._index = index
+
+    @property
+    def text(self) -> str:
+        return self._data.text(self._index)
+
+    @property
+    def start_time(self) -> int:
+        return int(self._data.starts[self._index])
+
+    @property
+    def end_time(self) -> int:
+        return int(self._data.ends[self._index])
+
+    direct = ""
+    free = ""
+    reflected = ""
+
+    @property
+    def transcript(self) -> str:
+        return self.text
+
+    def to_srt_ts(self) -> str:
+        return f"{ms_to_srt_time(self.start_time)} --> {ms_to_srt_time(self.end_time)}"
+
+    def to_segment(self) -> ASRDataSeg:
+        """复制为独立的 ASRDataSeg"""
+        return ASRDataSeg(self.text, self.start_time, self.end_time)
+
+    def __str__(self) -> str:
+        return f"ASRDataSeg({self.text}, {self.start_time}, {self.end_time})"
+
+
+class _DisplayIndex:
+    """
+    整个字幕的display宽度前缀和，所有切片共享
+
+    cnt_display_words 对拼接文本的结果 = 各段宽度之和 + 相邻两个含token的分段之间的补空格(0.5格)：
+    前一段最后一个token以英文/数字/英文标点结尾，且两段之间有空白（前段末尾、后段开头或中间的纯空白分段）时补空格。
+    区间 [start, end) 的宽度 = 宽度前缀和之差 + 补空格前缀和之差 - 区间内第一个含token分段的补空格（它的前一段不在区间内）
+    """
+    __slots__ = ('width_prefix', 'junction_prefix', 'junctions', 'next_token')
+
+    def __init__(self, texts: Iterable[str]):
+        widths = []
+        junctions = []
+        has_tokens = []
+        prev_tail = False      # 上一个含token分段的最后一个token是否需要补空格
+        gap_space = False      # 上一个含token分段之后是否出现过空白
+        for text in texts:
+            tokens = text.split()
+            widths.append(cnt_display_words(text))
+            has_tokens.append(bool(tokens))
+            if not tokens:
+                junctions.append(0.0)
+                gap_space = gap_space or bool(text)
+                continue
+            spaced = gap_space or text[:1].isspace()
+            junctions.append(0.5 if prev_tail and spaced else 0.0)
+            last_char = tokens[-1][-1]
+            prev_tail = is_english_char(last_char) or is_digit(last_char) or is_english_punctuation(last_char)
+            gap_space = text[-1:].isspace()
+
+        n = len(widths)
+        self.junctions = np.asarray(junctions, dtype=np.float64)
+        self.width_prefix = np.zeros(n + 1, dtype=np.float64)
+        self.junction_prefix = np.zeros(n + 1, dtype=np.float64)
+        np.cumsum(np.asarray(widths, dtype=np.float64), out=self.width_prefix[1:])
+        np.cumsum(self.junctions, out=self.junction_prefix[1:])
+
+        # next_token[i]: 下标 >= i 的第一个含token分段，不存在时为 n
+        token_positions = np.flatnonzero(np.asarray(has_tokens, dtype=bool))
+        self.next_token = np.full(n + 1, n, dtype=np.int64)
+        if len(token_positions):
+            self.next_token[:n] = np.append(token_positions, n)[
+                np.searchsorted(token_positions, np.arange(n))
+            ]
+
+    def width(self, start: int, end: int) -> float:
+        if end <= start:
+            return 0.0
+        width = self.width_prefix[end] - self.width_prefix[start]
+        width += self.junction_prefix[end] - self.junction_prefix[start]
+        first = self.next_token[start]
+        if first < end:
+            width -= self.junctions[first]
+        return float(width)
+
+
+class ColumnarASRData:
+    """
+    列式存储的ASRData，用于词级别的长字幕
+    starts/ends 是 int64 数组，文本保存在一个字符串里，第 i 段为 buffer[offsets[i]:offsets[i+1]]
+    切片 data[a:b] 返回共享数据的新对象，区间上的拼接文本、display宽度、最大时间间隔都不需要逐段遍历
+    """
+    __slots__ = ('_buffer', 'offsets', 'starts', 'ends', '_display', '_base')
+
+    def __init__(self, buffer: str, offsets: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                 display: Optional[_DisplayIndex] = None, base: int = 0):
+        self._buffer = buffer
+        self.offsets = offsets    # 长度 n+1，指向 buffer 的绝对位置
+        self.starts = starts
+        self.ends = ends
+        self._display = display   # 整个字幕共享的display宽度索引，首次需要时才计算
+        self._base = base         # 本切片第一段在整个字幕中的下标，用于查display索引
+
+    @classmethod
+    def from_columns(cls, texts: Sequence[str], starts, ends) -> 'ColumnarASRData':
+        """由文本列表和开始/结束时间（毫秒）构建"""
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+        return cls(
+            ''.join(texts),
+            offsets,
+            np.asarray(starts, dtype=np.int64),
+            np.asarray(ends, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_segments(cls, segments: Iterable) -> 'ColumnarASRData':
+        """由 ASRDataSeg（或任意有 text/start_time/end_time 属性的对象）序列构建"""
+        texts: List[str] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        for seg in segments:
+            texts.append(seg.text)
+            starts.append(seg.start_time)
+            ends.append(seg.end_time)
+        return cls.from_columns(texts, starts, ends)
+
+    @classmethod
+    def from_srt(cls, srt_str: str) -> 'ColumnarASRData':
+        """直接把SRT解析为列，不创建逐段对象"""
+        cues = parse_srt(srt_str)
+        return cls.from_columns(cues.texts, cues.starts, cues.ends)
+
+    @classmethod
+    def from_asr_data(cls, asr_data) -> 'ColumnarASRData':
+        if isinstance(asr_data, ColumnarASRData):
+            return asr_data
+        return cls.from_segments(asr_data.segments)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[ASRSegView]:
+        return (ASRSegView(self, i) for i in range(len(self)))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("ColumnarASRData 只支持连续切片")
+            stop = max(start, stop)
+            return ColumnarASRData(
+                self._buffer,
+                self.offsets[start:stop + 1],
+                self.starts[start:stop],
+                self.ends[start:stop],
+                self._display,
+                self._base + start,
+            )
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("分段下标超出范围")
+        return ASRSegView(self, key)
+
+    @property
+    def segments(self) -> List[ASRSegView]:
+        """兼容 ASRData.segments 的分段视图列表（每次访问都会新建列表，循环中请直接按下标访问）"""
+        return list(self)
+
+    def has_data(self) -> bool:
+        return len(self) > 0
+
+    def text(self, index: int) -> str:
+        return self._buffer[self.offsets[index]:self.offsets[index + 1]]
+
+    def texts(self) -> List[str]:
+        buffer = self._buffer
+        bounds = self.offsets.tolist()
+        return [buffer[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    def concat_text(self, start: int = 0, end: Optional[int] = None) -> str:
+        """区间 [start, end) 内各段文本直接拼接的结果（即 ''.join(seg.text ...)），只做一次字符串切片"""
+        end = len(self) if end is None else end
+        if end <= start:
+            return ""
+        return self._buffer[self.offsets[start]:self.offsets[end]]
+
+    def plain_text(self) -> str:
+        """等价于 to_txt().replace("\\n", "")，送给LLM断句的整段文本"""
+        return self.concat_text().replace("\n", "")
+
+    def display_width(self, start: int = 0, end: Optional[int] = None) -> float:
+        """区间 [start, end) 拼接文本的display宽度，与 cnt_display_words(concat_text(start, end)) 相同"""
+        end = len(self) if end is None else end
+        if self._display is None:
+            # 尚未建立索引（未经 build_display_index 的切片只为自身建立）
+            self._display = _DisplayIndex(self.texts())
+            self._base = 0
+        return self._display.width(self._base + start, self._base + end)
+
+    def gaps(self) -> np.ndarray:
+        """相邻两段之间的时间间隔，gaps[j] = starts[j+1] - ends[j]"""
+        return self.starts[1:] - self.ends[:-1]
+
+    def build_display_index(self) -> 'ColumnarASRData':
+        """预先计算display宽度索引，之后的切片都共享这份索引"""
+        if self._display is None:
+            self.display_width(0, 0)
+        return self
+
+    def to_segments(self) -> List[ASRDataSeg]:
+        """复制为 ASRDataSeg 列表"""
+        return [
+            ASRDataSeg(text, start, end)
+            for text, start, end in zip(self.texts(), self.starts.tolist(), self.ends.tolist())
+        ]
+
+    def to_asr_data(self) -> ASRData:
+        return ASRData(self.to_segments())
+
+    def to_txt(self) -> str:
+        return "\n".join(self.texts())
+
+    def to_srt(self, save_path=None, use_translation=False) -> str:
+        """转为SRT（列式数据没有译文，use_translation 仅为保持接口一致）"""
+        srt_text = format_srt(self.starts, self.ends, self.texts())
+        if save_path:
+            write_chunks(save_path, [srt_text])
+        return srt_text
+
+    def save_srt(self, save_path, use_translation=False) -> None:
+        """按块流式写入SRT文件"""
+        write_srt(save_path, self.starts, self.ends, self.texts())
+
+    def __str__(self) -> str:
+        return self.to_txt()
+
@@ -0,0 +1,76 @@
+"""
+翻译批次划分
+
+按估算的token数而不是固定句数打包字幕：
+- 一批内原文token总数不超过 token_budget，句数不超过 max_segments
+- 单句超过预算时独占一批
+- 前后文上下文窗口同样按token预算向两侧扩展
+"""
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+DEFAULT_BATCH_TOKEN_BUDGET = 600    # 每次请求的原文token预算
+DEFAULT_MAX_BATCH_SEGMENTS = 40     # 每批最多句数，避免JSON序号过长
+DEFAULT_CONTEXT_TOKEN_BUDGET = 150  # 单侧上下文的token预算
+DEFAULT_MAX_CONTEXT_SEGMENTS = 6    # 单侧上下文最多句数
+
+
+@dataclass
+class TranslationBatch:
+    """一个翻译批次：原文中 [start, end) 区间的字幕"""
+    index: int   # 批次序号，从1开始
+    start: int
+    end: int
+    tokens: int  # 批内原文估算token数
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+def pack_batches(token_counts: Sequence[int],
+                 token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET,
+                 max_segments: int = DEFAULT_MAX_BATCH_SEGMENTS) -> List[TranslationBatch]:
+    """
+    贪心地把连续字幕打包成批次
+    token_counts: 每句字幕的估算token数
+    """
+    batches: List[TranslationBatch] = []
+    start = 0
+    tokens = 0
+    for i, count in enumerate(token_counts):
+        if i > start and (tokens + count > token_budget or i - start >= max_segments):
+            batches.append(TranslationBatch(len(batches) + 1, start, i, tokens))
+            start, tokens = i, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append(TranslationBatch(len(batches) + 1, start, len(token_counts), tokens))
+    return batches
+
+
+def context_window(token_counts: Sequence[int], start: int, end: int,
+                   token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+                   max_segments: int = DEFAULT_MAX_CONTEXT_SEGMENTS) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """
+    计算批次 [start, end) 的前文和后文区间，两侧分别在token预算内尽量多取句子（至少1句）
+    返回 ((prev_start, start), (end, next_end))
+    """
+    prev_start = start
+    tokens = 0
+    while prev_start > 0 and start - prev_start < max_segments:
+        count = token_counts[prev_start - 1]
+        if prev_start < start and tokens + count > token_budget:
+            break
+        tokens += count
+        prev_start -= 1
+
+    next_end = end
+    tokens = 0
+    while next_end < len(token_counts) and next_end - end < max_segments:
+        count = token_counts[next_end]
+        if next_end > end and tokens + count > token_budget:
+            break
+        tokens += count
+        next_end += 1
+
+    return (prev_start, start), (end, next_end)
@@ -1,8 +1,10 @@
 # 数整个段落中有多少个词。
-import re
+import math
 import re
 from spellchecker import SpellChecker  # 或使用 nltk.corpus.words
 
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u31f0-\u31ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\u1100-\u11ff\u3130-\u318f\uff00-\uffef\u3000-\u303f]')
+
 def count_words(text: str) -> int:
     """
     统计混合文本内英文单词数、中文字符数、日文字符数和韩文字符数的总和
@@ -23,6 +25,16 @@ def count_words(text: str) -> int:
     total = english_words + chinese_chars + japanese_chars + korean_chars
     return total
 
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的LLM token数（无需加载分词器）
+    CJK字符（含全角标点）按每字1个token，其余字符按每4个字符1个token
+    """
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_RE.findall(text))
+    return cjk_chars + math.ceil((len(text) - cjk_chars) / 4)
+
 def is_cjk_char(char):
     """判断字符是否为CJK字符（中文、日文、韩文）"""
     if not char:
@@ -0,0 +1,125 @@
+"""
+增量翻译
+
+每次翻译完成后，在译文字幕旁保存一份翻译状态（{译文路径}.state.json），
+记录翻译所依据的原文以及每句的直译/意译。
+用户修改原文后重新翻译时，先按句对比新旧原文：
+- 原文未变的句子直接沿用旧译文（时间轴以新原文为准）
+- 新增或改动的句子按连续区间重新翻译，翻译时仍带上前后文上下文
+这样修一个错别字只需要一次LLM请求，而不是整部字幕重新翻译。
+"""
+import difflib
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+
+from utils.split_subtitle.ASRData import ASRData, from_srt
+
+STATE_SUFFIX = '.state.json'
+STATE_VERSION = 1
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+def state_path(translate_srt_path: str) -> str:
+    """译文字幕对应的翻译状态文件路径"""
+    return translate_srt_path + STATE_SUFFIX
+
+
+def _normalize(text: str) -> str:
+    """对比用的规范化：合并空白，忽略首尾空白"""
+    return _SPACE_RE.sub(' ', text or '').strip()
+
+
+def save_translation_state(translate_srt_path: str, asr_data: ASRData, source_lang: str, target_lang: str) -> None:
+    """
+    保存翻译状态，先写临时文件再原子替换，避免中途失败留下半个文件
+    """
+    state = {
+        "version": STATE_VERSION,
+        "source_lang": source_lang,
+        "target_lang": target_lang,
+        "segments": [
+            {"text": seg.text, "direct": seg.direct, "free": seg.free}
+            for seg in asr_data.segments
+        ],
+    }
+    path = state_path(translate_srt_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_translation_state(translate_srt_path: str, source_lang: str, target_lang: str) -> Optional[List[dict]]:
+    """
+    读取翻译状态；文件不存在、格式不符或语言对不一致时返回None
+    """
+    path = state_path(translate_srt_path)
+    if not os.path.exists(path) or not os.path.exists(translate_srt_path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if (state.get("version") != STATE_VERSION
+            or state.get("source_lang") != source_lang
+            or state.get("target_lang") != target_lang):
+        return None
+    return state.get("segments") or None
+
+
+def remove_translation_state(translate_srt_path: str) -> None:
+    """删除译文字幕对应的翻译状态（译文被删除时调用）"""
+    path = state_path(translate_srt_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def merge_ranges(indices: List[int]) -> List[Tuple[int, int]]:
+    """把有序的句子序号合并为连续区间 [start, end)"""
+    ranges: List[Tuple[int, int]] = []
+    for i in indices:
+        if ranges and ranges[-1][1] == i:
+            ranges[-1] = (ranges[-1][0], i + 1)
+        else:
+            ranges.append((i, i + 1))
+    return ranges
+
+
+def apply_previous_translation(asr_data: ASRData, previous: List[dict]) -> List[Tuple[int, int]]:
+    """
+    按句对比新原文与旧翻译状态，把未改动句子的旧译文填入asr_data
+    返回需要重新翻译的区间列表 [(start, end), ...]
+    """
+    old_texts = [_normalize(seg.get("text", "")) for seg in previous]
+    new_texts = [_normalize(seg.text) for seg in asr_data.segments]
+    matcher = difflib.SequenceMatcher(None, old_texts, new_texts, autojunk=False)
+
+    dirty: List[int] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for old_idx, new_idx in zip(range(i1, i2), range(j1, j2)):
+                seg = asr_data.segments[new_idx]
+                seg.direct = previous[old_idx].get("direct", "")
+                seg.free = previous[old_idx].get("free", "")
+                if not seg.free:
+                    dirty.append(new_idx)
+        else:
+            # replace / insert 需要重新翻译；delete 在新原文中没有对应句子
+            dirty.extend(range(j1, j2))
+    return merge_ranges(sorted(dirty))
+
+
+def count_changed_cues(srt_content: str, translate_srt_path: str, source_lang: str, target_lang: str) -> Optional[int]:
+    """
+    统计新原文相对于已有译文所依据的原文，有多少句需要重新翻译
+    没有可用的翻译状态时返回None
+    """
+    previous = load_translation_state(translate_srt_path, source_lang, target_lang)
+    if previous is None:
+        return None
+    asr_data = from_srt(srt_content)
+    return sum(end - start for start, end in apply_previous_translation(asr_data, previous))
@@ -0,0 +1,143 @@
+"""
+本地启发式断句
+
+带标点的转录结果（ElevenLabs include_punctuation、阿里云 enable_punctuation）或很短的片段，
+不必再请求LLM断句。这里按以下信号在词级时间戳上直接断句：
+- 句末标点（。？！.?! 等）：强断点
+- 分句标点（，；：,;: 等）：句子超过 display 上限时的备选断点
+- 词与词之间的停顿：长停顿视为句末，中等停顿视为分句
+- display 长度上下限（MAX_DISPLAY_COUNT / MIN_DISPLAY_COUNT）
+
+只有置信度高时才返回断句结果，否则返回None，由调用方交给LLM处理。
+"""
+import re
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from utils.split_subtitle.asr_columnar import ColumnarASRData
+
+NO_BREAK = 0
+CLAUSE_BREAK = 1
+SENTENCE_BREAK = 2
+
+SENTENCE_PAUSE_MS = 1000   # 超过该停顿视为句末
+CLAUSE_PAUSE_MS = 300      # 超过该停顿可以作为分句断点
+SHORT_CHUNK_FACTOR = 2     # display 宽度不超过 MAX_DISPLAY_COUNT 的该倍数时，视为短片段，直接本地断句
+MIN_SENTENCE_MARKS = 0.5   # 每 MAX_DISPLAY_COUNT 宽度至少需要的句末标点数，低于该值视为没有标点
+MAX_FORCED_RATIO = 0.15    # 找不到任何断点的超长句子占总宽度的比例上限
+
+_SENTENCE_END_RE = re.compile(r'[.?!。？！…]["\'”’)）」』]*$')
+_CLAUSE_END_RE = re.compile(r'[,;:，；：、—]["\'”’)）」』]*$')
+
+
+def break_strength(text: str) -> int:
+    """按文本末尾的标点判断其后的断点强度"""
+    text = text.rstrip()
+    if _SENTENCE_END_RE.search(text):
+        return SENTENCE_BREAK
+    if _CLAUSE_END_RE.search(text):
+        return CLAUSE_BREAK
+    return NO_BREAK
+
+
+def break_strengths(texts: Sequence[str], keep: Sequence[int]) -> np.ndarray:
+    """
+    计算预处理后每个词之后的断点强度
+    texts 为预处理前的全部分段，keep 为保留下来的分段下标；被去掉的纯标点分段（如 ElevenLabs 单独输出的标点）
+    记到它前面最近一个保留的词上
+    """
+    strengths = np.zeros(len(keep), dtype=np.int8)
+    position = -1
+    next_kept = keep[0] if len(keep) else len(texts)
+    for i, text in enumerate(texts):
+        if i == next_kept:
+            position += 1
+            next_kept = keep[position + 1] if position + 1 < len(keep) else len(texts)
+        elif position < 0:
+            continue
+        strength = break_strength(text)
+        if strength > strengths[position]:
+            strengths[position] = strength
+    return strengths
+
+
+def segment_locally(
+    asr_data: ColumnarASRData,
+    strengths: np.ndarray,
+    max_display: int,
+    min_display: int,
+) -> Optional[List[str]]:
+    """
+    对一个分块做本地断句，返回句子列表（每句为若干词文本的直接拼接）；置信度不够时返回None
+
+    · 句末标点或长停顿处断句（句子短于 min_display 时留给后续 merge_short_segments 合并）
+    · 句子超过 max_display 时，在分句标点或中等停顿处断开
+    · 没有任何断点可用的超长句子计为“强制”部分，留给 split_segment_by_display_length 按时间间隔切分
+    """
+    count = len(asr_data)
+    if count == 0:
+        return []
+    total_width = asr_data.display_width()
+    gaps = np.append(asr_data.gaps(), 0)
+    sentence_end = (strengths >= SENTENCE_BREAK) | (gaps >= SENTENCE_PAUSE_MS)
+    clause_end = (strengths >= CLAUSE_BREAK) | (gaps >= CLAUSE_PAUSE_MS)
+
+    short_chunk = total_width <= max_display * SHORT_CHUNK_FACTOR
+    if not short_chunk:
+        marks = int(np.count_nonzero(strengths >= SENTENCE_BREAK))
+        if marks < total_width / max_display * MIN_SENTENCE_MARKS:
+            return None
+
+    sentences: List[str] = []
+    forced_width = 0.0
+    start = 0
+    for i in range(count):
+        if i == count - 1 or sentence_end[i]:
+            width = asr_data.display_width(start, i + 1)
+            if width > max_display:
+                forced_width += _split_long(asr_data, clause_end, start, i + 1, max_display, min_display, sentences)
+            else:
+                sentences.append(asr_data.concat_text(start, i + 1))
+            start = i + 1
+
+    if not short_chunk and forced_width > total_width * MAX_FORCED_RATIO:
+        return None
+    return [sentence.replace("\n", "") for sentence in sentences if sentence.strip()]
+
+
+def _split_long(
+    asr_data: ColumnarASRData,
+    clause_end: np.ndarray,
+    start: int,
+    end: int,
+    max_display: int,
+    min_display: int,
+    sentences: List[str],
+) -> float:
+    """
+    在分句断点处切分超长句子 [start, end)，结果追加到 sentences
+    贪心地取不超过 max_display 的最后一个断点，且两侧都不短于 min_display；返回找不到断点的部分的宽度
+    """
+    forced_width = 0.0
+    while start < end:
+        width = asr_data.display_width(start, end)
+        if width <= max_display:
+            sentences.append(asr_data.concat_text(start, end))
+            break
+        cut = -1
+        for i in range(start, end - 1):
+            if not clause_end[i]:
+                continue
+            head = asr_data.display_width(start, i + 1)
+            if head > max_display:
+                break
+            if head >= min_display and width - head >= min_display:
+                cut = i + 1
+        if cut < 0:
+            forced_width += width
+            sentences.append(asr_data.concat_text(start, end))
+            break
+        sentences.append(asr_data.concat_text(start, cut))
+        start = cut
+    return forced_width
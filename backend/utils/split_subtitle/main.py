@@ -1,18 +1,28 @@
+import heapq
 import os
 import re
 
-import difflib
 from typing import List, Tuple
 import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
 from utils.split_subtitle.ASRData import ASRData, from_srt, ASRDataSeg
+from utils.split_subtitle.asr_columnar import ColumnarASRData
+from utils.srt_io import parse_srt
 from utils.split_subtitle.split_by_llm import split_by_llm
+from utils.split_subtitle.local_segmenter import break_strengths, segment_locally
 from utils.split_subtitle.merge_english_words import WordMerger
+from utils.split_subtitle.sentence_align import align_sentences
+from utils.llm_cache import get_llm_cache
+from utils.llm_gateway import get_llm_gateway
+from utils.split_subtitle.batching import DEFAULT_BATCH_TOKEN_BUDGET
 
 MAX_DISPLAY_COUNT = 60  # display长度的最大数量
 MIN_DISPLAY_COUNT = 10   # display长度的最小数量
 SEGMENT_THRESHOLD = 800  # 每个分段的最大字数
-FIXED_NUM_THREADS = 4  # 固定的线程数量
+FIXED_NUM_THREADS = 16  # 线程数量上限，实际在途的LLM请求数由 llm_gateway 按服务商自适应控制
 SPLIT_RANGE = 50  # 在分割点前后寻找最大时间间隔的范围
 
 import logging
@@ -45,7 +55,7 @@ def is_pure_punctuation(s: str) -> bool:
     return not re.search(r'\w', s, flags=re.UNICODE)
 
 
-from utils.split_subtitle.cnt_tokens import count_words, cnt_display_words
+from utils.split_subtitle.cnt_tokens import count_words, cnt_display_words, is_english_char, is_digit, is_english_punctuation
 
 def preprocess_text(s: str) -> str:
     """
@@ -61,86 +71,42 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
     sentences: List[str],LLM根据完整句子生成的分句列表
     这里已经粗筛过一次，asr_data和sentence都是这个800字左右的Section
     """
-    asr_texts = [seg.text for seg in asr_data.segments]
-    asr_len = len(asr_texts)
-    asr_index = 0  # 当前分段索引位置
-    threshold = 0.5  # 相似度阈值
-    max_shift = 10   # 滑动窗口的最大偏移量
+    asr_data = ColumnarASRData.from_asr_data(asr_data).build_display_index()
+    spans = align_sentences(asr_data.texts(), sentences)
 
-    new_segments = []  # 存储List[List[ASRDataSeg]]以保留token时间信息
+    new_segments = []  # 存储每句对应的token区间 [start, end)，切片即可保留token时间信息
 
-    for sentence in sentences:
+    for sentence, span in zip(sentences, spans):
         logger.info(f"[+] 处理句子: {sentence}")
-        sentence_proc = preprocess_text(sentence)
-        word_count = count_words(sentence_proc)
-        best_ratio = 0.0
-        best_pos = None
-        best_window_size = 0
-
-        # 滑动窗口大小，优先考虑接近句子词数的窗口
-        # 最多为目标词数的2倍
-        # 但不能超过剩余的ASR数据长度
-        min_window_size = max(1, word_count // 2)
-        # 至少为1（保证窗口不为空）
-        # 通常为目标词数的一半
-        max_window_size = min(word_count * 2, asr_len - asr_index)
-
-        window_sizes = sorted(range(min_window_size, max_window_size + 1), key=lambda x: abs(x - word_count))
-
-        for window_size in window_sizes:
-            max_start = min(asr_index + max_shift + 1, asr_len - window_size + 1)
-            for start in range(asr_index, max_start):
-                substr = ''.join(asr_texts[start:start + window_size])
-                substr_proc = preprocess_text(substr)
-                ratio = difflib.SequenceMatcher(None, sentence_proc, substr_proc).ratio()
-                if ratio > best_ratio:
-                    best_ratio = ratio
-                    best_pos = start
-                    best_window_size = window_size
-                if ratio == 1.0:
-                    break  # 完全匹配
-            if best_ratio == 1.0:
-                break  # 完全匹配
-
-        if best_ratio >= threshold and best_pos is not None:
-            start_seg_index = best_pos
-            end_seg_index = best_pos + best_window_size - 1
-
-            # 保留原始的ASRDataSeg列表，保持token级别的时间信息
-            matched_segments = asr_data.segments[start_seg_index:end_seg_index + 1]
-            merged_text = ''.join(seg.text for seg in matched_segments)
-
-            print(f"[+] 合并分段: {merged_text}")
-            print("=============")
-
-            # 存储匹配的分段列表，保持token时间信息
-            new_segments.append(matched_segments)
-
-            asr_index = end_seg_index + 1  # 移动到下一个未处理的分段
-        else:
-            # 无法匹配句子，跳过当前分段
-            print(f"[-] 无法匹配句子: {sentence},尝试匹配过的分段为{substr_proc},词数为{word_count}其Sequence匹配度为{ratio}")
-            # 匹配失败时只前进1步，而不是跳过整个窗口
-            asr_index += 1
+        if span is None:
+            print(f"[-] 无法匹配句子: {sentence}")
+            continue
+
+        start_seg_index, end_seg_index = span
+        merged_text = asr_data.concat_text(start_seg_index, end_seg_index + 1)
+
+        print(f"[+] 合并分段: {merged_text}")
+        print("=============")
+
+        new_segments.append((start_seg_index, end_seg_index + 1))
 
     # 统一处理过长和过短的分段
     print("[+] 正在处理过长分段...")
     processed_segments = []
-    for seg_list in new_segments:
-        # 计算整个句子的display长度
-        total_text = ''.join(seg.text for seg in seg_list)
-        display_len = cnt_display_words(total_text)
+    for start, end in new_segments:
+        # 计算整个句子的display长度（前缀和，无需拼接文本）
+        display_len = asr_data.display_width(start, end)
         
         if display_len > MAX_DISPLAY_COUNT:
-            # 需要分割的分段，传递List[ASRDataSeg]
-            split_segs = split_segment_by_display_length(seg_list)
+            # 需要分割的分段，传递token区间的切片
+            split_segs = split_segment_by_display_length(asr_data[start:end])
             processed_segments.extend(split_segs)
         else:
             # 创建单个合并的ASRDataSeg用于最终输出
             merged_seg = ASRDataSeg(
-                total_text,
-                seg_list[0].start_time,
-                seg_list[-1].end_time
+                asr_data.concat_text(start, end),
+                int(asr_data.starts[start]),
+                int(asr_data.ends[end - 1])
             )
             processed_segments.append(merged_seg)
     
@@ -171,25 +137,27 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
     return ASRData(merged_final_segments)
 
 
-def split_segment_by_display_length(seg_list: List[ASRDataSeg]) -> List[ASRDataSeg]:
+def split_segment_by_display_length(seg_list) -> List[ASRDataSeg]:
     """
     基于display长度分割ASRDataSeg列表，保持token级别的时间信息
+    seg_list: ASRDataSeg列表或 ColumnarASRData 切片，递归时只做切片，不复制分段
     """
     result = []
     
-    if not seg_list:
+    if not len(seg_list):
         return result
+    if not isinstance(seg_list, ColumnarASRData):
+        seg_list = ColumnarASRData.from_segments(seg_list)
     
     # 计算总的display长度
-    total_text = ''.join(seg.text for seg in seg_list)
-    total_display_len = cnt_display_words(total_text)
+    total_display_len = seg_list.display_width()
     
     if total_display_len <= MAX_DISPLAY_COUNT:
         # 不需要分割，合并为单个segment
         merged_seg = ASRDataSeg(
-            total_text,
-            seg_list[0].start_time,
-            seg_list[-1].end_time
+            seg_list.concat_text(),
+            int(seg_list.starts[0]),
+            int(seg_list.ends[-1])
         )
         result.append(merged_seg)
         return result
@@ -198,7 +166,7 @@ def split_segment_by_display_length(seg_list: List[ASRDataSeg]) -> List[ASRDataS
     n = len(seg_list)
     if n <= 1:
         # 只有一个segment，直接返回
-        result.extend(seg_list)
+        result.extend(seg_list.to_segments())
         return result
     logger.info(f"[+] 开始分割ASRDataSeg列表，长度为 {n}")
     
@@ -206,19 +174,14 @@ def split_segment_by_display_length(seg_list: List[ASRDataSeg]) -> List[ASRDataS
     start_idx = max(1, n // 6)
     end_idx = min(n - 1, (5 * n) // 6)
     
-    max_time_diff = 0
-    best_split_idx = -1
-    
-    for i in range(start_idx, end_idx + 1):
-        # 计算与前一个token的时间间隔
-        time_diff = seg_list[i].start_time - seg_list[i - 1].end_time
-        if time_diff > max_time_diff:
-            max_time_diff = time_diff
-            best_split_idx = i
-    
-    # 如果没有找到合适的分割点或时间差太小，使用中点
-    if best_split_idx == -1 or max_time_diff < 50:  # 50毫秒作为阈值
-        best_split_idx = n // 2
+    # 与前一个token的时间间隔，取第一个最大值
+    time_diffs = seg_list.gaps()[start_idx - 1:end_idx]
+    best_split_idx = n // 2
+    if len(time_diffs):
+        k = int(time_diffs.argmax())
+        # 时间差太小（50毫秒以内）时使用中点
+        if time_diffs[k] >= 50:
+            best_split_idx = start_idx + k
     
     # 根据找到的分割点分割
     first_part = seg_list[:best_split_idx]
@@ -230,73 +193,127 @@ def split_segment_by_display_length(seg_list: List[ASRDataSeg]) -> List[ASRDataS
     
     return result
 
+def _display_span(text: str) -> Tuple[float, bool, bool, bool, bool, bool]:
+    """
+    计算文本的display宽度以及直接拼接时需要的边界信息：
+    (宽度, 是否为空, 首字符是否为空白, 尾字符是否为空白, 是否含有token, 最后一个token是否以需要补空格的字符结尾)
+    """
+    tokens = text.split()
+    tail_spaced = False
+    if tokens:
+        last_char = tokens[-1][-1]
+        tail_spaced = is_english_char(last_char) or is_digit(last_char) or is_english_punctuation(last_char)
+    return (cnt_display_words(text), not text, text[:1].isspace(), text[-1:].isspace(), bool(tokens), tail_spaced)
+
+
+def _concat_span(a: Tuple, b: Tuple) -> Tuple[float, bool, bool, bool, bool, bool]:
+    """
+    由两段文本各自的display信息得到 a+b 的display信息，结果与对拼接后的文本调用 cnt_display_words 相同：
+    拼接处两侧都不是空白时首尾token粘成一个，宽度直接相加；
+    否则 a 的最后一个token后面多出一个token分隔，按 cnt_display_words 的规则可能补0.5格空格
+    （各字符宽度都是0.25的整数倍，浮点加法没有舍入误差）
+    """
+    a_width, a_empty, a_first_space, a_last_space, a_tokens, a_tail = a
+    b_width, b_empty, b_first_space, b_last_space, b_tokens, b_tail = b
+    width = a_width + b_width
+    if a_tokens and b_tokens and a_tail and (a_last_space or b_first_space):
+        width += 0.5
+    return (
+        width,
+        a_empty and b_empty,
+        b_first_space if a_empty else a_first_space,
+        a_last_space if b_empty else b_last_space,
+        a_tokens or b_tokens,
+        b_tail if b_tokens else a_tail,
+    )
+
+
 def merge_short_segments_iteratively(segments: List[ASRDataSeg]) -> List[ASRDataSeg]:
     """
     循环合并过短的分段，基于display_words最小值
+    每一轮从左到右处理过短的分段，与时间间隔较小的一侧合并：
+    - 与后一段合并后立即复查合并结果
+    - 与前一段合并的结果若仍过短，留到下一轮处理
+    用下标双向链表代替列表拼接，缓存每段的display宽度，并用按位置排序的最小堆只访问过短的分段，
+    总复杂度 O(n log n)，输出与逐轮扫描整个列表的实现完全一致
     """
-    result = segments.copy()
-    changed = True
-    
-    while changed:
+    n = len(segments)
+    if n == 0:
+        return []
+
+    # 每个节点以其最左侧原始分段的下标标识，合并后保留左侧节点，因此下标顺序即链表顺序
+    prev_idx = list(range(-1, n - 1))
+    next_idx = list(range(1, n + 1))
+    next_idx[-1] = -1
+    alive = [True] * n
+    merged = [False] * n
+    parts = [[seg.text] for seg in segments]
+    starts = [seg.start_time for seg in segments]
+    ends = [seg.end_time for seg in segments]
+    spans = [_display_span(seg.text) for seg in segments]
+
+    def join(left: int, right: int) -> None:
+        """把 right 并入 left（二者相邻，left 在前）"""
+        parts[left].extend(parts[right])
+        ends[left] = ends[right]
+        spans[left] = _concat_span(spans[left], spans[right])
+        after = next_idx[right]
+        next_idx[left] = after
+        if after != -1:
+            prev_idx[after] = left
+        alive[right] = False
+        merged[left] = True
+
+    pending = [i for i in range(n) if spans[i][0] < MIN_DISPLAY_COUNT]  # 升序列表本身就是合法的堆
+    while pending:
+        next_round: List[int] = []
+        queued = set()
         changed = False
-        i = 0
-        
-        while i < len(result):
-            seg = result[i]
-            display_len = cnt_display_words(seg.text)
-            
-            if display_len < MIN_DISPLAY_COUNT:
+        while pending:
+            i = heapq.heappop(pending)
+            if not alive[i]:
+                continue
+            while spans[i][0] < MIN_DISPLAY_COUNT:
+                p, q = prev_idx[i], next_idx[i]
                 # 计算与前后分段的时间差
-                prev_time_diff = float('inf')
-                next_time_diff = float('inf')
-                
-                if i > 0:
-                    prev_seg = result[i - 1]
-                    prev_time_diff = seg.start_time - prev_seg.end_time
-                
-                if i < len(result) - 1:
-                    next_seg = result[i + 1]
-                    next_time_diff = next_seg.start_time - seg.end_time
-                
+                prev_time_diff = starts[i] - ends[p] if p != -1 else float('inf')
+                next_time_diff = starts[q] - ends[i] if q != -1 else float('inf')
+
                 # 选择时间差较小的进行合并
-                if prev_time_diff <= next_time_diff and i > 0:
-                    # 与前一个分段合并
-                    prev_seg = result[i - 1]
-                    merged_text = prev_seg.text + seg.text
-                    
-                    merged_seg = ASRDataSeg(
-                        merged_text,
-                        prev_seg.start_time,
-                        seg.end_time,
-                        "",  # 直接翻译
-                        "",  # 自由翻译
-                        ""   # 反思翻译
-                    )
-                    result[i - 1:i + 1] = [merged_seg]
+                if prev_time_diff <= next_time_diff and p != -1:
+                    # 与前一个分段合并，合并结果在本轮游标之后不再访问
+                    join(p, i)
                     changed = True
-                    # 不增加i，因为列表长度减少了
-                elif next_time_diff < prev_time_diff and i < len(result) - 1:
-                    # 与后一个分段合并
-                    next_seg = result[i + 1]
-                    merged_text = seg.text + next_seg.text
-                    
-                    merged_seg = ASRDataSeg(
-                        merged_text,
-                        seg.start_time,
-                        next_seg.end_time,
-                        "",  # 直接翻译
-                        "",  # 自由翻译
-                        ""   # 反思翻译
-                    )
-                    result[i:i + 2] = [merged_seg]
+                    if spans[p][0] < MIN_DISPLAY_COUNT and p not in queued:
+                        queued.add(p)
+                        heapq.heappush(next_round, p)
+                    break
+                elif next_time_diff < prev_time_diff and q != -1:
+                    # 与后一个分段合并，继续检查合并后的分段
+                    join(i, q)
                     changed = True
-                    # 不增加i，继续检查合并后的分段
                 else:
-                    # 无法合并（边界情况）
-                    i += 1
-            else:
-                i += 1
-    
+                    # 无法合并（只剩一个分段）
+                    break
+        if not changed:
+            break
+        pending = next_round
+
+    result = []
+    i = 0  # 最左侧的节点不会被并入前一段，始终存活
+    while i != -1:
+        if merged[i]:
+            result.append(ASRDataSeg(
+                ''.join(parts[i]),
+                starts[i],
+                ends[i],
+                "",  # 直接翻译
+                "",  # 自由翻译
+                ""   # 反思翻译
+            ))
+        else:
+            result.append(segments[i])
+        i = next_idx[i]
     return result
 
 
@@ -316,9 +333,10 @@ def split_asr_data(asr_data: ASRData, num_segments: int) -> List[ASRData]:
     1. 计算总字数与分段数，并确定每个分段的字数范围。
     2. 确定平均分割点。
     3. 在分割点前后一定范围内，寻找时间间隔最大的点作为实际的分割点。
-    返回：List[ASRData]，即分段列表，每一个ASRData对象代表一个分段,包含其中所有的ASRDataSeg对象。
+    返回：List[ColumnarASRData]，即分段列表，每一个分段是整个字幕的切片，与原数据共享存储。
     """
-    total_segs = len(asr_data.segments)
+    asr_data = ColumnarASRData.from_asr_data(asr_data)
+    total_segs = len(asr_data)
     total_word_count = count_words(asr_data.to_txt())
     words_per_segment = total_word_count // num_segments
     split_indices = []
@@ -330,19 +348,18 @@ def split_asr_data(asr_data: ASRData, num_segments: int) -> List[ASRData]:
     # 比如7047个字，分成8段，每段880个字。
     split_indices = [i * words_per_segment for i in range(1, num_segments)]
     # 调整分割点：在每个平均分割点附近寻找时间间隔最大的点
+    gaps = asr_data.gaps()
     adjusted_split_indices = []
     for split_point in split_indices:
         # 定义搜索范围
         start = max(0, split_point - SPLIT_RANGE)
         end = min(total_segs - 1, split_point + SPLIT_RANGE)
-        # 在范围内找到时间间隔最大的点
-        max_gap = -1
+        # 在范围内找到时间间隔最大的点（取第一个最大值；间隔均为负时保持平均分割点）
         best_index = split_point
-        for j in range(start, end):
-            gap = asr_data.segments[j + 1].start_time - asr_data.segments[j].end_time
-            if gap > max_gap:
-                max_gap = gap
-                best_index = j
+        if end > start:
+            j = int(gaps[start:end].argmax())
+            if gaps[start + j] > -1:
+                best_index = start + j
         adjusted_split_indices.append(best_index)
 
     # 移除重复的分割点
@@ -352,12 +369,12 @@ def split_asr_data(asr_data: ASRData, num_segments: int) -> List[ASRData]:
     segments = []
     prev_index = 0
     for index in adjusted_split_indices:
-        part = ASRData(asr_data.segments[prev_index:index + 1])
+        part = asr_data[prev_index:index + 1]
         segments.append(part)
         prev_index = index + 1
     # 添加最后一部分
     if prev_index < total_segs:
-        part = ASRData(asr_data.segments[prev_index:])
+        part = asr_data[prev_index:]
         segments.append(part)
 
     return segments
@@ -381,7 +398,7 @@ def optimise_srt(
     save_path: str,
     num_threads: int = FIXED_NUM_THREADS,
     progress_cb: Callable[[float], None] | None = None,   # 0.0‒1.0 之间
-) -> None:
+) -> dict:
     settings = load_all_settings()
     use_proxy = settings.get('DEFAULT', {}).get('use_proxy', 'true').lower() == 'true'
     if not use_proxy:
@@ -395,10 +412,12 @@ def optimise_srt(
     base_url = settings.get('DEFAULT', {}).get(f'{selected_model_provider}_base_url', 'https://api.deepseek.com')
     enable_thinking = settings.get('DEFAULT', {}).get('enable_thinking', 'true')
     model = ENGINES[selected_model_provider]["thinking" if enable_thinking == 'true' else "normal"]
+    use_local_segmentation = settings.get('DEFAULT', {}).get('local_segmentation', 'true').lower() == 'true'
     """
     · 将 用于优化字幕。
     · 增加 progress_cb 回调，用于上报阶段内进度（0‑1）
       ‑ 若未传递则默认什么都不做
+    · 带标点或很短的分块先本地断句，只有置信度不够的分块才请求LLM；返回本次的断句统计
     """
     if progress_cb is None:               # 回调默认空操作
         progress_cb = lambda ratio: None
@@ -406,19 +425,25 @@ def optimise_srt(
     if progress_cb:
         progress_cb("Running")      # 读取srt文件为一整个asr_data
     with open(srt_path, encoding="utf-8") as f:
-        asr_data = from_srt(f.read())
+        cues = parse_srt(f.read())
 
     # 预处理ASR数据，去除标点并转换为小写
-    new_segments= []
-    for seg in asr_data.segments:
-        if not is_pure_punctuation(seg.text):
-            if re.match(r"^[a-zA-Z\']+$", seg.text.strip()):
-                seg.text = seg.text.lower() + " "
-            new_segments.append(seg)
-    asr_data.segments = new_segments
+    keep = []
+    texts = []
+    for i, text in enumerate(cues.texts):
+        if not is_pure_punctuation(text):
+            if re.match(r"^[a-zA-Z\']+$", text.strip()):
+                text = text.lower() + " "
+            keep.append(i)
+            texts.append(text)
+    # 之后的分割、对齐和合并都在列式数据上按区间进行
+    asr_data = ColumnarASRData.from_columns(texts, cues.starts[keep], cues.ends[keep]).build_display_index()
+    # 每个词之后的断点强度（去掉的纯标点分段记到前一个词上），供本地断句使用
+    strengths = break_strengths(cues.texts, keep)
+    del cues, texts
 
     # 将整个字幕合并为文本
-    txt = asr_data.to_txt().replace("\n", "")
+    txt = asr_data.plain_text()
     total_word_count = count_words(txt)
     print(f"[+] 待分割段落文本长度: {total_word_count} 字")
 
@@ -427,12 +452,12 @@ def optimise_srt(
 
     # 打印所有word-level时间戳字幕（用于调试）
     logger.debug("[DEBUG] ========== Word-level Timestamps ==========")
-    logger.debug(f"[DEBUG] 总共 {len(asr_data.segments)} 个word segments")
-    for i, seg in enumerate(asr_data.segments[:20]):  # 只打印前20个
+    logger.debug(f"[DEBUG] 总共 {len(asr_data)} 个word segments")
+    for i, seg in enumerate(asr_data[:20]):  # 只打印前20个
         # start_time和end_time是毫秒，需要除以1000转换为秒
         logger.debug(f"[DEBUG] Segment {i}: [{seg.start_time/1000:.2f}s - {seg.end_time/1000:.2f}s] '{seg.text}'")
-    if len(asr_data.segments) > 20:
-        logger.debug(f"[DEBUG] ... (还有 {len(asr_data.segments) - 20} 个segments)")
+    if len(asr_data) > 20:
+        logger.debug(f"[DEBUG] ... (还有 {len(asr_data) - 20} 个segments)")
     logger.debug("[DEBUG] ============================================")
 
     num_segments = determine_num_segments(
@@ -442,6 +467,9 @@ def optimise_srt(
 
     # 分割ASRData
     asr_data_segments = split_asr_data(asr_data, num_segments)
+    # 分块是连续且按顺序覆盖全部词的切片，按长度累加得到每块在 strengths 中的位置
+    chunk_bounds = np.cumsum([0] + [len(part) for part in asr_data_segments])
+    chunk_strengths = [strengths[a:b] for a, b in zip(chunk_bounds, chunk_bounds[1:])]
 
     # ── 10‑85 %： 多线程执行 split_by_llm 获取句子列表 ─────────────────
     # 🆕 进度追踪变量
@@ -449,12 +477,22 @@ def optimise_srt(
     completed_chunks = 0
     total_chunks = len(asr_data_segments)
     progress_lock = threading.Lock()
-
-    def process_segment(asr_data_part):
-        nonlocal completed_chunks
-        part_txt = asr_data_part.to_txt().replace("\n", "")
-        sentences = split_by_llm(part_txt, use_cache=True,api_key=api_key,model=model,base_url=base_url)
-        print(f"[+] 分段的句子提取完成，共 {len(sentences)} 句")
+    local_chunks = 0
+
+    def process_segment(item):
+        nonlocal completed_chunks, local_chunks
+        asr_data_part, part_strengths = item
+        sentences = None
+        if use_local_segmentation:
+            sentences = segment_locally(asr_data_part, part_strengths, MAX_DISPLAY_COUNT, MIN_DISPLAY_COUNT)
+        if sentences is None:
+            part_txt = asr_data_part.plain_text()
+            sentences = split_by_llm(part_txt, use_cache=True,api_key=api_key,model=model,base_url=base_url)
+            print(f"[+] 分段的句子提取完成，共 {len(sentences)} 句")
+        else:
+            with progress_lock:
+                local_chunks += 1
+            print(f"[+] 分段本地断句完成（跳过LLM），共 {len(sentences)} 句")
         # 🆕 线程安全地更新进度 (10% ~ 85%)
         with progress_lock:
             completed_chunks += 1
@@ -471,7 +509,7 @@ def optimise_srt(
     • 既然 map 已经满足性能要求，又天然保证顺序，最简单的就是保留 map 写法。(所以这里只需要提供是否完成，不需要提供进度)
     """
     with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        all_sentences = list(executor.map(process_segment, asr_data_segments))
+        all_sentences = list(executor.map(process_segment, zip(asr_data_segments, chunk_strengths)))
     logger.info("all_sentences before flatten: %s", all_sentences)
     all_sentences = [item for sublist in all_sentences for item in sublist] # 摊平元素，all_sentences 被假定为二维列表
     logger.info("all_sentences after flatten: %s", all_sentences)
@@ -489,6 +527,15 @@ def optimise_srt(
     """
 
     print(f"[+] 总共提取到 {len(all_sentences)} 句")
+    segmentation_stats = {
+        'chunks': total_chunks,
+        'local_chunks': local_chunks,
+        'llm_chunks': total_chunks - local_chunks,
+        'skipped_llm_calls': local_chunks,
+    }
+    logger.info(f"[+] 断句统计: {segmentation_stats}")
+    logger.info(f"[+] LLM缓存统计: {get_llm_cache().stats()}")
+    logger.info(f"[+] LLM网关统计: {get_llm_gateway().stats()}")
 
     # 基于LLM已经分段的句子，对ASR分段进行合并
     print("[+] 正在合并ASR分段基于句子列表...")
@@ -498,51 +545,99 @@ def optimise_srt(
 
     # ── 95‑100 %：写文件 ───────────────────────
     final_asr_data = ASRData(merged_asr.segments)
-    final_asr_data.to_srt(save_path=save_path,use_translation=False)
+    final_asr_data.save_srt(save_path, use_translation=False)
     print("[+] 已完成 srt 文件合并")
     if progress_cb:
         progress_cb("Completed")        
 
     print("[+] 已完成 srt 文件合并")
+    return segmentation_stats
 
 def translate_srt(raw_srt_path, 
                   translate_srt_path,
                   raw_lang="en", 
-                  target_lang="zh",
+                  target_lang="zh",  # A language code, or a list of codes to translate into several languages at once
                   use_translation_cache: bool = True,  # Whether to use translation cache
                   num_threads: int = FIXED_NUM_THREADS,  # Number of threads for translation
-                  batch_size: int = 15,  # Batch size for LLM processing (10-20 sentences per batch)
+                  batch_size: int = 40,  # Max sentences per LLM batch; batches are packed by token_budget
                   progress_cb: Callable[[float], None] | None = None,
                   terms_to_note: str = "",  # Terms to emphasize in translation
+                  token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET,  # Estimated source tokens per LLM request
+                  single_call: bool | None = None,  # One request per batch for direct+free translation; None reads settings
+                  incremental: bool = True,  # Reuse the stored translation for cues whose source text is unchanged
     ):
     """
     翻译 SRT 文件的主函数
+    target_lang 为列表时一次完成多个目标语言：原文只加载和预处理一次，各语言并发翻译，
+    此时 translate_srt_path 为 {语言: 路径} 字典，或包含 "{lang}" 占位符的路径模板
+    incremental 为True且译文旁存在同语言对的翻译状态时，只重新翻译改动过的句子
+    返回各批次token用量的汇总（见 translate.summarize_usage），增量模式下额外包含 reused_segments；
+    多目标语言时返回 {语言: 汇总}
     """
     import logging
-    from utils.split_subtitle.translate import two_step_translate
+    from utils.split_subtitle.translate import multi_target_translate, summarize_usage, copy_source, remember_translations
+    from utils.split_subtitle.incremental import load_translation_state, save_translation_state, apply_previous_translation
     
     logger = logging.getLogger('subtitle_translate')
     logger.info("开始翻译字幕...")
     
+    multi_target = not isinstance(target_lang, str)
+    target_langs = list(target_lang) if multi_target else [target_lang]
+    if isinstance(translate_srt_path, dict):
+        output_paths = dict(translate_srt_path)
+    elif translate_srt_path and multi_target:
+        output_paths = {lang: translate_srt_path.format(lang=lang) for lang in target_langs}
+    else:
+        output_paths = {target_lang: translate_srt_path}
+    
     # 从raw_srt_path加载原始字幕
     with open(raw_srt_path, encoding="utf-8") as f:
         raw_asr_data = from_srt(f.read())
     logger.info("原文字幕加载完成")
     
-    # 翻译字幕
-    final_asr_data = two_step_translate(raw_asr_data, use_cache=use_translation_cache, num_threads=num_threads, batch_size=batch_size, source_lang=raw_lang, target_lang=target_lang, terms_to_note=terms_to_note)
+    # 每个目标语言一份副本；增量模式下沿用原文未改动句子的旧译文，只翻译改动的区间
+    asr_by_lang = {}
+    ranges_by_lang = {}
+    for lang in target_langs:
+        asr_by_lang[lang] = copy_source(raw_asr_data)
+        path = output_paths.get(lang)
+        previous = load_translation_state(path, raw_lang, lang) if (incremental and path) else None
+        if previous is not None:
+            ranges = apply_previous_translation(asr_by_lang[lang], previous)
+            ranges_by_lang[lang] = ranges
+            changed = sum(end - start for start, end in ranges)
+            logger.info(f"{lang} 增量翻译：共{len(raw_asr_data.segments)}句，{changed}句需要重新翻译，分布在{len(ranges)}个区间")
+    
+    # 翻译字幕（原文没有改动的语言直接沿用已有译文）
+    usage_reports = {lang: [] for lang in target_langs}
+    pending = {lang: data for lang, data in asr_by_lang.items() if ranges_by_lang.get(lang) != []}
+    if pending:
+        asr_by_lang.update(multi_target_translate(pending, use_cache=use_translation_cache, num_threads=num_threads, batch_size=batch_size, source_lang=raw_lang, terms_to_note=terms_to_note, token_budget=token_budget, usage_reports=usage_reports, single_call=single_call, ranges_by_lang=ranges_by_lang))
     logger.info("字幕翻译完成")
     
-    # 如果提供了翻译保存路径，则保存翻译字幕
-    if translate_srt_path:
-        final_asr_data.to_srt(save_path=translate_srt_path, use_translation=True)
-        logger.info(f"保存翻译字幕: {translate_srt_path}")
-    else:
-        logger.warning("未提供翻译字幕保存路径，翻译字幕未保存")
+    # 如果提供了翻译保存路径，则保存翻译字幕及翻译状态（供下次增量翻译使用），均为原子替换
+    summaries = {}
+    for lang in target_langs:
+        path = output_paths.get(lang)
+        if path:
+            asr_by_lang[lang].save_srt(path, use_translation=True)
+            save_translation_state(path, asr_by_lang[lang], raw_lang, lang)
+            logger.info(f"保存翻译字幕: {path}")
+        else:
+            logger.warning(f"未提供 {lang} 翻译字幕保存路径，翻译字幕未保存")
+        # 完成的译文写入跨视频翻译记忆，供同一合集中其他视频复用
+        remember_translations(asr_by_lang[lang], raw_lang, lang)
+        summary = summarize_usage(usage_reports[lang])
+        if lang in ranges_by_lang:
+            summary["reused_segments"] = len(raw_asr_data.segments) - sum(end - start for start, end in ranges_by_lang[lang])
+        summaries[lang] = summary
     
     logger.info("翻译完成")
+    logger.info(f"LLM缓存统计: {get_llm_cache().stats()}")
+    logger.info(f"LLM网关统计: {get_llm_gateway().stats()}")
     if progress_cb:
         progress_cb("Completed")
+    return summaries if multi_target else summaries[target_lang]
 
 # '线程数量'
 num_threads=FIXED_NUM_THREADS
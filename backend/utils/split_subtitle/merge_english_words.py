@@ -1,5 +1,33 @@
+import os
 import re
-from typing import List, Tuple, Set
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import FrozenSet, List, Optional, Tuple
+
+# 预编译正则，避免每句字幕都重新解析
+# CJK字符范围：
+# \u4e00-\u9fff: 中文汉字
+# \u3040-\u309f: 日文平假名
+# \u30a0-\u30ff: 日文片假名
+# \uac00-\ud7af: 韩文字符
+_CJK_RE = re.compile(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]')
+_ENGLISH_RE = re.compile(r'[a-zA-Z]')
+# 连续的英文字母（可能包含空格）
+_FRAGMENT_RE = re.compile(r'[a-zA-Z]+(?:\s+[a-zA-Z]+)*')
+
+# 词典缓存文件：首次从 pyspellchecker 加载后写成纯文本，之后启动时直接读取
+WORD_DICT_CACHE_PATH = os.getenv(
+    'VIDGO_WORD_DICT_CACHE_PATH',
+    str(Path(__file__).parent.parent.parent / "work_dir" / "word_dict.txt"),
+)
+MERGE_CACHE_SIZE = 65536  # try_merge_words 的记忆化条目上限
+MIN_DICT_WORDS = 10000  # 缓存词数低于此值时视为损坏（pyspellchecker 英文词典约16万词）
+
+# 进程内共享的只读词典
+_word_set: Optional[FrozenSet[str]] = None
+_dict_source = ""
+_word_set_lock = threading.Lock()
 
 def has_cjk_and_english(text: str) -> bool:
     """
@@ -11,70 +39,134 @@ def has_cjk_and_english(text: str) -> bool:
     Returns:
         布尔值，True表示同时包含CJK和英文字符
     """
-    # CJK字符范围：
-    # \u4e00-\u9fff: 中文汉字
-    # \u3040-\u309f: 日文平假名
-    # \u30a0-\u30ff: 日文片假名
-    # \uac00-\ud7af: 韩文字符
-    cjk_pattern = r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]'
-    english_pattern = r'[a-zA-Z]'
-    
-    has_cjk = bool(re.search(cjk_pattern, text))
-    has_english = bool(re.search(english_pattern, text))
-    
-    return has_cjk and has_english
+    return bool(_CJK_RE.search(text)) and bool(_ENGLISH_RE.search(text))
 
-class WordMerger:
-    def __init__(self):
-        """
-        初始化词根合并器，尝试使用多种英文单词库
-        """
-        self.word_set = set()
-        self.dict_source = ""
-        
-        # 按优先级尝试不同的单词库
-        self._load_word_dict()
+def _spellchecker_version() -> str:
+    """返回已安装的 pyspellchecker 版本，未安装时返回空字符串"""
+    try:
+        from importlib.metadata import version
+        return version('pyspellchecker')
+    except Exception:
+        return ""
+
+def _read_dict_cache(expected_version: str) -> Optional[FrozenSet[str]]:
+    """
+    读取词典缓存文件；首行记录生成它的 pyspellchecker 版本和词数
+    版本不一致、词数与首行不符（文件被截断）或词数过少时视为失效
+    """
+    try:
+        with open(WORD_DICT_CACHE_PATH, encoding='utf-8') as f:
+            header = f.readline().split()
+            if len(header) != 4 or header[:3] != ["#", "pyspellchecker", expected_version] or not header[3].isdigit():
+                return None
+            words = frozenset(f.read().split())
+    except (OSError, UnicodeDecodeError):
+        return None
+    if len(words) != int(header[3]) or len(words) < MIN_DICT_WORDS:
+        return None
+    return words
+
+def _write_dict_cache(words: FrozenSet[str], spell_version: str) -> None:
+    """把词典写入缓存文件（先写临时文件再原子替换）"""
+    try:
+        os.makedirs(os.path.dirname(WORD_DICT_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{WORD_DICT_CACHE_PATH}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"# pyspellchecker {spell_version} {len(words)}\n")
+            f.write("\n".join(sorted(words)))
+        os.replace(tmp_path, WORD_DICT_CACHE_PATH)
+    except OSError as e:
+        print(f"写入词典缓存失败: {e}")
+
+def _load_minimal_words() -> FrozenSet[str]:
+    """
+    最小化的备用词汇表（仅在无法加载其他库时使用）
+    """
+    # 这只是一个很小的备用集合，建议安装 pyspellchecker
+    return frozenset({
+        'remote', 'github', 'repository', 'main', 'branch', 'commit',
+        'config', 'clone', 'push', 'pull', 'merge', 'status', 'add',
+        'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had',
+        'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his',
+        'how', 'man', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy'
+    })
+
+def get_word_dict() -> Tuple[FrozenSet[str], str]:
+    """
+    获取进程内共享的英文词典（小写单词的frozenset）及其来源，首次调用时加载：
+    1. 缓存文件存在且与已安装的 pyspellchecker 版本一致时直接读取
+    2. 否则从 pyspellchecker 构建，并写入缓存文件
+    3. pyspellchecker 不可用时使用最小化的备用词汇表
+    """
+    global _word_set, _dict_source
+    if _word_set is not None:
+        return _word_set, _dict_source
+    with _word_set_lock:
+        if _word_set is not None:
+            return _word_set, _dict_source
+
+        spell_version = _spellchecker_version()
+        words = _read_dict_cache(spell_version) if spell_version else None
+        if words:
+            source = "pyspellchecker (cache)"
+        else:
+            words, source = None, ""
+            try:
+                from spellchecker import SpellChecker
+                spell = SpellChecker()
+                words = frozenset(word.lower() for word in spell.word_frequency.dictionary.keys())
+                source = "pyspellchecker"
+                if spell_version:
+                    _write_dict_cache(words, spell_version)
+            except ImportError:
+                pass
+
+        if words:
+            print(f"成功加载 {source} 词典，包含 {len(words)} 个单词")
+        else:
+            # 如果所有库都不可用，输出安装提示
+            print("未找到可用的英文单词库，请安装: pip install pyspellchecker")
+            print("\n正在使用最小化的备用词汇表...")
+            words, source = _load_minimal_words(), "minimal backup"
+            print(f"使用备用词汇表，包含 {len(words)} 个单词")
+
+        _dict_source = source
+        _word_set = words
+    return _word_set, _dict_source
+
+@lru_cache(maxsize=MERGE_CACHE_SIZE)
+def _merge_fragment(fragment: str, max_words: int) -> str:
+    """try_merge_words 的实现，按片段记忆化（词典在进程内不可变，结果可以安全复用）"""
+    word_set, _ = get_word_dict()
+    words = fragment.split()
+    if len(words) <= 1:
+        return fragment
     
-    def _load_word_dict(self):
-        """
-        尝试加载英文单词字典，按优先级使用不同的库
-        """
+    result = []
+    i = 0
+    
+    while i < len(words):
+        best_merge = words[i]
+        best_length = 1
         
-        # 使用 pyspellchecker 库
-        try:
-            from spellchecker import SpellChecker
-            spell = SpellChecker()
-            self.word_set = spell.word_frequency.dictionary.keys()
-            self.word_set = set(word.lower() for word in self.word_set)
-            self.dict_source = "pyspellchecker"
-            print(f"成功加载 pyspellchecker 库，包含 {len(self.word_set)} 个单词")
-            return
-        except ImportError:
-            pass
+        # 尝试从当前位置开始合并2-max_words个单词
+        for length in range(2, min(max_words + 1, len(words) - i + 1)):
+            candidate = ''.join(words[i:i + length])
+            if candidate.lower() in word_set:
+                best_merge = candidate
+                best_length = length
         
-        # 如果所有库都不可用，输出安装提示
-        if not self.word_set:
-            print("未找到可用的英文单词库，请安装以下任一库：")
-            print("推荐: pip install english-words")
-            print("或者: pip install nltk")
-            print("或者: pip install pyspellchecker")
-            print("\n正在使用最小化的备用词汇表...")
-            self._load_minimal_words()
+        result.append(best_merge)
+        i += best_length
     
-    def _load_minimal_words(self):
+    return ' '.join(result)
+
+class WordMerger:
+    def __init__(self):
         """
-        加载最小化的备用词汇表（仅在无法加载其他库时使用）
+        初始化词根合并器；词典在进程内只加载一次，之后创建实例几乎没有开销
         """
-        # 这只是一个很小的备用集合，建议安装上述库
-        self.word_set = {
-            'remote', 'github', 'repository', 'main', 'branch', 'commit',
-            'config', 'clone', 'push', 'pull', 'merge', 'status', 'add',
-            'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had',
-            'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his',
-            'how', 'man', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy'
-        }
-        self.dict_source = "minimal backup"
-        print(f"使用备用词汇表，包含 {len(self.word_set)} 个单词")
+        self.word_set, self.dict_source = get_word_dict()
     
     def is_valid_word(self, word: str) -> bool:
         """
@@ -98,11 +190,9 @@ class WordMerger:
         Returns:
             包含(开始位置, 结束位置, 片段内容)的列表
         """
-        # 匹配连续的英文字母（可能包含空格）
-        pattern = r'[a-zA-Z]+(?:\s+[a-zA-Z]+)*'
         fragments = []
         
-        for match in re.finditer(pattern, text):
+        for match in _FRAGMENT_RE.finditer(text):
             start, end = match.span()
             fragment = match.group()
             # 只处理包含空格的片段（被分割的单词）
@@ -122,28 +212,7 @@ class WordMerger:
         Returns:
             合并后的文本
         """
-        words = fragment.split()
-        if len(words) <= 1:
-            return fragment
-        
-        result = []
-        i = 0
-        
-        while i < len(words):
-            best_merge = words[i]
-            best_length = 1
-            
-            # 尝试从当前位置开始合并2-max_words个单词
-            for length in range(2, min(max_words + 1, len(words) - i + 1)):
-                candidate = ''.join(words[i:i + length])
-                if self.is_valid_word(candidate):
-                    best_merge = candidate
-                    best_length = length
-            
-            result.append(best_merge)
-            i += best_length
-        
-        return ' '.join(result)
+        return _merge_fragment(fragment, max_words)
     
     def merge_text(self, text: str) -> str:
         """
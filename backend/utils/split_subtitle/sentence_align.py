@@ -0,0 +1,153 @@
+"""
+句子与ASR token流的对齐引擎。
+
+LLM返回的句子与ASR token流在规范化（小写、去除空白和标点）后应当是同一段文本，
+因此先把整个token流拼接为一个规范化字符串，并记录每个token在其中的字符偏移量。
+对齐时沿着该字符串单向前进：
+1. 优先在游标附近用 str.find 做精确匹配，要求匹配的起止位置都落在token边界上；
+2. 精确匹配失败时，才回到原先 窗口大小 × 起点偏移 × SequenceMatcher 的搜索，
+   候选区间与打分都不变，只用 quick_ratio 上界跳过不可能胜出的窗口，因此结果与原实现一致。
+绝大多数句子走第1步，代价与句子长度线性相关。
+第2步只在游标之后 max_shift 个token、句子词数 1/2~2 倍的窗口内搜索，单句代价与整段字幕长度无关，
+但仍是 起点数 × 窗口数 × SequenceMatcher，随句子变长超线性增长；
+因此整段的代价是线性的，系数取决于未能精确匹配的句子所占比例和这些句子的长度。
+"""
+import difflib
+import logging
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from utils.split_subtitle.cnt_tokens import count_words
+
+logger = logging.getLogger('subtitle_split')
+
+_NON_WORD_RE = re.compile(r'[\W_]+', flags=re.UNICODE)
+
+MATCH_THRESHOLD = 0.5  # 相似度阈值
+MAX_SHIFT = 10         # 句子起点最多允许越过的token数
+
+
+def normalize_for_align(s: str) -> str:
+    """
+    对齐用的规范化：转小写并去除所有空白和标点
+    """
+    return _NON_WORD_RE.sub('', s.lower())
+
+
+class TokenIndex:
+    """
+    token流的字符偏移索引
+    - text: 所有token规范化后拼接成的字符串
+    - offsets: 长度为 n+1，offsets[i] 为第i个token在text中的起始位置，offsets[n] == len(text)
+    - boundary: token边界的字符偏移 -> 从该偏移开始的第一个token序号
+    """
+    def __init__(self, token_texts: Sequence[str]):
+        parts = [normalize_for_align(t) for t in token_texts]
+        offsets = [0] * (len(parts) + 1)
+        pos = 0
+        for i, part in enumerate(parts):
+            offsets[i] = pos
+            pos += len(part)
+        offsets[len(parts)] = pos
+
+        boundary = {}
+        # 倒序写入，使同一偏移处（零宽token）序号最小者生效
+        for i in range(len(parts), -1, -1):
+            boundary[offsets[i]] = i
+
+        self.text = ''.join(parts)
+        self.offsets = offsets
+        self.boundary = boundary
+        self.size = len(parts)
+
+    def find_exact(self, pattern: str, first_token: int, last_start_token: int) -> Optional[Tuple[int, int]]:
+        """
+        在起点位于 [first_token, last_start_token] 的范围内，寻找与pattern完全一致且首尾都在token边界上的区间
+        返回 (start_token, end_token)，end_token为区间内最后一个token（包含）
+        """
+        lo = self.offsets[first_token]
+        hi = self.offsets[last_start_token] + len(pattern)
+        pos = self.text.find(pattern, lo, hi)
+        while pos != -1:
+            start = self.boundary.get(pos)
+            end = self.boundary.get(pos + len(pattern))
+            if start is not None and end is not None and end > start:
+                return start, end - 1
+            pos = self.text.find(pattern, pos + 1, hi)
+        return None
+
+
+def _preprocess(s: str) -> str:
+    """相似度比较用的规范化：转小写并合并空白（与改写前的 preprocess_text 相同）"""
+    return ' '.join(s.lower().split())
+
+
+def find_best_window(token_texts: Sequence[str], sentence: str, first_token: int,
+                     max_shift: int = MAX_SHIFT) -> Optional[Tuple[int, int, float]]:
+    """
+    精确匹配失败时的近似搜索，候选区间和打分与改写前的实现一一对应：
+    - 窗口大小在 [词数/2, 词数*2] 之间，按与句子词数的差距排序
+    - 起点位于 [first_token, first_token + max_shift]
+    - 取 SequenceMatcher 相似度最高者，同分时保留先找到的，遇到完全匹配立即结束
+    real_quick_ratio/quick_ratio 是 ratio 的上界，上界不超过当前最优时跳过精确计算，结果不变
+    返回 (start_token, end_token, ratio)，end_token 包含；没有候选窗口时返回None
+    """
+    sentence_proc = _preprocess(sentence)
+    word_count = count_words(sentence_proc)
+    n = len(token_texts)
+    min_window = max(1, word_count // 2)
+    max_window = min(word_count * 2, n - first_token)
+    matcher = difflib.SequenceMatcher(None, sentence_proc, '')
+    best_ratio = 0.0
+    best = None
+
+    for window in sorted(range(min_window, max_window + 1), key=lambda x: abs(x - word_count)):
+        for start in range(first_token, min(first_token + max_shift + 1, n - window + 1)):
+            matcher.set_seq2(_preprocess(''.join(token_texts[start:start + window])))
+            if matcher.real_quick_ratio() <= best_ratio or matcher.quick_ratio() <= best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best = (start, start + window - 1)
+            if ratio == 1.0:
+                return best[0], best[1], best_ratio
+    if best is None:
+        return None
+    return best[0], best[1], best_ratio
+
+
+def align_sentences(token_texts: Sequence[str], sentences: Sequence[str],
+                    threshold: float = MATCH_THRESHOLD,
+                    max_shift: int = MAX_SHIFT) -> List[Optional[Tuple[int, int]]]:
+    """
+    将每个句子映射到token流中的区间
+    token_texts: ASR token文本列表
+    sentences: LLM返回的句子列表（顺序与token流一致）
+    返回与sentences等长的列表，元素为 (start_token, end_token)（包含），无法匹配时为None
+    """
+    index = TokenIndex(token_texts)
+    n = index.size
+    cursor = 0
+    results: List[Optional[Tuple[int, int]]] = []
+
+    for sentence in sentences:
+        pattern = normalize_for_align(sentence)
+        span = None
+        if pattern and cursor < n:
+            span = index.find_exact(pattern, cursor, min(cursor + max_shift, n - 1))
+        if span is None and cursor < n:
+            found = find_best_window(token_texts, sentence, cursor, max_shift)
+            if found is not None and found[2] >= threshold:
+                span = found[0], found[1]
+            elif found is not None:
+                logger.info(f"[-] 句子相似度不足({found[2]:.2f}): {sentence}")
+
+        results.append(span)
+        if span is not None:
+            cursor = span[1] + 1
+        else:
+            # 匹配失败时只前进1步，而不是跳过整个窗口
+            cursor += 1
+
+    return results
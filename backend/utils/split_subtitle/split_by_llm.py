@@ -1,13 +1,13 @@
-import hashlib
 import json
 import os,math
 import re
 import sys
-from typing import List, Optional
-import openai
+from typing import List
 import logging
 from utils.split_subtitle.cnt_tokens import count_words
 from utils.split_subtitle.prompt import VIDEO_SPLIT_PROMPT_TEMPLATE 
+from utils.llm_cache import get_llm_cache
+from utils.llm_gateway import get_llm_gateway
 
 # 将项目根目录添加到路径以从video.views.set_setting导入
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -36,43 +36,6 @@ if not logger.handlers:
 
 
 
-CACHE_DIR = "cache"
-
-
-
-def get_cache_key(text: str, model: str) -> str:
-    """
-    生成缓存键值
-    """
-    return hashlib.md5(f"{text}_{model}".encode()).hexdigest()
-
-def get_cache(text: str, model: str) -> Optional[List[str]]:
-    """
-    从缓存中获取断句结果
-    """
-    cache_key = get_cache_key(text, model)
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (IOError, json.JSONDecodeError):
-            return None
-    return None
-
-def set_cache(text: str, model: str, result: List[str]) -> None:
-    """
-    将断句结果设置到缓存中
-    """
-    cache_key = get_cache_key(text, model)
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    try:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False)
-    except IOError:
-        pass
-
 def split_by_llm(text: str,
                  use_cache: bool = False,
                  max_length:int = 20,
@@ -83,14 +46,7 @@ def split_by_llm(text: str,
     """
     使用LLM进行文本断句
     """
-    # if use_cache:
-    #     cached_result = get_cache(text, MODEL)
-    #     if cached_result:
-    #         print(f"[+] 从缓存中获取结果: {cached_result}")
-    #         return cached_result
     word_limit=30 # 最大词数限制
-    # 初始化OpenAI客户端
-    client = openai.OpenAI(api_key=api_key, base_url=base_url)
     SYSTEM_PROMPT = f"使用<br>进行段落分割"
     total_word_count = count_words(text)
     logger.info(f"total_word_count: {total_word_count}")
@@ -98,19 +54,31 @@ def split_by_llm(text: str,
     prompt = VIDEO_SPLIT_PROMPT_TEMPLATE.format(
         sentence=text
     )
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    temperature = 0.1
     print("using model:",model)
     result = None  # 初始化变量以便在异常处理中使用
+    from_cache = False
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=8192  # Ensure sufficient tokens for long responses
-        )
-        result = response.choices[0].message.content # 获取LLM返回的内容（OpenAI格式）
+        cache = get_llm_cache() if use_cache else None
+        if cache is not None:
+            result = cache.get(messages, model, temperature, base_url)
+            from_cache = result is not None
+            if from_cache:
+                logger.info("[+] 断句结果命中LLM缓存")
+        if not from_cache:
+            # 经由共享网关请求LLM（连接复用、自适应并发与重试）
+            result = get_llm_gateway().chat(
+                messages,
+                model=model,
+                api_key=api_key,
+                base_url=base_url,
+                temperature=temperature,
+                max_tokens=8192  # Ensure sufficient tokens for long responses
+            )
 
         # 调试：打印原始响应
         logger.debug(f"[DEBUG] Raw LLM response content: {repr(result)}")
@@ -118,7 +86,6 @@ def split_by_llm(text: str,
         # 检查响应是否为空
         if not result or result.strip() == "":
             logger.error(f"[!] LLM返回空响应")
-            logger.debug(f"[DEBUG] Full response object: {response}")
             return []
 
         # 尝试清理可能的markdown代码块标记
@@ -135,7 +102,9 @@ def split_by_llm(text: str,
         logger.debug(f"[DEBUG] Cleaned response preview: {result_cleaned[:200]}...")
 
         # Check if response appears truncated (doesn't end with proper JSON closing)
+        repaired = False
         if not result_cleaned.endswith('}'):
+            repaired = True
             logger.warning(f"[!] Response appears truncated - doesn't end with '}}'. Last 50 chars: {result_cleaned[-50:]}")
             logger.warning(f"[!] This may indicate the response exceeded max_tokens limit")
             # Try to fix common truncation issues
@@ -158,7 +127,9 @@ def split_by_llm(text: str,
         split_result = [segment.strip() for segment in split_text.split("<br>") if segment.strip()] # 将单个段落拆分为句子（各语言通用），通过strip去除文本两端的空格
         logger.info(f"[+] 成功分割为 {len(split_result)} 个句子")
 
-        set_cache(text, model, split_result)
+        # 只缓存能成功解析的响应，避免把截断或格式错误的结果固化下来；补全过的截断响应也不缓存
+        if cache is not None and not from_cache and split_result and not repaired:
+            cache.set(messages, model, temperature, base_url, result)
         return split_result
     except json.JSONDecodeError as e:
         logger.error(f"[!] JSON解析失败: {e}")
@@ -130,6 +130,59 @@ def get_free_prompt(source_lang: str, target_lang: str, previous_context: str =
   }}
 """
 
+def get_combined_prompt(source_lang: str, target_lang: str, previous_context: str = "", next_context: str = "", terms_to_note: str = "") -> str:
+    """生成单次调用模式的提示模板：一次返回直译、反思和意译"""
+    
+    # 语言名称映射
+    lang_names = {
+        'en': 'English',
+        'zh': '简体中文',
+        'jp': '日本語'
+    }
+    
+    source_name = lang_names.get(source_lang, source_lang)
+    target_name = lang_names.get(target_lang, target_lang)
+    
+    return f"""  Role
+
+  You are a professional Netflix subtitle translator, fluent in both {source_name} and {target_name}, as well as their respective cultures.
+
+  Task
+
+  Translate the original {source_name} subtitles into {target_name} line by line, in two passes within one answer:
+
+  1. "direct": a faithful translation that accurately conveys the original meaning and terminology
+  2. "reflect": a short critique of the direct translation (fluency, style consistency, wordiness)
+  3. "free": an improved, natural {target_name} subtitle based on your critique
+    - Conform to {target_name} expression habits and match the theme's language style
+    - Do not abridge; fully cover the original expressions
+    - Do not add comments or explanations, and never leave a line empty
+
+  Previous Context Information
+
+  {previous_context if previous_context else "无前文上下文"}
+  
+  Next Context Information
+
+  {next_context if next_context else "无后文上下文"}
+
+
+  Points to Note
+
+  {terms_to_note if terms_to_note else "[Specific things to note for this chunk]"}
+
+  Output in only JSON format and no other text, For Example:
+
+  {{
+    "1": {{
+      "original": "All of you know Andrew Ng as a famous computer science professor at Stanford.",
+      "direct": "你们都知道吴恩达是斯坦福大学著名的计算机科学教授。",
+      "reflect": "直译较为准确，但可以更简洁自然",
+      "free": "大家都知道吴恩达，斯坦福著名的计算机科学教授"
+    }}
+  }}
+"""
+
 MERGE_ENGLISH_GRAPHEME_PROMPT="""
 你是一个擅长处理中英文混排字幕的Youtube高级字幕识别专家，这是一份中英文混杂的字幕，你的任务是将其中被分散为词素的英文单词合并， 
 注意不要修改每一行的编号，时间及字幕顺序，仅修改其中中英文夹杂时不符合语言习惯的内容，并返回srt格式的字幕。 
@@ -161,18 +214,26 @@ pythonif load_key("pause_before_translate"):
 用户可以在翻译开始前手动编辑组合术语文件。
 """
 
-import hashlib
 import json
 import os
 import sys
+import time
 import logging
-from typing import Optional
-import openai
+from typing import Dict, List, Optional, Tuple, Union
 
 # 将项目根目录添加到路径以从video.views.set_setting导入
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from video.views.set_setting import load_all_settings
-from utils.split_subtitle.ASRData import ASRData
+from utils.split_subtitle.ASRData import ASRData, ASRDataSeg
+from utils.split_subtitle.cnt_tokens import estimate_tokens
+from utils.split_subtitle.incremental import merge_ranges
+from utils.split_subtitle.batching import (
+    DEFAULT_BATCH_TOKEN_BUDGET,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    TranslationBatch,
+    context_window,
+    pack_batches,
+)
 
 # 配置日志
 logger = logging.getLogger('subtitle_translate')
@@ -198,42 +259,8 @@ if not logger.handlers:
     logger.setLevel(logging.DEBUG)
 
 from utils.llm_engines import ENGINES
-
-CACHE_DIR = "cache"
-
-def get_cache_key(prompt: str, model: str) -> str:
-    """
-    生成缓存键值
-    """
-    return hashlib.md5(f"{prompt}_{model}".encode()).hexdigest()
-
-def get_cache(prompt: str, model: str) -> Optional[str]:
-    """
-    从缓存中获取翻译结果
-    """
-    cache_key = get_cache_key(prompt, model)
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-                return cached_data.get('result', None)
-        except (IOError, json.JSONDecodeError):
-            return None
-    return None
-
-def set_cache(prompt: str, model: str, result: str) -> None:
-    """
-    将翻译结果设置到缓存中
-    """
-    cache_key = get_cache_key(prompt, model)
-    cache_file = os.path.join(CACHE_DIR, f"{cache_key}.json")
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    try:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump({'result': result}, f, ensure_ascii=False)
-    except IOError:
-        pass
+from utils.llm_cache import get_llm_cache
+from utils.llm_gateway import get_llm_gateway
 
 def clean_json_response(response: str) -> str:
     """
@@ -271,35 +298,40 @@ def clean_json_response(response: str) -> str:
     
     return response
 
-def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, model=None) -> str:
+def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, model=None, usage_out: Optional[Dict[str, int]] = None) -> str:
     """
     调用LLM API
+    usage_out: 可选，传入字典时写入本次请求的token用量；命中缓存时只写入 from_cache=True
     """
     if api_key is None or base_url is None or model is None:
         raise ValueError("api_key, base_url and model parameters are required")
     
-    # 在函数内部创建客户端
-    client = openai.OpenAI(api_key=api_key, base_url=base_url)
-    # 暂时禁用缓存以避免格式问题
-    # if use_cache:
-    #     cached_result = get_cache(prompt, MODEL)
-    #     if cached_result:
-    #         logger.debug("从缓存中获取翻译结果")
-    #         return cached_result
+    messages = [{"role": "user", "content": prompt}]
+    temperature = 0.1
+    cache = get_llm_cache() if use_cache else None
+    if cache is not None:
+        cached_result = cache.get(messages, model, temperature, base_url)
+        if cached_result:
+            logger.debug("从缓存中获取翻译结果")
+            if usage_out is not None:
+                usage_out["from_cache"] = True
+            return cached_result
 
     try:
         logger.debug(f"发送LLM请求，模型: {model}, 提示词长度: {len(prompt)} 字符")
         logger.debug(f"提示词前200字符: {prompt[:200]}...")
         
-        response = client.chat.completions.create(
+        # 经由共享网关请求LLM（连接复用、自适应并发与重试）
+        result, usage = get_llm_gateway().chat_with_usage(
+            messages,
             model=model,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
+            api_key=api_key,
+            base_url=base_url,
+            temperature=temperature,
             max_tokens=8192  # Ensure sufficient tokens for long responses
         )
-        result = response.choices[0].message.content
+        if usage_out is not None:
+            usage_out.update(usage)
         
         # 详细记录LLM响应
         logger.debug(f"LLM响应长度: {len(result)} 字符")
@@ -309,9 +341,9 @@ def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, m
         if result and (result.strip().startswith('"') or 'error' in result.lower() or 'invalid' in result.lower()):
             logger.warning(f"LLM响应可能包含错误: {result[:200]}...")
         
-        # 暂时禁用缓存
-        # if use_cache:
-        #     set_cache(prompt, MODEL, result)
+        # 只缓存能解析为JSON的响应，避免把截断或格式错误的结果固化下来
+        if cache is not None and _is_valid_json_response(result):
+            cache.set(messages, model, temperature, base_url, result)
         
         return result
     except Exception as e:
@@ -319,43 +351,93 @@ def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, m
         logger.error(f"错误类型: {type(e).__name__}")
         logger.error(f"提示词: {prompt[:100]}...")
         return ""
-    
-def step1_direct_translate_batch(batch_segments: ASRData, batch_start_idx: int, batch_size: int, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+
+def _is_valid_json_response(response: str) -> bool:
+    """判断LLM响应清理后能否解析为非空JSON对象"""
+    try:
+        return bool(json.loads(clean_json_response(response)))
+    except (json.JSONDecodeError, TypeError):
+        return False
+
+def build_context(all_segments: ASRData, batch_start_idx: int, batch_end_idx: int, token_counts: List[int] = None, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, with_direct: bool = False):
+    """
+    生成批次 [batch_start_idx, batch_end_idx) 的前后文上下文，窗口大小按token预算确定
+    返回 (previous_context, next_context)，行号为字幕在全文中的序号
+    with_direct: 为True时在上下文中附上相邻字幕已有的直译，供意译阶段保持前后一致
+    """
+    if not all_segments or len(all_segments.segments) == 0:
+        return "", ""
+    if token_counts is None:
+        token_counts = [estimate_tokens(seg.text) for seg in all_segments.segments]
+    (prev_start_idx, prev_end_idx), (next_start_idx, next_end_idx) = context_window(
+        token_counts, batch_start_idx, batch_end_idx, context_token_budget
+    )
+    def fmt(idx, seg):
+        if with_direct and seg.direct:
+            return f"{idx+1}. {seg.text} -> {seg.direct}"
+        return f"{idx+1}. {seg.text}"
+
+    previous_context = "\n".join(
+        fmt(prev_start_idx + i, seg) for i, seg in enumerate(all_segments.segments[prev_start_idx:prev_end_idx])
+    )
+    next_context = "\n".join(
+        fmt(next_start_idx + i, seg) for i, seg in enumerate(all_segments.segments[next_start_idx:next_end_idx])
+    )
+    return previous_context, next_context
+
+def _record_batch_usage(stage: str, batch: TranslationBatch, prompt: str, usage: Dict[str, int], elapsed: float, usage_report: Optional[List[Dict]]) -> None:
+    """记录单个批次的token用量与耗时"""
+    entry = {
+        "stage": stage,
+        "batch": batch.index,
+        "segments": batch.size,
+        "source_tokens": batch.tokens,
+        "estimated_prompt_tokens": estimate_tokens(prompt),
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "cached": bool(usage.get("from_cache")),
+        "seconds": round(elapsed, 2),
+    }
+    logger.info(
+        f"{stage} 批次{batch.index}: {batch.size}句, 原文约{batch.tokens} tokens, "
+        f"prompt {entry['prompt_tokens'] or '~' + str(entry['estimated_prompt_tokens'])} / completion {entry['completion_tokens']} tokens, "
+        f"耗时 {entry['seconds']}s{' (缓存)' if entry['cached'] else ''}"
+    )
+    if usage_report is not None:
+        usage_report.append(entry)
+
+def summarize_usage(usage_report: List[Dict]) -> Dict[str, float]:
+    """汇总各批次的token用量，便于在成本与延迟之间调参"""
+    batches = len(usage_report)
+    prompt_tokens = sum(e["prompt_tokens"] for e in usage_report)
+    completion_tokens = sum(e["completion_tokens"] for e in usage_report)
+    return {
+        "batches": batches,
+        "cached_batches": sum(1 for e in usage_report if e["cached"]),
+        "segments": sum(e["segments"] for e in usage_report),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "avg_tokens_per_batch": round((prompt_tokens + completion_tokens) / batches, 1) if batches else 0,
+        "avg_seconds_per_batch": round(sum(e["seconds"] for e in usage_report) / batches, 2) if batches else 0,
+    }
+
+def step1_direct_translate_batch(batch_segments: List, batch: TranslationBatch, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, token_counts: List[int] = None, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_report: Optional[List[Dict]] = None) -> List:
     """
-    批量直译处理函数 - 处理一批sentences (10-20个)
+    批量直译处理函数 - 处理一个按token预算打包的批次
     输入给LLM的序号始终是1到len(batch_segments)
     all_segments: 完整的字幕数据，用于生成上下文
     """
-    # 生成上下文信息
-    context_size = 3  # 前后各3个句子作为上下文
-    previous_context = ""
-    next_context = ""
-    # print(next_context)
-
-    if all_segments and len(all_segments.segments) > 0:
-        # 获取前文上下文
-        prev_start_idx = max(0, batch_start_idx - context_size)
-        prev_end_idx = batch_start_idx
-        if prev_start_idx < prev_end_idx:
-            prev_segments = all_segments.segments[prev_start_idx:prev_end_idx]
-            # print("start direct translate")
-            # print([f"{seg.text}" for i, seg in enumerate(prev_segments)])
-            previous_context = "\n".join([f"{prev_start_idx+i+1}. {seg.text}" for i, seg in enumerate(prev_segments)])
-        
-        # 获取后文上下文  
-        next_start_idx = batch_start_idx + len(batch_segments)
-        next_end_idx = min(len(all_segments.segments), next_start_idx + context_size)
-        if next_start_idx < next_end_idx:
-            next_segments = all_segments.segments[next_start_idx:next_end_idx]
-            next_context = "\n".join([f"{next_start_idx+i+1}. {seg.text}" for i, seg in enumerate(next_segments)])
-    # print(all_segments)
-    # 准备输入JSON，序号: 1开始到batch_size
+    batch_start_idx = batch.start
+    # 生成上下文信息，前后文窗口按token预算确定
+    previous_context, next_context = build_context(all_segments, batch.start, batch.end, token_counts, context_token_budget)
+
+    # 准备输入JSON，序号: 1开始到len(batch_segments)
     input_json = {}
     for i, segment in enumerate(batch_segments, 1):  # i 从1开始，到len(batch_segments)
         input_json[str(i)] = {
             "original": segment.text
         }
-    print("input_json:",input_json)
+    logger.debug(f"input_json: {input_json}")
     # 构建完整的prompt，一次性填充所有占位符
     prompt_with_context = get_faithful_prompt(
         source_lang, 
@@ -364,40 +446,41 @@ def step1_direct_translate_batch(batch_segments: ASRData, batch_start_idx: int,
         next_context if next_context else "无后文上下文",
         terms_to_note
     )
-    # print(prompt_with_context)
     full_prompt = prompt_with_context + "\n\nINPUT:\n" + json.dumps(input_json, ensure_ascii=False, indent=2)
-    print("full_prompt:",full_prompt)
+    logger.debug(f"full_prompt: {full_prompt}")
 
     # 调用LLM
-    response = call_llm(full_prompt, use_cache, api_key, base_url, model)
+    usage = {}
+    started = time.monotonic()
+    response = call_llm(full_prompt, use_cache, api_key, base_url, model, usage_out=usage)
+    _record_batch_usage("直译", batch, full_prompt, usage, time.monotonic() - started, usage_report)
     
     # 解析LLM返回的JSON
     try:
-        logger.debug(f"批次{batch_start_idx//batch_size+1} 开始解析LLM响应")
+        logger.debug(f"批次{batch.index} 开始解析LLM响应")
         cleaned_response = clean_json_response(response)
-        logger.debug(f"批次{batch_start_idx//batch_size+1} 清理后的响应: {cleaned_response[:200]}...")
+        logger.debug(f"批次{batch.index} 清理后的响应: {cleaned_response[:200]}...")
         
         response_json = json.loads(cleaned_response)
-        logger.debug(f"批次{batch_start_idx//batch_size+1} JSON解析成功，包含{len(response_json)}个条目")
+        logger.debug(f"批次{batch.index} JSON解析成功，包含{len(response_json)}个条目")
         
-        # 将LLM返回的结果（序号1-batch_size）映射回原始segments
+        # 将LLM返回的结果（序号1-len(batch_segments)）映射回原始segments
         for batch_idx, segment in enumerate(batch_segments):  # batch_idx: 0 to len(batch_segments)-1
             llm_key = str(batch_idx + 1)  # LLM返回的序号：1 to len(batch_segments)
             original_idx = batch_start_idx + batch_idx  # 原始序号
             
             if llm_key in response_json and "direct" in response_json[llm_key]:
-                # original = response_json[llm_key].get("origin", segment.text)  # 不再使用
                 direct = response_json[llm_key]["direct"]
                 segment.direct = direct
-                logger.debug(f"批次{batch_start_idx//batch_size+1} 原始第{original_idx+1}句(批内第{batch_idx+1}句)直译完成: {segment.text[:30],segment.direct[:30]}...")
+                logger.debug(f"批次{batch.index} 原始第{original_idx+1}句(批内第{batch_idx+1}句)直译完成: {segment.text[:30],segment.direct[:30]}...")
             else:
-                logger.warning(f"批次{batch_start_idx//batch_size+1} 缺少key '{llm_key}' 或 'direct' 字段")
+                logger.warning(f"批次{batch.index} 缺少key '{llm_key}' 或 'direct' 字段")
                 logger.debug(f"响应中的keys: {list(response_json.keys())}")
                 if llm_key in response_json:
                     logger.debug(f"key '{llm_key}' 的内容: {response_json[llm_key]}")
     
     except json.JSONDecodeError as e:
-        logger.error(f"批次{batch_start_idx//batch_size+1} LLM返回的JSON格式无效: {e}")
+        logger.error(f"批次{batch.index} LLM返回的JSON格式无效: {e}")
         logger.error(f"JSON错误位置: 行{e.lineno}, 列{e.colno}")
         logger.error(f"错误消息: {e.msg}")
         logger.error(f"原始LLM响应长度: {len(response)} 字符")
@@ -410,7 +493,7 @@ def step1_direct_translate_batch(batch_segments: ASRData, batch_start_idx: int,
             if not hasattr(segment, 'direct') or not segment.direct:
                 segment.direct = segment.text  # 使用原文作为默认直译
     except Exception as e:
-        logger.error(f"批次{batch_start_idx//batch_size+1} 处理响应时发生未知错误: {e}")
+        logger.error(f"批次{batch.index} 处理响应时发生未知错误: {e}")
         logger.error(f"错误类型: {type(e).__name__}")
         logger.error(f"原始响应: {repr(response)}")
         logger.error(f"清理后响应: {repr(cleaned_response) if 'cleaned_response' in locals() else 'N/A'}")
@@ -422,24 +505,38 @@ def step1_direct_translate_batch(batch_segments: ASRData, batch_start_idx: int,
     
     return batch_segments
 
-def step1_direct_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = 15, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+def plan_batches(asr_data: ASRData, token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET, batch_size: int = 40, ranges: Optional[List[Tuple[int, int]]] = None, token_counts: Optional[List[int]] = None):
+    """
+    按token预算划分批次
+    ranges: 可选，只对这些 [start, end) 区间划分批次（增量翻译），批次不会跨越区间
+    token_counts: 可选，已估算好的每句token数（多目标语言翻译时各语言共用）
+    返回 (批次列表, 每句估算token数)
     """
-    第一步：直译 - 使用FAITHFUL_PROMPT，支持批处理和多线程
+    if token_counts is None:
+        token_counts = [estimate_tokens(seg.text) for seg in asr_data.segments]
+    if ranges is None:
+        return pack_batches(token_counts, token_budget, batch_size), token_counts
+    batches: List[TranslationBatch] = []
+    for start, end in ranges:
+        for b in pack_batches(token_counts[start:end], token_budget, batch_size):
+            batches.append(TranslationBatch(len(batches) + 1, b.start + start, b.end + start, b.tokens))
+    return batches, token_counts
+
+def step1_direct_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = 40, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_report: Optional[List[Dict]] = None) -> ASRData:
+    """
+    第一步：直译 - 使用FAITHFUL_PROMPT，按token预算批处理，支持多线程
+    batch_size: 每批最多句数；token_budget: 每批原文token预算
     """
     from concurrent.futures import ThreadPoolExecutor
     
-    # 将segments按批次分组
-    batches = []
-    for i in range(0, len(asr_data.segments), batch_size):
-        batch = asr_data.segments[i:i + batch_size]
-        batches.append((batch, i))
+    batches, token_counts = plan_batches(asr_data, token_budget, batch_size)
     
-    logger.info(f"直译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次，每批最多{batch_size}句")
+    logger.info(f"直译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次，每批原文不超过{token_budget} tokens、最多{batch_size}句")
     
     # 多线程处理批次
-    def process_batch(batch_data):
-        batch_segments, batch_start_idx = batch_data
-        return step1_direct_translate_batch(batch_segments, batch_start_idx, batch_size, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model)
+    def process_batch(batch):
+        batch_segments = asr_data.segments[batch.start:batch.end]
+        return step1_direct_translate_batch(batch_segments, batch, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model, token_counts, context_token_budget, usage_report)
     
     with ThreadPoolExecutor(max_workers=num_threads) as executor:
         batch_results = list(executor.map(process_batch, batches))
@@ -451,35 +548,17 @@ def step1_direct_translate(asr_data: ASRData, use_cache: bool = True, batch_size
     
     return ASRData(all_segments)
 
-def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, batch_size: int, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+def step2_free_translate_batch(batch_segments: List, batch: TranslationBatch, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, token_counts: List[int] = None, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_report: Optional[List[Dict]] = None) -> List:
     """
-    批量意译和反思处理函数 - 处理一批sentences (10-20个)
+    批量意译和反思处理函数 - 处理一个按token预算打包的批次
     输入给LLM的序号始终是1到len(batch_segments)
     all_segments: 完整的字幕数据，用于生成上下文
     """
-    # 生成上下文信息（与step1相同逻辑）
-    context_size = 3  # 前后各3个句子作为上下文
-    previous_context = ""
-    next_context = ""
-    
-    if all_segments and len(all_segments.segments) > 0:
-        # 获取前文上下文
-        prev_start_idx = max(0, batch_start_idx - context_size)
-        prev_end_idx = batch_start_idx
-        if prev_start_idx < prev_end_idx:
-            prev_segments = all_segments.segments[prev_start_idx:prev_end_idx]
-            print("start free translate")
-            print([f"{i+1}. {seg.text}" for i, seg in enumerate(prev_segments)])
-            previous_context = "\n".join([f"{i+1}. {seg.text}" for i, seg in enumerate(prev_segments)])
-        
-        # 获取后文上下文
-        next_start_idx = batch_start_idx + len(batch_segments)
-        next_end_idx = min(len(all_segments.segments), next_start_idx + context_size)
-        if next_start_idx < next_end_idx:
-            next_segments = all_segments.segments[next_start_idx:next_end_idx]
-            next_context = "\n".join([f"{i+1}. {seg.text}" for i, seg in enumerate(next_segments)])
-    
-    # 准备输入JSON，序号从1开始到batch_size
+    batch_start_idx = batch.start
+    # 生成上下文信息（与step1相同逻辑），附上相邻字幕的直译
+    previous_context, next_context = build_context(all_segments, batch.start, batch.end, token_counts, context_token_budget, with_direct=True)
+    
+    # 准备输入JSON，序号从1开始到len(batch_segments)
     input_json = {}
     for i, segment in enumerate(batch_segments, 1):  # i 从1开始，到len(batch_segments)
         input_json[str(i)] = {
@@ -497,18 +576,21 @@ def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, ba
     full_prompt = prompt_with_context + "\n\nINPUT:\n" + json.dumps(input_json, ensure_ascii=False, indent=2)
     
     # 调用LLM
-    response = call_llm(full_prompt, use_cache, api_key, base_url, model)
+    usage = {}
+    started = time.monotonic()
+    response = call_llm(full_prompt, use_cache, api_key, base_url, model, usage_out=usage)
+    _record_batch_usage("意译", batch, full_prompt, usage, time.monotonic() - started, usage_report)
     
     # 解析LLM返回的JSON
     try:
-        logger.debug(f"批次{batch_start_idx//batch_size+1} 开始解析LLM响应")
+        logger.debug(f"批次{batch.index} 开始解析LLM响应")
         cleaned_response = clean_json_response(response)
-        logger.debug(f"批次{batch_start_idx//batch_size+1} 清理后的响应: {cleaned_response[:200]}...")
+        logger.debug(f"批次{batch.index} 清理后的响应: {cleaned_response[:200]}...")
         
         response_json = json.loads(cleaned_response)
-        logger.debug(f"批次{batch_start_idx//batch_size+1} JSON解析成功，包含{len(response_json)}个条目")
+        logger.debug(f"批次{batch.index} JSON解析成功，包含{len(response_json)}个条目")
         
-        # 将LLM返回的结果（序号1-batch_size）映射回原始segments
+        # 将LLM返回的结果（序号1-len(batch_segments)）映射回原始segments
         for batch_idx, segment in enumerate(batch_segments):  # batch_idx: 0 to len(batch_segments)-1
             llm_key = str(batch_idx + 1)  # LLM返回的序号：1 to len(batch_segments)
             original_idx = batch_start_idx + batch_idx  # 原始序号
@@ -518,13 +600,13 @@ def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, ba
                     segment.reflected = response_json[llm_key]["reflect"]
                 if "free" in response_json[llm_key]:
                     segment.free = response_json[llm_key]["free"]
-                    logger.debug(f"批次{batch_start_idx//batch_size+1} 原始第{original_idx+1}句(批内第{batch_idx+1}句)翻译意见为：{segment.reflected[:30]}，意译完成: {segment.free[:30]}...")
+                    logger.debug(f"批次{batch.index} 原始第{original_idx+1}句(批内第{batch_idx+1}句)翻译意见为：{segment.reflected[:30]}，意译完成: {segment.free[:30]}...")
             else:
-                logger.warning(f"批次{batch_start_idx//batch_size+1} 缺少key '{llm_key}'")
+                logger.warning(f"批次{batch.index} 缺少key '{llm_key}'")
                 logger.debug(f"响应中的keys: {list(response_json.keys())}")
     
     except json.JSONDecodeError as e:
-        logger.error(f"批次{batch_start_idx//batch_size+1} (意译阶段) LLM返回的JSON格式无效: {e}")
+        logger.error(f"批次{batch.index} (意译阶段) LLM返回的JSON格式无效: {e}")
         logger.error(f"JSON错误位置: 行{e.lineno}, 列{e.colno}")
         logger.error(f"错误消息: {e.msg}")
         logger.error(f"原始LLM响应长度: {len(response)} 字符")
@@ -539,7 +621,7 @@ def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, ba
             if not hasattr(segment, 'reflected') or not segment.reflected:
                 segment.reflected = "翻译完成"
     except Exception as e:
-        logger.error(f"批次{batch_start_idx//batch_size+1} (意译阶段) 处理响应时发生未知错误: {e}")
+        logger.error(f"批次{batch.index} (意译阶段) 处理响应时发生未知错误: {e}")
         logger.error(f"错误类型: {type(e).__name__}")
         logger.error(f"原始响应: {repr(response)}")
         logger.error(f"清理后响应: {repr(cleaned_response) if 'cleaned_response' in locals() else 'N/A'}")
@@ -553,24 +635,20 @@ def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, ba
     
     return batch_segments
 
-def step2_free_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = 15, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+def step2_free_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = 40, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_report: Optional[List[Dict]] = None) -> ASRData:
     """
-    第二步：意译和反思 - 使用FREE_PROMPT，支持批处理和多线程
+    第二步：意译和反思 - 使用FREE_PROMPT，按token预算批处理，支持多线程
     """
     from concurrent.futures import ThreadPoolExecutor
     
-    # 将segments按批次分组
-    batches = []
-    for i in range(0, len(asr_data.segments), batch_size):
-        batch = asr_data.segments[i:i + batch_size]
-        batches.append((batch, i))
+    batches, token_counts = plan_batches(asr_data, token_budget, batch_size)
     
-    logger.info(f"意译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次，每批最多{batch_size}句")
+    logger.info(f"意译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次，每批原文不超过{token_budget} tokens、最多{batch_size}句")
     
     # 多线程处理批次
-    def process_batch(batch_data):
-        batch_segments, batch_start_idx = batch_data
-        return step2_free_translate_batch(batch_segments, batch_start_idx, batch_size, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model)
+    def process_batch(batch):
+        batch_segments = asr_data.segments[batch.start:batch.end]
+        return step2_free_translate_batch(batch_segments, batch, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model, token_counts, context_token_budget, usage_report)
     
     with ThreadPoolExecutor(max_workers=num_threads) as executor:
         batch_results = list(executor.map(process_batch, batches))
@@ -582,27 +660,270 @@ def step2_free_translate(asr_data: ASRData, use_cache: bool = True, batch_size:
     
     return ASRData(all_segments)
 
-def two_step_translate(asr_data: ASRData, use_cache: bool = True, num_threads: int = 4, batch_size: int = 15, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "") -> ASRData:
+def combined_translate_batch(batch_segments: List, batch: TranslationBatch, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, token_counts: List[int] = None, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_report: Optional[List[Dict]] = None) -> List:
     """
-    两步翻译流程：先直译，再意译和反思，支持批处理和多线程
+    单次调用模式：一次请求同时得到直译、反思和意译，往返次数减半
     """
-    # 在这里加载设置，每次调用时都获取最新配置
+    previous_context, next_context = build_context(all_segments, batch.start, batch.end, token_counts, context_token_budget)
+
+    input_json = {}
+    for i, segment in enumerate(batch_segments, 1):
+        input_json[str(i)] = {
+            "original": segment.text
+        }
+    prompt_with_context = get_combined_prompt(
+        source_lang,
+        target_lang,
+        previous_context if previous_context else "无前文上下文",
+        next_context if next_context else "无后文上下文",
+        terms_to_note
+    )
+    full_prompt = prompt_with_context + "\n\nINPUT:\n" + json.dumps(input_json, ensure_ascii=False, indent=2)
+
+    usage = {}
+    started = time.monotonic()
+    response = call_llm(full_prompt, use_cache, api_key, base_url, model, usage_out=usage)
+    _record_batch_usage("单次翻译", batch, full_prompt, usage, time.monotonic() - started, usage_report)
+
+    try:
+        response_json = json.loads(clean_json_response(response))
+        for batch_idx, segment in enumerate(batch_segments):
+            item = response_json.get(str(batch_idx + 1))
+            if not isinstance(item, dict):
+                logger.warning(f"批次{batch.index} (单次翻译) 缺少key '{batch_idx + 1}'")
+                continue
+            segment.direct = item.get("direct", segment.direct)
+            segment.reflected = item.get("reflect", segment.reflected)
+            segment.free = item.get("free", segment.free)
+    except Exception as e:
+        logger.error(f"批次{batch.index} (单次翻译) 处理响应失败: {type(e).__name__}: {e}")
+        logger.error(f"原始响应: {repr(response)}")
+
+    # 为缺失的字段设置默认值，避免翻译失败
+    for segment in batch_segments:
+        if not segment.direct:
+            segment.direct = segment.text
+        if not segment.free:
+            segment.free = segment.direct
+    return batch_segments
+
+def pipeline_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = 40, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_report: Optional[List[Dict]] = None, single_call: bool = False, ranges: Optional[List[Tuple[int, int]]] = None, token_counts: Optional[List[int]] = None, hints: Optional[Dict[int, str]] = None) -> ASRData:
+    """
+    流水线式两步翻译：
+    某批次的意译只依赖于它自身以及上下文窗口覆盖到的批次的直译，
+    这些直译一完成就立即开始该批次的意译，而不是等待全文直译结束。
+    调度时优先执行已就绪的意译批次，使前面的批次尽早完整完成。
+    single_call: 为True时每批只发一次请求，同时返回直译和意译
+    ranges: 可选，只翻译这些 [start, end) 区间，其余句子保留已有译文并作为上下文
+    hints: 可选，{句子序号: 参考译文}，附加在对应批次直译提示的注意事项中
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    batches, token_counts = plan_batches(asr_data, token_budget, batch_size, ranges, token_counts)
+    segments = asr_data.segments
+    logger.info(f"{'单次调用' if single_call else '流水线'}翻译：将{len(segments)}个句子分为{len(batches)}个批次，每批原文不超过{token_budget} tokens、最多{batch_size}句")
+
+    def batch_terms(batch):
+        batch_hints = [f"{i+1}. {hints[i]}" for i in range(batch.start, batch.end) if hints and i in hints]
+        if not batch_hints:
+            return terms_to_note
+        reference = "Reference translations of similar lines from earlier videos (reuse wording where it fits):\n" + "\n".join(batch_hints)
+        return f"{terms_to_note}\n\n{reference}" if terms_to_note else reference
+
+    def run_step1(batch):
+        batch_segments = segments[batch.start:batch.end]
+        if single_call:
+            return combined_translate_batch(batch_segments, batch, asr_data, use_cache, source_lang, target_lang, batch_terms(batch), api_key, base_url, model, token_counts, context_token_budget, usage_report)
+        return step1_direct_translate_batch(batch_segments, batch, asr_data, use_cache, source_lang, target_lang, batch_terms(batch), api_key, base_url, model, token_counts, context_token_budget, usage_report)
+
+    def run_step2(batch):
+        batch_segments = segments[batch.start:batch.end]
+        return step2_free_translate_batch(batch_segments, batch, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model, token_counts, context_token_budget, usage_report)
+
+    # 计算依赖：意译批次 j 依赖与其 [前文起点, 后文终点) 相交的所有直译批次
+    # 不在任何批次中的句子（增量翻译时沿用旧译文）不构成依赖
+    batch_of_segment = [None] * len(segments)
+    for b_idx, batch in enumerate(batches):
+        for k in range(batch.start, batch.end):
+            batch_of_segment[k] = b_idx
+    dependents: List[List[int]] = [[] for _ in batches]
+    remaining_deps = [0] * len(batches)
+    if not single_call:
+        for j, batch in enumerate(batches):
+            (ctx_start, _), (_, ctx_end) = context_window(token_counts, batch.start, batch.end, context_token_budget)
+            deps = set(batch_of_segment[k] for k in range(ctx_start, ctx_end) if batch_of_segment[k] is not None)
+            deps.add(j)
+            remaining_deps[j] = len(deps)
+            for d in deps:
+                dependents[d].append(j)
+
+    step1_queue = deque(batches)
+    ready_step2 = deque()
+    running = {}
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        while step1_queue or ready_step2 or running:
+            while len(running) < num_threads and (ready_step2 or step1_queue):
+                if ready_step2:
+                    batch = ready_step2.popleft()
+                    running[executor.submit(run_step2, batch)] = ("step2", batch)
+                else:
+                    batch = step1_queue.popleft()
+                    running[executor.submit(run_step1, batch)] = ("step1", batch)
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, batch = running.pop(future)
+                future.result()  # 批次函数内部已处理解析错误，这里只会抛出意外异常
+                if stage == "step1" and not single_call:
+                    for j in dependents[batch.index - 1]:
+                        remaining_deps[j] -= 1
+                        if remaining_deps[j] == 0:
+                            ready_step2.append(batches[j])
+
+    return ASRData(segments)
+
+def _load_llm_settings():
+    """读取当前选中的模型服务商配置，返回 (api_key, base_url, model, 是否单次调用, 是否使用翻译记忆)"""
     settings = load_all_settings()
     selected_model_provider = settings.get('DEFAULT', {}).get('selected_model_provider', 'deepseek')
     api_key = settings.get('DEFAULT', {}).get(f'{selected_model_provider}_api_key', '')
     base_url = settings.get('DEFAULT', {}).get(f'{selected_model_provider}_base_url', 'https://api.deepseek.com')
     enable_thinking = settings.get('DEFAULT', {}).get('enable_thinking', 'true')
     model = ENGINES[selected_model_provider]["thinking" if enable_thinking == 'true' else "normal"]
-    
+    single_call = settings.get('DEFAULT', {}).get('translation_single_call', 'false').lower() == 'true'
+    use_memory = settings.get('DEFAULT', {}).get('translation_memory', 'true').lower() == 'true'
+    return api_key, base_url, model, single_call, use_memory
+
+def apply_translation_memory(asr_data: ASRData, source_lang: str, target_lang: str, model: str, ranges: Optional[List[Tuple[int, int]]] = None) -> Tuple[List[Tuple[int, int]], Dict[int, str]]:
+    """
+    用跨视频翻译记忆预先填充译文：精确命中的句子直接采用记忆中的译文，不再发给LLM；
+    近似命中的句子生成参考译文提示
+    ranges: 待翻译区间，为None时表示全部句子
+    返回 (仍需翻译的区间, {句子序号: 参考译文提示})；数据库不可用时原样返回
+    """
+    segments = asr_data.segments
+    if ranges is None:
+        ranges = [(0, len(segments))] if segments else []
+    pending = {i: segments[i].text for start, end in ranges for i in range(start, end)}
+    if not pending:
+        return ranges, {}
+    try:
+        from video.services import translation_memory
+        exact = translation_memory.lookup_exact(pending, source_lang, target_lang, model)
+        for i, (direct, free) in exact.items():
+            segments[i].direct = direct or free
+            segments[i].free = free
+            del pending[i]
+        near = translation_memory.lookup_near(pending, source_lang, target_lang, model)
+    except Exception as e:
+        logger.warning(f"翻译记忆查询失败，跳过: {e}")
+        return ranges, {}
+    hints = {i: f"{source} -> {free}" for i, (source, free, _) in near.items()}
+    logger.info(f"{target_lang} 翻译记忆：精确命中{len(exact)}句，近似命中{len(hints)}句，剩余{len(pending)}句需要翻译")
+    return merge_ranges(sorted(pending)), hints
+
+def remember_translations(asr_data: ASRData, source_lang: str, target_lang: str) -> int:
+    """把翻译完成的句子写入跨视频翻译记忆，返回写入条数；数据库不可用时返回0"""
+    _, _, model, _, use_memory = _load_llm_settings()
+    if not use_memory:
+        return 0
+    try:
+        from video.services import translation_memory
+        return translation_memory.remember(
+            ((seg.text, seg.direct, seg.free) for seg in asr_data.segments), source_lang, target_lang, model
+        )
+    except Exception as e:
+        logger.warning(f"写入翻译记忆失败: {e}")
+        return 0
+
+def copy_source(asr_data: ASRData) -> ASRData:
+    """复制原文（不含译文），供每个目标语言独立写入译文"""
+    return ASRData([ASRDataSeg(seg.text, seg.start_time, seg.end_time) for seg in asr_data.segments])
+
+def multi_target_translate(asr_by_lang: Dict[str, ASRData], use_cache: bool = True, num_threads: int = 4, batch_size: int = 40, source_lang: str = 'en', terms_to_note: str = "", token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_reports: Optional[Dict[str, List[Dict]]] = None, single_call: Optional[bool] = None, ranges_by_lang: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> Dict[str, ASRData]:
+    """
+    多目标语言翻译：同一份原文只估算一次token、按相同规则划分批次，
+    各目标语言的流水线并发执行，真正在途的请求数仍由LLM网关统一控制
+    asr_by_lang: {目标语言: 该语言的字幕副本}，原文必须一致（增量翻译时副本中可已填入旧译文）
+    usage_reports / ranges_by_lang: 按目标语言区分的token用量记录和增量翻译区间
+    返回 {目标语言: 翻译后的ASRData}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    api_key, base_url, model, default_single_call, use_memory = _load_llm_settings()
+    if single_call is None:
+        single_call = default_single_call
+    if usage_reports is None:
+        usage_reports = {}
+    ranges_by_lang = dict(ranges_by_lang or {})
+    langs = list(asr_by_lang)
+    if not langs:
+        return {}
+
+    # 原文侧预处理只做一次
+    shared = asr_by_lang[langs[0]]
+    token_counts = [estimate_tokens(seg.text) for seg in shared.segments]
     logger.info(f"使用模型: {model}, API地址: {base_url}")
+    logger.info(f"多目标语言翻译：{source_lang} -> {', '.join(langs)}，共{len(shared.segments)}个句子")
+
+    # 翻译记忆在当前线程查询数据库，命中的句子不再进入批次
+    hints_by_lang = {}
+    if use_memory:
+        for lang in langs:
+            ranges_by_lang[lang], hints_by_lang[lang] = apply_translation_memory(asr_by_lang[lang], source_lang, lang, model, ranges_by_lang.get(lang))
+
+    with ThreadPoolExecutor(max_workers=len(langs)) as executor:
+        futures = {
+            lang: executor.submit(
+                pipeline_translate, asr_by_lang[lang], use_cache, batch_size, num_threads, source_lang, lang,
+                terms_to_note, api_key, base_url, model, token_budget, context_token_budget,
+                usage_reports.setdefault(lang, []), single_call, ranges_by_lang.get(lang), token_counts,
+                hints_by_lang.get(lang),
+            )
+            for lang in langs
+        }
+        results = {lang: future.result() for lang, future in futures.items()}
+
+    for lang in langs:
+        logger.info(f"{lang} 翻译完成，token用量汇总: {summarize_usage(usage_reports[lang])}")
+    return results
+
+def two_step_translate(asr_data: ASRData, use_cache: bool = True, num_threads: int = 4, batch_size: int = 40, source_lang: str = 'en', target_lang: Union[str, List[str]] = 'zh', terms_to_note: str = "", token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET, context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, usage_report: Optional[List[Dict]] = None, single_call: Optional[bool] = None, ranges: Optional[List[Tuple[int, int]]] = None) -> Union[ASRData, Dict[str, ASRData]]:
+    """
+    两步翻译流程：先直译，再意译和反思，按流水线方式批处理和多线程执行
+    batch_size: 每批最多句数；token_budget: 每批原文token预算；context_token_budget: 单侧上下文token预算
+    usage_report: 可选，传入列表时追加每个批次的token用量与耗时
+    single_call: 是否每批只请求一次（同时返回直译和意译）；为None时读取设置 translation_single_call
+    ranges: 可选，增量翻译时需要重新翻译的 [start, end) 区间；为None时翻译全部句子
+    target_lang 为列表时，为每种语言复制一份原文并调用 multi_target_translate，返回 {目标语言: ASRData}，
+    各语言的用量记录一并追加到 usage_report
+    """
+    if not isinstance(target_lang, str):
+        usage_reports: Dict[str, List[Dict]] = {}
+        results = multi_target_translate(
+            {lang: copy_source(asr_data) for lang in target_lang}, use_cache, num_threads, batch_size, source_lang,
+            terms_to_note, token_budget, context_token_budget, usage_reports, single_call,
+        )
+        if usage_report is not None:
+            for report in usage_reports.values():
+                usage_report.extend(report)
+        return results
+
+    # 在这里加载设置，每次调用时都获取最新配置
+    api_key, base_url, model, default_single_call, use_memory = _load_llm_settings()
+    if single_call is None:
+        single_call = default_single_call
     
-    logger.info("开始第一步：批量多线程直译...")
-    asr_data = step1_direct_translate(asr_data, use_cache, batch_size, num_threads, source_lang, target_lang, terms_to_note, api_key, base_url, model)
-    logger.info(f"直译完成，处理了 {len(asr_data.segments)} 个句子")
-    
-    logger.info("开始第二步：批量多线程意译和反思...")
-    asr_data = step2_free_translate(asr_data, use_cache, batch_size, num_threads, source_lang, target_lang, terms_to_note, api_key, base_url, model)
-    logger.info(f"意译和反思完成，处理了 {len(asr_data.segments)} 个句子")
-    
-    logger.info("两步翻译完成")
-    return asr_data
\ No newline at end of file
+    logger.info(f"使用模型: {model}, API地址: {base_url}")
+    if usage_report is None:
+        usage_report = []
+    hints = None
+    if use_memory:
+        ranges, hints = apply_translation_memory(asr_data, source_lang, target_lang, model, ranges)
+    
+    logger.info("开始批量多线程翻译（单次调用模式）..." if single_call else "开始流水线翻译：直译完成的批次立即进入意译和反思...")
+    asr_data = pipeline_translate(asr_data, use_cache, batch_size, num_threads, source_lang, target_lang, terms_to_note, api_key, base_url, model, token_budget, context_token_budget, usage_report, single_call, ranges, None, hints)
+    logger.info(f"翻译完成，处理了 {len(asr_data.segments)} 个句子")
+    
+    logger.info(f"两步翻译完成，token用量汇总: {summarize_usage(usage_report)}")
+    return asr_data
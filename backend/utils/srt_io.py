@@ -0,0 +1,270 @@
+"""
+SRT 读写
+
+所有SRT解析与时间戳格式化统一由此模块完成（ASRData、列式ASRData、ASS导出、合并视频时的时间轴平移、TTS、各ASR引擎）：
+- 解析：整个文件只用一个正则 findall 扫描一遍；时间戳行拼接后按定宽字节矩阵用 numpy 一次性换算为毫秒
+- 格式化：毫秒数组按列拆分为 时/分/秒/毫秒 并直接写成定宽字节矩阵，不逐条调用格式化函数
+- 写入：按块生成文本流式写入临时文件，再原子替换，长字幕不需要先拼出完整字符串
+"""
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# 一条字幕：可选的序号行、时间戳行、若干非空文本行（到空行或文件结尾为止）
+_CUE_RE = re.compile(
+    r'(?:^[^\S\n]*(\d+)[^\S\n]*\n)?'
+    r'^[^\S\n]*(\d{1,2}:\d{2}:\d{1,2}[.,]\d{3}[^\S\n]*-->[^\S\n]*\d{1,2}:\d{2}:\d{1,2}[.,]\d{3})[^\S\n]*'
+    r'((?:\n[^\S\n]*\S.*)*)',
+    re.M,
+)
+_TIME_RANGE_RE = re.compile(
+    r'(\d{1,2}):(\d{2}):(\d{1,2})[.,](\d{3})\s*-->\s*(\d{1,2}):(\d{2}):(\d{1,2})[.,](\d{3})'
+)
+_BLOCK_SEPARATOR_RE = re.compile(r'\n[^\S\n]*\n(?:[^\S\n]*\n)*')
+_TIMESTAMP_SPLIT_RE = re.compile(r'(\d{2}:\d{2}:\d{2},\d{3})')
+_STAMP_FIELDS_RE = re.compile(r'(\d{2}):(\d{2}):(\d{2}),(\d{3})')
+
+# 标准时间戳 "HH:MM:SS,mmm" 中各数字所在的列及其毫秒权重
+_STAMP_WIDTH = 12
+_STAMP_DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 11]
+_STAMP_WEIGHTS = np.array([36000000, 3600000, 600000, 60000, 10000, 1000, 100, 10, 1], dtype=np.int64)
+_RANGE_WIDTH = 29  # "HH:MM:SS,mmm --> HH:MM:SS,mmm"
+_RANGE_SECOND = 17  # 结束时间在时间戳行中的起始列
+
+WRITE_CHUNK = 4096  # 流式写入时每次格式化的字幕条数
+
+
+class SrtCues(NamedTuple):
+    """解析结果，按列存放"""
+    indices: List[Optional[str]]  # 文件中的序号行，缺失时为None
+    starts: np.ndarray            # 开始时间（毫秒，int64）
+    ends: np.ndarray              # 结束时间（毫秒，int64）
+    texts: List[str]              # 文本，多行以换行符连接，去除首尾空白
+
+
+def _fixed_stamps_to_ms(joined: str, count: int, width: int, columns: Sequence[int]):
+    """
+    把 count 个定宽字符串拼接后的结果按列换算为毫秒
+    columns 为每个时间戳在行内的起始列；格式不标准（非数字、分隔符不对）时返回None
+    """
+    if len(joined) != count * width or not joined.isascii():
+        return None
+    chars = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(count, width)
+    result = []
+    for col in columns:
+        stamp = chars[:, col:col + _STAMP_WIDTH]
+        digits = stamp[:, _STAMP_DIGITS].astype(np.int64) - 48
+        if ((digits < 0) | (digits > 9)).any() or (stamp[:, [2, 5]] != ord(':')).any():
+            return None
+        result.append(digits @ _STAMP_WEIGHTS)
+    return result
+
+
+def _time_ranges_to_ms(lines: List[str]):
+    """把时间戳行批量换算为 (开始, 结束) 毫秒数组：标准格式整体按列换算，否则逐行解析"""
+    count = len(lines)
+    if not count:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    fast = _fixed_stamps_to_ms(''.join(lines), count, _RANGE_WIDTH, (0, _RANGE_SECOND))
+    if fast is not None:
+        return fast[0], fast[1]
+    fields = np.array([
+        [int(x) for x in _TIME_RANGE_RE.match(line).groups()] for line in lines
+    ], dtype=np.int64).reshape(count, 2, 4)
+    times = fields @ np.array([3600000, 60000, 1000, 1], dtype=np.int64)
+    return times[:, 0].copy(), times[:, 1].copy()
+
+
+def _first_invalid_block(content: str) -> str:
+    for block in re.split(r'\n\s*\n', content.strip()):
+        lines = block.splitlines()
+        if len(lines) < 2 or not _CUE_RE.fullmatch(block.strip()):
+            return block
+    return content.strip()
+
+
+def parse_srt(content: str, strict: bool = True) -> SrtCues:
+    """
+    解析SRT字符串
+    strict 为True时，出现无法识别的字幕块会抛出 ValueError；为False时跳过这些内容
+    """
+    if content.startswith('\ufeff'):
+        content = content[1:]
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+    cues = _CUE_RE.findall(content)
+    if strict:
+        stripped = content.strip()
+        blocks = len(_BLOCK_SEPARATOR_RE.findall(stripped)) + 1 if stripped else 0
+        if blocks != len(cues):
+            raise ValueError(f"无效的SRT块格式: {_first_invalid_block(content)[:200]}")
+
+    starts, ends = _time_ranges_to_ms([cue[1] for cue in cues])
+    return SrtCues(
+        [cue[0] or None for cue in cues],
+        starts,
+        ends,
+        [cue[2].strip() for cue in cues],
+    )
+
+
+def ms_to_srt_time(ms) -> str:
+    """毫秒转为 SRT 时间格式 (HH:MM:SS,mmm)"""
+    total_seconds, milliseconds = divmod(int(ms), 1000)
+    minutes, seconds = divmod(total_seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02},{milliseconds:03}"
+
+
+def seconds_to_ms(seconds: Sequence[float]) -> np.ndarray:
+    """秒数组批量转为毫秒，四舍五入；负数按0处理"""
+    ms = np.rint(np.asarray(seconds, dtype=np.float64) * 1000).astype(np.int64)
+    return np.maximum(ms, 0)
+
+
+def _split_ms(ms: np.ndarray):
+    total_seconds, milliseconds = np.divmod(ms, 1000)
+    minutes, seconds = np.divmod(total_seconds, 60)
+    hours, minutes = np.divmod(minutes, 60)
+    return hours, minutes, seconds, milliseconds
+
+
+def format_srt_times(ms: Sequence[int]) -> List[str]:
+    """毫秒数组批量转为 HH:MM:SS,mmm"""
+    ms = np.asarray(ms, dtype=np.int64)
+    hours, minutes, seconds, milliseconds = _split_ms(ms)
+    count = len(ms)
+    if count and (ms.min() < 0 or hours.max() > 99):
+        # 超出两位小时数（或负数）的时间戳不是定宽的，逐个格式化
+        return [ms_to_srt_time(x) for x in ms.tolist()]
+    chars = np.empty((count, _STAMP_WIDTH), dtype=np.uint8)
+    chars[:, 2] = chars[:, 5] = ord(':')
+    chars[:, 8] = ord(',')
+    for col, value in zip(_STAMP_DIGITS, (
+            hours // 10, hours % 10, minutes // 10, minutes % 10, seconds // 10, seconds % 10,
+            milliseconds // 100, milliseconds // 10 % 10, milliseconds % 10)):
+        chars[:, col] = value + 48
+    joined = chars.tobytes().decode('ascii')
+    return [joined[i:i + _STAMP_WIDTH] for i in range(0, count * _STAMP_WIDTH, _STAMP_WIDTH)]
+
+
+def format_ass_times(ms: Sequence[int]) -> List[str]:
+    """毫秒数组批量转为 ASS 时间格式 H:MM:SS.cc（厘秒截断）"""
+    hours, minutes, seconds, milliseconds = _split_ms(np.asarray(ms, dtype=np.int64))
+    return [
+        f"{h}:{m:02}:{s:02}.{x // 10:02}"
+        for h, m, s, x in zip(hours.tolist(), minutes.tolist(), seconds.tolist(), milliseconds.tolist())
+    ]
+
+
+def iter_srt(starts: Sequence[int], ends: Sequence[int], texts: Sequence[str],
+             chunk_size: int = WRITE_CHUNK) -> Iterator[str]:
+    """
+    按块生成SRT文本，每块包含 chunk_size 条字幕
+    拼接结果与 ASRData.to_srt 相同：每条为 "序号\\n时间戳\\n文本\\n"，条目之间以空行分隔
+    """
+    for offset in range(0, len(texts), chunk_size):
+        stop = offset + chunk_size
+        start_stamps = format_srt_times(starts[offset:stop])
+        end_stamps = format_srt_times(ends[offset:stop])
+        blocks = [
+            f"{n}\n{a} --> {b}\n{text}\n"
+            for n, a, b, text in zip(range(offset + 1, stop + 1), start_stamps, end_stamps, texts[offset:stop])
+        ]
+        chunk = "\n".join(blocks)
+        yield chunk if offset == 0 else "\n" + chunk
+
+
+def format_srt(starts: Sequence[int], ends: Sequence[int], texts: Sequence[str]) -> str:
+    return ''.join(iter_srt(starts, ends, texts))
+
+
+def write_chunks(path: str, chunks: Iterable[str]) -> None:
+    """逐块写入临时文件再原子替换，读取方不会看到写了一半的字幕"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def write_srt(path: str, starts: Sequence[int], ends: Sequence[int], texts: Sequence[str]) -> None:
+    """流式写入SRT文件，每次只格式化 WRITE_CHUNK 条字幕"""
+    write_chunks(path, iter_srt(starts, ends, texts))
+
+
+def shift_srt_timestamps(content: str, offset_seconds: float) -> str:
+    """
+    把SRT内容中所有时间戳平移 offset_seconds 秒（结果小于0时取0），其余内容保持原样
+    所有时间戳一次切分出来、按列换算和格式化，再一次性拼回
+    """
+    parts = _TIMESTAMP_SPLIT_RE.split(content)
+    stamps = parts[1::2]
+    if not stamps:
+        return content
+    fast = _fixed_stamps_to_ms(''.join(stamps), len(stamps), _STAMP_WIDTH, (0,))
+    if fast is not None:
+        ms = fast[0]
+    else:
+        # 含非ASCII数字等无法按字节矩阵换算的时间戳，逐个解析
+        fields = np.array([[int(x) for x in _STAMP_FIELDS_RE.match(stamp).groups()] for stamp in stamps], dtype=np.int64)
+        ms = fields @ np.array([3600000, 60000, 1000, 1], dtype=np.int64)
+    parts[1::2] = format_srt_times(np.maximum(ms + round(offset_seconds * 1000), 0))
+    return ''.join(parts)
+
+
+if __name__ == '__main__':
+    # 微基准：与逐块 split + 逐条正则匹配的旧解析方式、逐条格式化的旧写法对比
+    # 用法: python -m utils.srt_io [字幕条数]
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = np.random.default_rng(0)
+    starts = np.cumsum(rng.integers(50, 800, n))
+    ends = starts + rng.integers(50, 600, n)
+    words = ["the", "subtitle", "我们", "仓库", "ok", "3.5"]
+    texts = [words[i % len(words)] + (" " if i % 3 else "") for i in range(n)]
+
+    def legacy_parse(srt_str):
+        pattern = re.compile(r'(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})')
+        result = []
+        for block in re.split(r'\n\s*\n', srt_str.strip()):
+            lines = block.splitlines()
+            parts = list(map(int, pattern.match(lines[1]).groups()))
+            result.append((
+                '\n'.join(lines[2:]).strip(),
+                parts[0] * 3600000 + parts[1] * 60000 + parts[2] * 1000 + parts[3],
+                parts[4] * 3600000 + parts[5] * 60000 + parts[6] * 1000 + parts[7],
+            ))
+        return result
+
+    def legacy_format(starts, ends, texts):
+        return "\n".join(
+            f"{i}\n{ms_to_srt_time(a)} --> {ms_to_srt_time(b)}\n{text}\n"
+            for i, (a, b, text) in enumerate(zip(starts.tolist(), ends.tolist(), texts), 1))
+
+    def legacy_shift(subtitle_content, time_offset):
+        def adjust_timestamp(match):
+            time_parts = match.group(0).replace(',', '.').split(':')
+            total_seconds = int(time_parts[0]) * 3600 + int(time_parts[1]) * 60 + float(time_parts[2]) + time_offset
+            new_seconds = total_seconds % 60
+            return f"{int(total_seconds // 3600):02d}:{int((total_seconds % 3600) // 60):02d}:{new_seconds:06.3f}".replace('.', ',')
+        return re.sub(r'\d{2}:\d{2}:\d{2},\d{3}', adjust_timestamp, subtitle_content)
+
+    def bench(label, fn):
+        began = time.perf_counter()
+        result = fn()
+        print(f"{label:<28}{(time.perf_counter() - began) * 1000:10.1f} ms")
+        return result
+
+    content = bench("format (legacy)", lambda: legacy_format(starts, ends, texts))
+    assert bench("format (srt_io)", lambda: format_srt(starts, ends, texts)) == content
+    legacy = bench("parse (legacy)", lambda: legacy_parse(content))
+    cues = bench("parse (srt_io)", lambda: parse_srt(content))
+    assert legacy == list(zip(cues.texts, cues.starts.tolist(), cues.ends.tolist()))
+    shifted = bench("shift timestamps (legacy)", lambda: legacy_shift(content, 12.5))
+    assert bench("shift timestamps (srt_io)", lambda: shift_srt_timestamps(content, 12.5)) == shifted
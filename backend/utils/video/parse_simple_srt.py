@@ -1,30 +1,19 @@
-import re
 from typing import List, Tuple
 
+from utils.srt_io import parse_srt
+
 def parse_srt_file(filepath: str) -> List[Tuple[str, float, float, str]]:
     """
     读取SRT文件并解析为 (index, start_time, end_time, text) 的列表
     """
-    pattern = re.compile(r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n(.*?)\n\n', re.DOTALL)
     with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read() + '\n\n'
-    matches = pattern.findall(content)
-    results = []
-    for m in matches:
-        idx = m[0]
-        start = _srt_time_to_seconds(m[1])
-        end = _srt_time_to_seconds(m[2])
-        text = m[3].replace('\n', ' ').strip()
-        results.append((idx, start, end, text))
-    return results
-
-def _srt_time_to_seconds(t: str) -> float:
-    """
-    将 SRT 时间格式 (HH:MM:SS,mmm) 转换为秒
-    """
-    h, m, s_milli = t.split(':')
-    s, milli = s_milli.split(',')
-    return int(h)*3600 + int(m)*60 + int(s) + int(milli)/1000.0
+        cues = parse_srt(f.read(), strict=False)
+    starts = (cues.starts / 1000.0).tolist()
+    ends = (cues.ends / 1000.0).tolist()
+    return [
+        (idx or str(n), start, end, text.replace('\n', ' ').strip())
+        for n, (idx, start, end, text) in enumerate(zip(cues.indices, starts, ends, cues.texts), 1)
+    ]
 
 def split_subtitles(subs: List[Tuple[str, float, float, str]],
                     max_chars=1000,
@@ -19,27 +19,17 @@ class VideoConverter:
         
     def check_codec(self, video_path: str) -> Optional[str]:
         """
-        Check the video codec of a file using ffprobe
+        Check the video codec of a file (cached media metadata, ffprobe runs once per file version)
         Returns: codec name (e.g., 'hevc', 'h264', 'av1') or None if detection fails
         """
-        try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-select_streams', 'v:0',
-                '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', video_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0:
-                codec = result.stdout.strip()
-                logger.info(f"Detected codec for {video_path}: {codec}")
-                return codec
-            else:
-                logger.error(f"ffprobe failed for {video_path}: {result.stderr}")
-                return None
-                
-        except (subprocess.TimeoutExpired, FileNotFoundError) as e:
-            logger.error(f"Error detecting codec for {video_path}: {e}")
+        from video.services.media_metadata import get_media_info
+
+        info = get_media_info(video_path)
+        if info is None:
+            logger.error(f"ffprobe failed for {video_path}")
             return None
+        logger.info(f"Detected codec for {video_path}: {info.video_codec}")
+        return info.video_codec
     
     def should_convert_to_av1(self, video_path: str) -> bool:
         """
@@ -0,0 +1,186 @@
+"""
+词级时间戳二进制存储
+
+转录得到的词级时间戳原本只保存在 work_dir/temp 下的临时SRT里，之后的每个环节都要重新解析文本SRT。
+转录完成后把它们写成与字幕同名的二进制文件（{video_id}_{lang}.words）。上传修改后的字幕时删除该文件：
+编辑后的字幕通常已合并为句级，不能再当作词级时间戳。
+文件只读、可直接 mmap：
+
+    文件头(64字节): magic, 版本, 词数, 句数, 字符串表字节数
+    starts     int64[n]        开始时间（毫秒）
+    ends       int64[n]        结束时间（毫秒）
+    offsets    int64[n+1]      每个词在字符串表中的字节偏移
+    sentences  int64[m+1]      每句第一个词的下标，最后一项为 n
+    table      bytes           所有词的 UTF-8 文本依次拼接
+
+数组直接是 mmap 上的 numpy 视图，不复制、不解析；按时间查找用二分（searchsorted），
+只有真正取文本的词才会被解码。
+"""
+import os
+import re
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.srt_io import parse_srt
+
+WORDS_SUFFIX = '.words'
+MAGIC = b'VGWORDS\0'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIQQQ')  # magic, version, reserved, 词数, 句数, 字符串表字节数
+HEADER_SIZE = 64
+
+# 以这些字符结尾的词视为句子结束
+_SENTENCE_END_RE = re.compile(r'[.?!。？！…]["\'”’)）]*$')
+
+
+def word_store_path(srt_path: str) -> str:
+    """字幕文件对应的词级存储路径（同名，扩展名为 .words）"""
+    return os.path.splitext(srt_path)[0] + WORDS_SUFFIX
+
+
+def sentence_boundaries(texts: Sequence[str]) -> np.ndarray:
+    """按句末标点划分句子，返回每句第一个词的下标，末尾追加词数"""
+    count = len(texts)
+    starts = [0] if count else []
+    for i, text in enumerate(texts[:-1] if count else []):
+        if _SENTENCE_END_RE.search(text.rstrip()):
+            starts.append(i + 1)
+    starts.append(count)
+    return np.asarray(starts, dtype=np.int64)
+
+
+def write_word_store(path: str, starts, ends, texts: Sequence[str], sentences=None) -> None:
+    """写入词级存储：先写临时文件再原子替换"""
+    count = len(texts)
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(count + 1, dtype='<i8')
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=count), out=offsets[1:])
+    if sentences is None:
+        sentences = sentence_boundaries(texts)
+    sentences = np.asarray(sentences, dtype='<i8')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, count, len(sentences) - 1, int(offsets[-1])).ljust(HEADER_SIZE, b'\0'))
+        f.write(np.asarray(starts, dtype='<i8').tobytes())
+        f.write(np.asarray(ends, dtype='<i8').tobytes())
+        f.write(offsets.tobytes())
+        f.write(sentences.tobytes())
+        f.write(b''.join(encoded))
+    os.replace(tmp_path, path)
+
+
+def write_word_store_from_srt(path: str, srt_content: str) -> int:
+    """把词级SRT写成词级存储，返回词数"""
+    cues = parse_srt(srt_content, strict=False)
+    write_word_store(path, cues.starts, cues.ends, cues.texts)
+    return len(cues.texts)
+
+
+class WordStore:
+    """
+    只读的词级存储，数组均为 mmap 上的视图
+    按时间查找假定 starts/ends 单调不减（词级转录结果满足这一点）
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._raw = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(self._raw) < HEADER_SIZE:
+            raise ValueError(f"无效的词级存储文件: {path}")
+        magic, version, _, count, sentence_count, table_size = _HEADER.unpack_from(self._raw, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"无效的词级存储文件: {path}")
+
+        pos = HEADER_SIZE
+
+        def take(length: int) -> np.ndarray:
+            nonlocal pos
+            view = self._raw[pos:pos + length * 8].view('<i8')
+            pos += length * 8
+            return view
+
+        self.starts = take(count)
+        self.ends = take(count)
+        self.offsets = take(count + 1)
+        self.sentences = take(sentence_count + 1)
+        self.table = self._raw[pos:pos + table_size]
+        if len(self.table) != table_size:
+            raise ValueError(f"词级存储文件不完整: {path}")
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __enter__(self) -> 'WordStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """释放对映射的引用；外部仍持有的数组视图会让映射保持到它们被回收为止"""
+        self.starts = self.ends = self.offsets = self.sentences = self.table = None
+        self._raw = None
+
+    def word(self, index: int) -> str:
+        return self.table[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+    def words(self, start: int, end: int) -> List[str]:
+        """下标区间 [start, end) 内的词，一次解码整段再切分"""
+        if end <= start:
+            return []
+        base = int(self.offsets[start])
+        chunk = self.table[base:self.offsets[end]].tobytes()
+        bounds = (self.offsets[start:end + 1] - base).tolist()
+        return [chunk[a:b].decode('utf-8') for a, b in zip(bounds, bounds[1:])]
+
+    def range_between(self, start_ms: int, end_ms: int) -> Tuple[int, int]:
+        """与时间段 [start_ms, end_ms) 有重叠的词的下标区间"""
+        first = int(np.searchsorted(self.ends, start_ms, side='right'))
+        last = int(np.searchsorted(self.starts, end_ms, side='left'))
+        return first, max(first, last)
+
+    def index_at(self, ms: int) -> int:
+        """ms 时刻正在说的词（或之后的第一个词）的下标，超出末尾时返回词数"""
+        return int(np.searchsorted(self.ends, ms, side='right'))
+
+    def sentence_of(self, index: int) -> int:
+        """第 index 个词所在句子的序号"""
+        return int(np.searchsorted(self.sentences, index, side='right')) - 1
+
+    def sentence_range(self, sentence: int) -> Tuple[int, int]:
+        return int(self.sentences[sentence]), int(self.sentences[sentence + 1])
+
+    def texts(self) -> List[str]:
+        return self.words(0, len(self))
+
+    def to_columnar(self):
+        """
+        转为 ColumnarASRData：时间数组直接引用 mmap，不复制；
+        字符串表整体解码一次，字节偏移按 UTF-8 续字节个数批量换算为字符偏移
+        """
+        from utils.split_subtitle.asr_columnar import ColumnarASRData
+
+        table = np.asarray(self.table)
+        continuation = np.zeros(len(table) + 1, dtype=np.int64)
+        np.cumsum((table & 0xC0) == 0x80, out=continuation[1:])
+        char_offsets = self.offsets - continuation[self.offsets]
+        return ColumnarASRData(table.tobytes().decode('utf-8'), char_offsets, self.starts, self.ends)
+
+
+def open_word_store(path: str) -> Optional[WordStore]:
+    """打开词级存储；文件不存在或格式不对时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return WordStore(path)
+    except (ValueError, struct.error):
+        return None
+
+
+def remove_word_store(srt_path: str) -> None:
+    """删除字幕对应的词级存储"""
+    path = word_store_path(srt_path)
+    if os.path.exists(path):
+        os.remove(path)
@@ -3,12 +3,7 @@ import requests
 from http import HTTPStatus
 from dashscope.audio.asr import Recognition
 
-def ms_to_srt_time(ms: int) -> str:
-    """毫秒转为 SRT 时间格式 (HH:MM:SS,mmm)"""
-    seconds, milliseconds = divmod(ms, 1000)
-    minutes, seconds = divmod(seconds, 60)
-    hours, minutes = divmod(minutes, 60)
-    return f"{hours:02}:{minutes:02}:{seconds:02},{milliseconds:03}"
+from utils.srt_io import ms_to_srt_time
 
 def json_to_word_srt(data: list) -> str:
     """
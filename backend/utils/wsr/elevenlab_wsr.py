@@ -4,22 +4,7 @@ import re
 import requests
 from typing import Iterable, List, Dict, Any, Optional
 
-def sec_to_srt_time(sec: float) -> str:
-    """
-    将秒(float)转为 SRT 时间格式: HH:MM:SS,mmm
-    """
-    if sec is None:
-        sec = 0.0
-    if sec < 0:
-        sec = 0.0
-    total_ms = int(round(sec * 1000))
-    ms = total_ms % 1000
-    total_s = total_ms // 1000
-    s = total_s % 60
-    total_m = total_s // 60
-    m = total_m % 60
-    h = total_m // 60
-    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+from utils.srt_io import format_srt
 
 
 # 字级时间戳SRT文件建立==========
@@ -28,8 +13,9 @@ def build_word_level_srt(entries: Iterable[Dict[str, Any]]) -> str:
     entries: 形如 [{"text": "...", "start": 1.23, "end": 1.56}, ...] 的可迭代对象
     返回字级（逐词）SRT字符串
     """
-    lines: List[str] = []
-    idx = 1
+    starts: List[int] = []
+    ends: List[int] = []
+    texts: List[str] = []
     for e in entries:
         text = (e.get("text") or "").strip()
         if not text:
@@ -42,12 +28,10 @@ def build_word_level_srt(entries: Iterable[Dict[str, Any]]) -> str:
         if end <= start:
             end = start + 0.001  # 1ms 兜底
 
-        lines.append(str(idx))
-        lines.append(f"{sec_to_srt_time(start)} --> {sec_to_srt_time(end)}")
-        lines.append(text)
-        lines.append("")  # 空行
-        idx += 1
-    return "\n".join(lines)
+        starts.append(max(0, round(start * 1000)))
+        ends.append(max(0, round(end * 1000)))
+        texts.append(text)
+    return format_srt(starts, ends, texts)
 
 
 # ========== ElevenLabs 响应适配器 ==========
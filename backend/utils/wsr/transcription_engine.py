@@ -214,16 +214,14 @@ class OpenAIWhisperEngine(TranscriptionEngine):
     
     def _convert_to_srt(self, words) -> str:
         """Convert OpenAI word timestamps to SRT format"""
-        from utils.video.time_convert import seconds_to_srt_time
+        from utils.srt_io import format_srt, seconds_to_ms
         
-        srt_content = ""
-        idx = 1
-        
-        for word in words:
-            if word.word.strip():
-                srt_content += f"{idx}\n{seconds_to_srt_time(word.start)} --> " \
-                            f"{seconds_to_srt_time(word.end)}\n{word.word.strip()}\n\n"
-                idx += 1
+        words = [word for word in words if word.word.strip()]
+        srt_content = format_srt(
+            seconds_to_ms([word.start for word in words]),
+            seconds_to_ms([word.end for word in words]),
+            [word.word.strip() for word in words],
+        )
         print("srt_content:",srt_content)
         return srt_content
     
@@ -59,17 +59,13 @@ def transcribe_audio_openai(audio_file_path: str, api_key: str, base_url: str =
 
 def _convert_whisper_to_srt(words) -> str:
     """Convert OpenAI Whisper word-level timestamps to SRT format"""
-    from utils.video.time_convert import seconds_to_srt_time
-    
-    srt_content = ""
-    idx = 1
-    
-    for word in words:
-        srt_content += f"{idx}\n{seconds_to_srt_time(word.start)} --> " \
-                      f"{seconds_to_srt_time(word.end)}\n{word.word.strip()}\n\n"
-        idx += 1
-    
-    return srt_content
+    from utils.srt_io import format_srt, seconds_to_ms
+
+    return format_srt(
+        seconds_to_ms([word.start for word in words]),
+        seconds_to_ms([word.end for word in words]),
+        [word.word.strip() for word in words],
+    )
 
 
 # ===== Usage Example =====
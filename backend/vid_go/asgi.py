@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vid_go.settings')
+# Stream media, exports and downloads with the async views (video/views/async_media.py)
+os.environ.setdefault('VIDGO_ASYNC_MEDIA', '1')
 
 application = get_asgi_application()
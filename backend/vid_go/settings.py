@@ -186,6 +186,40 @@ AUTH_PASSWORD_VALIDATORS = [
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # 指向项目根目录下的 media 文件夹
 MEDIA_URL = '/media/'  # 访问媒体的 URL 前缀
 
+# 大文件发送方式（video/views/range_serving.py）：
+# ''                 由应用直接发送，gunicorn 下经 wsgi.file_wrapper 使用 os.sendfile 零拷贝
+# 'x-accel-redirect' 交给前置 nginx 发送，目录与 internal location 的对应关系见 MEDIA_ACCEL_LOCATIONS
+# 'x-sendfile'       交给前置 Apache(mod_xsendfile)/lighttpd 发送
+MEDIA_SENDFILE_MODE = os.getenv('VIDGO_SENDFILE_MODE', '').lower()
+MEDIA_ACCEL_LOCATIONS = {
+    MEDIA_ROOT: os.getenv('VIDGO_ACCEL_MEDIA_LOCATION', '/protected-media/'),
+    os.path.join(BASE_DIR, 'work_dir', 'export_videos'): os.getenv('VIDGO_ACCEL_EXPORT_LOCATION', '/protected-exports/'),
+}
+
+# ASGI 下媒体/导出/下载使用异步视图（video/views/async_media.py），慢客户端不再占用工作线程
+# vid_go/asgi.py 默认开启；WSGI 下必须关闭（同步服务器会把异步响应体整个读入内存）
+MEDIA_ASYNC_VIEWS = os.getenv('VIDGO_ASYNC_MEDIA', '').lower() in ('1', 'true', 'yes')
+# 异步流式发送时读文件的线程数（每次只读一个块，与并发连接数无关）
+MEDIA_ASYNC_READ_THREADS = int(os.getenv('VIDGO_ASYNC_READ_THREADS', '8'))
+
+# 懒加载 HLS 按需生成的 ts 分片缓存上限（MB），超出后按最近最少使用淘汰（video/services/hls_packaging.py）
+HLS_SEGMENT_CACHE_MB = int(os.getenv('VIDGO_HLS_CACHE_MB', '2048'))
+
+# 自适应码率（ABR）阶梯，格式 高度:视频码率，逗号分隔；高于源分辨率的档位不生成（video/services/abr_ladder.py）
+ABR_LADDER = os.getenv('VIDGO_ABR_LADDER', '1080:5000k,720:2800k,480:1400k')
+ABR_AUDIO_BITRATE = os.getenv('VIDGO_ABR_AUDIO_BITRATE', '128k')
+ABR_AUDIO_ONLY = os.getenv('VIDGO_ABR_AUDIO_ONLY', 'true').lower() in ('1', 'true', 'yes')  # 额外生成纯音频档
+# ABR 转码的编码线程数（0 表示 CPU 核心数的一半）；进程以最低优先级（nice 19）运行
+ABR_CPU_THREADS = int(os.getenv('VIDGO_ABR_THREADS', '0'))
+
+# 新视频入库时在后台生成拖动预览雪碧图（video/services/trickplay.py）
+TRICKPLAY_AT_INGEST = os.getenv('VIDGO_TRICKPLAY_AT_INGEST', 'true').lower() in ('1', 'true', 'yes')
+
+# 缩略图尺寸档位（宽度像素，逗号分隔），按需用 Pillow 生成 WebP/JPEG，缓存在 media/thumbnail/<宽度>/
+# （video/services/thumbnail_variants.py）；保存缩略图时在后台预生成各档 WebP
+THUMBNAIL_VARIANT_WIDTHS = os.getenv('VIDGO_THUMBNAIL_WIDTHS', '160,320,480,640')
+THUMBNAIL_VARIANTS_AT_INGEST = os.getenv('VIDGO_THUMBNAIL_VARIANTS_AT_INGEST', 'true').lower() in ('1', 'true', 'yes')
+
 # 18GB+大文件上传设置
 DATA_UPLOAD_MAX_MEMORY_SIZE = None  # 对基于内存的上传不限制
 FILE_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB - 超过这个大小的文件将保存到临时文件
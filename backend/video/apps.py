@@ -14,14 +14,17 @@ class VideoConfig(AppConfig):
         if getattr(self, "_worker_started", False):
             return
 
-        from .tasks import process_next_task, process_download_task, process_export_task, process_tts_task
+        from .tasks import (
+            process_next_task, process_download_task, process_export_task, process_tts_task, process_hls_task,
+            abr_queue, package_abr_video, trickplay_queue, generate_trickplay_for_video,
+        )
 
         # ===== 线程池配置 =====
         # 根据 CPU 核心数动态计算
         cpu_count = os.cpu_count() or 4
 
-        # 字幕任务：注意 optimise_srt 内部会创建 8 个线程（嵌套线程池）
-        # 为避免线程爆炸（4 核 × 8 = 32 个内层线程），限制外层并发数
+        # 字幕任务：注意 optimise_srt / translate_srt 内部会创建 16 个线程（嵌套线程池）
+        # 这些线程大多在 llm_gateway 中排队等待并发名额，但仍限制外层并发数以免线程过多
         subtitle_pool_size = min(2, cpu_count // 2)  # 最多 2 个，避免过度调度
 
         # 下载任务：I/O 密集（网络下载），建议 2-3 倍 CPU 核心数
@@ -34,6 +37,12 @@ class VideoConfig(AppConfig):
         # TTS任务：CPU密集（音频合成 + FFmpeg），建议等于 CPU 核心数
         tts_pool_size = cpu_count
 
+        # HLS 打包：流复制以磁盘 I/O 为主，少量并发即可
+        hls_pool_size = min(2, cpu_count)
+
+        # ABR 转码（CPU 密集且优先级最低，编码线程数见 settings.ABR_CPU_THREADS）和拖动预览雪碧图
+        # 同一时间各只跑一个，由专用线程阻塞在各自的队列上，不需要线程池
+
         # 创建线程池
         subtitle_executor = ThreadPoolExecutor(
             max_workers=subtitle_pool_size,
@@ -55,99 +64,77 @@ class VideoConfig(AppConfig):
             thread_name_prefix="tts-worker"
         )
 
-        print(f"[ThreadPool] Subtitle workers: {subtitle_pool_size} (each creates 8 nested threads)")
+        hls_executor = ThreadPoolExecutor(
+            max_workers=hls_pool_size,
+            thread_name_prefix="hls-worker"
+        )
+
+        print(f"[ThreadPool] Subtitle workers: {subtitle_pool_size} (each creates 16 nested threads)")
         print(f"[ThreadPool] Download workers: {download_pool_size}")
         print(f"[ThreadPool] Export workers: {export_pool_size}")
         print(f"[ThreadPool] TTS workers: {tts_pool_size}")
-        print(f"[ThreadPool] Total estimated threads: ~{subtitle_pool_size * 8 + download_pool_size + export_pool_size + tts_pool_size + 12}")
+        print(f"[ThreadPool] HLS workers: {hls_pool_size}")
+        print("[ThreadPool] ABR / Trickplay workers: 1 / 1 (dedicated threads)")
+        print(f"[ThreadPool] Total estimated threads: ~{subtitle_pool_size * 16 + download_pool_size + export_pool_size + tts_pool_size + hls_pool_size + 2 + 12}")
 
         # ===== 任务调度器 =====
-        def _subtitle_dispatcher():
-            """字幕任务调度器：从队列取任务，提交到线程池"""
-            while True:
-                try:
-                    connection.close_if_unusable_or_obsolete()
-
-                    # 包装任务执行函数
-                    def task_wrapper():
-                        try:
-                            # 每个线程需要独立的数据库连接
-                            connection.close_if_unusable_or_obsolete()
-                            process_next_task()
-                        except Exception as e:
-                            print(f"Subtitle task error: {e}")
-
-                    # 提交到线程池（非阻塞）
-                    subtitle_executor.submit(task_wrapper)
-
-                    # 短暂休眠，避免空轮询消耗 CPU
-                    time.sleep(0.1 + random.random() * 0.1)
-                except Exception as e:
-                    print(f"Subtitle dispatcher error: {e}")
-                    time.sleep(5)
-
-        def _download_dispatcher():
-            """下载任务调度器"""
-            while True:
+        def _start_dispatcher(name, executor, workers, fn):
+            """
+            调度线程：把 fn 反复提交到线程池，fn 内部用 get_nowait 取任务，队列为空时立即返回
+            用信号量限制在途的提交数不超过 worker 数：worker 都在忙时调度线程等待，
+            不会在线程池队列里堆积空转的包装函数
+            """
+            slots = threading.BoundedSemaphore(workers)
+
+            def task_wrapper():
                 try:
+                    # 每个线程需要独立的数据库连接
                     connection.close_if_unusable_or_obsolete()
-
-                    def task_wrapper():
-                        try:
-                            connection.close_if_unusable_or_obsolete()
-                            process_download_task()
-                        except Exception as e:
-                            print(f"Download task error: {e}")
-
-                    download_executor.submit(task_wrapper)
-                    time.sleep(0.1 + random.random() * 0.1)
+                    fn()
                 except Exception as e:
-                    print(f"Download dispatcher error: {e}")
-                    time.sleep(5)
-
-        def _export_dispatcher():
-            """导出任务调度器"""
-            while True:
-                try:
-                    connection.close_if_unusable_or_obsolete()
-
-                    def task_wrapper():
-                        try:
-                            connection.close_if_unusable_or_obsolete()
-                            process_export_task()
-                        except Exception as e:
-                            print(f"Export task error: {e}")
-
-                    export_executor.submit(task_wrapper)
+                    print(f"{name} task error: {e}")
+                finally:
+                    slots.release()
+
+            def dispatcher():
+                while True:
+                    slots.acquire()
+                    try:
+                        connection.close_if_unusable_or_obsolete()
+                        executor.submit(task_wrapper)
+                    except Exception as e:
+                        slots.release()
+                        print(f"{name} dispatcher error: {e}")
+                        time.sleep(5)
+                        continue
+                    # 短暂休眠，避免空轮询消耗 CPU
                     time.sleep(0.1 + random.random() * 0.1)
-                except Exception as e:
-                    print(f"Export dispatcher error: {e}")
-                    time.sleep(5)
 
-        def _tts_dispatcher():
-            """TTS任务调度器"""
-            while True:
-                try:
-                    connection.close_if_unusable_or_obsolete()
+            threading.Thread(target=dispatcher, daemon=True, name=f"{name.lower()}-dispatcher").start()
 
-                    def task_wrapper():
-                        try:
-                            connection.close_if_unusable_or_obsolete()
-                            process_tts_task()
-                        except Exception as e:
-                            print(f"TTS task error: {e}")
+        def _start_queue_worker(name, task_queue, handler):
+            """单 worker 队列：专用线程阻塞在 queue.get() 上，有任务才醒来"""
+            def worker():
+                while True:
+                    item = task_queue.get()
+                    try:
+                        connection.close_if_unusable_or_obsolete()
+                        handler(item)
+                    except Exception as e:
+                        print(f"{name} task error: {e}")
+                    finally:
+                        task_queue.task_done()
 
-                    tts_executor.submit(task_wrapper)
-                    time.sleep(0.1 + random.random() * 0.1)
-                except Exception as e:
-                    print(f"TTS dispatcher error: {e}")
-                    time.sleep(5)
+            threading.Thread(target=worker, daemon=True, name=f"{name.lower()}-worker").start()
 
         # 启动调度器线程（守护线程）
-        threading.Thread(target=_subtitle_dispatcher, daemon=True, name="subtitle-dispatcher").start()
-        threading.Thread(target=_download_dispatcher, daemon=True, name="download-dispatcher").start()
-        threading.Thread(target=_export_dispatcher, daemon=True, name="export-dispatcher").start()
-        threading.Thread(target=_tts_dispatcher, daemon=True, name="tts-dispatcher").start()
+        _start_dispatcher("Subtitle", subtitle_executor, subtitle_pool_size, process_next_task)
+        _start_dispatcher("Download", download_executor, download_pool_size, process_download_task)
+        _start_dispatcher("Export", export_executor, export_pool_size, process_export_task)
+        _start_dispatcher("TTS", tts_executor, tts_pool_size, process_tts_task)
+        _start_dispatcher("HLS", hls_executor, hls_pool_size, process_hls_task)
+        _start_queue_worker("ABR", abr_queue, package_abr_video)
+        _start_queue_worker("Trickplay", trickplay_queue, generate_trickplay_for_video)
 
         self._worker_started = True
         print("[Workers] Background task dispatchers with thread pools started")
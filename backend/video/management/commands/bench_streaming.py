@@ -0,0 +1,186 @@
+from django.core.management.base import BaseCommand, CommandError
+from urllib.parse import urlsplit
+import asyncio
+import json
+import socket
+import ssl
+import statistics
+import time
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _ms(value):
+    return None if value is None else round(value * 1000, 1)
+
+
+class Target:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise CommandError(f'Unsupported URL: {url}')
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self.netloc = parts.netloc
+
+    def request(self, extra_headers=''):
+        return (f'GET {self.path} HTTP/1.1\r\nHost: {self.netloc}\r\n'
+                f'User-Agent: vidgo-bench-streaming\r\n{extra_headers}Connection: close\r\n\r\n').encode()
+
+
+async def open_connection(target, recv_buffer):
+    """Connection with a small receive buffer, so a slow reader pushes back on the server quickly"""
+    loop = asyncio.get_running_loop()
+    family, type_, proto, _, address = (await loop.getaddrinfo(
+        target.host, target.port, type=socket.SOCK_STREAM))[0]
+    sock = socket.socket(family, type_, proto)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_buffer)
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, address)
+    except BaseException:
+        sock.close()
+        raise
+    return await asyncio.open_connection(
+        sock=sock, ssl=target.ssl, server_hostname=target.host if target.ssl else None, limit=recv_buffer)
+
+
+async def read_status(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1])
+
+
+async def slow_client(target, options, deadline, result):
+    """Download at `rate` bytes/s until the deadline, like a phone on a weak connection"""
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            open_connection(target, options['recv_buffer']), options['header_timeout'])
+        writer.write(target.request())
+        await writer.drain()
+        status = await asyncio.wait_for(read_status(reader), options['header_timeout'])
+        result['ttfb'] = time.perf_counter() - started
+        result['status'] = status
+        rate = options['rate'] * 1024
+        chunk = max(1024, int(rate / 10))
+        while time.perf_counter() < deadline:
+            data = await reader.read(chunk)
+            if not data:
+                break
+            result['bytes'] += len(data)
+            await asyncio.sleep(len(data) / rate)
+    except asyncio.TimeoutError:
+        result['error'] = 'timeout'
+    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+        result['error'] = type(e).__name__
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def probe(target, options, deadline, latencies, failures):
+    """A short Range request at a fixed interval: how long an interactive request waits meanwhile"""
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(open_connection(target, 65536), options['header_timeout'])
+            writer.write(target.request('Range: bytes=0-1023\r\n'))
+            await writer.drain()
+            await asyncio.wait_for(reader.read(), options['header_timeout'])
+            latencies.append(time.perf_counter() - started)
+        except (asyncio.TimeoutError, OSError):
+            failures.append(time.perf_counter() - started)
+        finally:
+            if writer is not None:
+                writer.close()
+        await asyncio.sleep(options['probe_interval'])
+
+
+async def run_level(target, clients, options):
+    deadline = time.perf_counter() + options['duration']
+    results = [{'ttfb': None, 'status': None, 'bytes': 0, 'error': None} for _ in range(clients)]
+    latencies, failures = [], []
+    tasks = [asyncio.create_task(slow_client(target, options, deadline, r)) for r in results]
+    await asyncio.sleep(min(1.0, options['duration'] / 4))  # let the streams occupy the server first
+    tasks.append(asyncio.create_task(probe(target, options, deadline, latencies, failures)))
+    await asyncio.gather(*tasks)
+
+    ttfbs = [r['ttfb'] for r in results if r['ttfb'] is not None]
+    served = sum(1 for r in results if r['status'] in (200, 206))
+    errors = {}
+    for r in results:
+        if r['error']:
+            errors[r['error']] = errors.get(r['error'], 0) + 1
+    return {
+        'clients': clients,
+        'streaming': served,
+        'errors': errors,
+        'ttfb_p50_ms': _ms(percentile(ttfbs, 0.5)),
+        'ttfb_p95_ms': _ms(percentile(ttfbs, 0.95)),
+        'probe_p50_ms': _ms(percentile(latencies, 0.5)),
+        'probe_p95_ms': _ms(percentile(latencies, 0.95)),
+        'probe_failures': len(failures),
+        'throughput_mb_s': round(sum(r['bytes'] for r in results) / options['duration'] / 2 ** 20, 2),
+        'mean_client_kb_s': round(statistics.mean(r['bytes'] for r in results) / options['duration'] / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Load test: N slow clients stream a media URL while a probe measures request latency. '
+            'Run it against the WSGI server (run_all.sh) and the ASGI one (VIDGO_SERVER=asgi) to compare.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Media URL to stream, e.g. http://127.0.0.1:9000/api/media/video/<md5>.mp4')
+        parser.add_argument('--clients', default='8,32,128,256',
+                            help='Comma separated concurrency levels (default: 8,32,128,256)')
+        parser.add_argument('--rate', type=float, default=64, help='Download rate per slow client in KB/s')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds per concurrency level')
+        parser.add_argument('--recv-buffer', type=int, default=16384, help='Client socket receive buffer in bytes')
+        parser.add_argument('--header-timeout', type=float, default=10,
+                            help='Seconds to wait for response headers before counting a timeout')
+        parser.add_argument('--probe-interval', type=float, default=0.5, help='Seconds between probe requests')
+        parser.add_argument('--max-probe-p95', type=float, default=1000,
+                            help='A level counts as sustained when probe p95 stays below this many ms')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        target = Target(options['url'])
+        try:
+            levels = [int(c) for c in options['clients'].split(',') if c.strip()]
+        except ValueError:
+            raise CommandError('--clients must be a comma separated list of integers')
+
+        self.stdout.write(f'Streaming {options["url"]} at {options["rate"]:g} KB/s per client, '
+                          f'{options["duration"]:g}s per level')
+        results = []
+        capacity = 0
+        for clients in levels:
+            result = asyncio.run(run_level(target, clients, options))
+            sustained = (result['streaming'] == clients and not result['probe_failures']
+                         and result['probe_p95_ms'] is not None
+                         and result['probe_p95_ms'] <= options['max_probe_p95'])
+            result['sustained'] = sustained
+            if sustained:
+                capacity = max(capacity, clients)
+            results.append(result)
+            self.stdout.write(
+                f'{clients:>5} clients: streaming={result["streaming"]} errors={result["errors"] or 0} '
+                f'ttfb p50/p95={result["ttfb_p50_ms"]}/{result["ttfb_p95_ms"]}ms '
+                f'probe p50/p95={result["probe_p50_ms"]}/{result["probe_p95_ms"]}ms '
+                f'probe_failures={result["probe_failures"]} '
+                f'throughput={result["throughput_mb_s"]}MB/s {"OK" if sustained else "SATURATED"}')
+
+        self.stdout.write(self.style.SUCCESS(f'Sustained concurrent streams: {capacity}'))
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump({'url': options['url'], 'capacity': capacity, 'levels': results}, f, indent=2)
+            self.stdout.write(f'Results written to {options["json_path"]}')
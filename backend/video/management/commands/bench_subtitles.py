@@ -0,0 +1,203 @@
+from django.core.management.base import BaseCommand, CommandError
+from unittest import mock
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from utils import llm_cache
+from utils.llm_gateway import get_llm_gateway
+from utils.llm_mock_server import MockLLMServer
+from utils.split_subtitle import main as split_main
+from utils.split_subtitle import translate as split_translate
+from utils.srt_io import format_srt
+from video.views.set_setting import load_all_settings
+
+
+_VOCABULARY = (
+    "the a we you it this that video model data time people work make system next first "
+    "really going know think look right thing start because about would could should "
+    "subtitle translate sentence speaker language minute example question answer simple"
+).split()
+
+
+def generate_word_srt(duration_seconds, punctuated=False, seed=0):
+    """生成词级SRT：约每秒2.5个词，句间有较长停顿；punctuated 为True时句末带标点"""
+    rng = random.Random(seed)
+    starts, ends, texts = [], [], []
+    t = 0
+    end_ms = int(duration_seconds * 1000)
+    while t < end_ms:
+        sentence_length = rng.randint(5, 25)
+        for i in range(sentence_length):
+            duration = rng.randint(150, 450)
+            word = rng.choice(_VOCABULARY)
+            if i == sentence_length - 1 and punctuated:
+                word += rng.choice(".?!.")
+            elif punctuated and rng.random() < 0.05:
+                word += ","
+            starts.append(t)
+            ends.append(t + duration)
+            texts.append(word)
+            t += duration + rng.randint(0, 120)
+        t += rng.randint(300, 1500)
+    return format_srt(starts, ends, texts), len(texts)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks optimise_srt/translate_srt against a local mock LLM server (no provider calls)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', default='10,60,240',
+                            help='Comma separated transcript durations in minutes (default: 10,60,240)')
+        parser.add_argument('--latency', type=float, default=200, help='Mock LLM latency per request in ms')
+        parser.add_argument('--jitter', type=float, default=100, help='Random extra latency per request in ms')
+        parser.add_argument('--rate-limit', type=float, default=0.0,
+                            help='Probability that the mock server answers 429')
+        parser.add_argument('--max-concurrent', type=int, default=0,
+                            help='Mock server answers 429 above this many in-flight requests (0: unlimited)')
+        parser.add_argument('--punctuated', action='store_true',
+                            help='Generate transcripts with punctuation (exercises local segmentation)')
+        parser.add_argument('--no-local-segmentation', action='store_true',
+                            help='Always send chunks to the LLM for sentence splitting')
+        parser.add_argument('--skip-translate', action='store_true', help='Only benchmark optimise_srt')
+        parser.add_argument('--target-lang', default='zh', help='Translation target language')
+        parser.add_argument('--threads', type=int, default=split_main.FIXED_NUM_THREADS,
+                            help='Thread pool size for optimise_srt/translate_srt')
+        parser.add_argument('--tracemalloc', action='store_true',
+                            help='Track peak Python heap with tracemalloc (slower, but per-run)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        try:
+            durations = [float(m) for m in options['minutes'].split(',') if m.strip()]
+        except ValueError:
+            raise CommandError('--minutes must be a comma separated list of numbers')
+
+        server = MockLLMServer(
+            latency_ms=options['latency'],
+            jitter_ms=options['jitter'],
+            rate_limit_ratio=options['rate_limit'],
+            max_concurrent=options['max_concurrent'],
+            seed=options['seed'],
+        ).start()
+        self.stdout.write(f'Mock LLM server listening on {server.base_url}')
+
+        # 指向模拟服务的配置；关闭翻译记忆，避免读写数据库影响计时
+        settings = load_all_settings()
+        defaults = dict(settings.get('DEFAULT', {}))
+        defaults.update({
+            'selected_model_provider': 'deepseek',
+            'deepseek_api_key': 'bench',
+            'deepseek_base_url': server.base_url,
+            'use_proxy': 'false',
+            'translation_memory': 'false',
+            'local_segmentation': 'false' if options['no_local_segmentation'] else 'true',
+        })
+        settings = dict(settings, DEFAULT=defaults)
+
+        results = []
+        try:
+            with tempfile.TemporaryDirectory(prefix='vidgo_bench_') as work_dir, \
+                    mock.patch.object(split_main, 'load_all_settings', lambda: settings), \
+                    mock.patch.object(split_translate, 'load_all_settings', lambda: settings):
+                for index, minutes in enumerate(durations):
+                    result = self.run_case(server, work_dir, index, minutes, options)
+                    results.append(result)
+                    self.report(result)
+        finally:
+            server.stop()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Results written to {options["json_path"]}')
+        self.stdout.write(self.style.SUCCESS(f'Benchmarked {len(results)} transcript(s)'))
+
+    def run_case(self, server, work_dir, index, minutes, options):
+        srt_content, word_count = generate_word_srt(minutes * 60, options['punctuated'], options['seed'] + index)
+        raw_path = os.path.join(work_dir, f'{index}_raw.srt')
+        optimised_path = os.path.join(work_dir, f'{index}_optimised.srt')
+        translated_path = os.path.join(work_dir, f'{index}_{options["target_lang"]}.srt')
+        with open(raw_path, 'w', encoding='utf-8') as f:
+            f.write(srt_content)
+        del srt_content
+
+        # 每个用例使用全新的LLM缓存，保证每次都真正请求模拟服务
+        llm_cache._cache_instance = llm_cache.LLMCache(os.path.join(work_dir, f'{index}_llm_cache.sqlite3'))
+
+        # merge_segments_based_on_sentences 在调用线程中同步执行，按线程CPU时间计量对齐与合并的开销
+        merge_cpu = [0.0]
+        original_merge = split_main.merge_segments_based_on_sentences
+
+        def timed_merge(*args, **kwargs):
+            started = time.thread_time()
+            try:
+                return original_merge(*args, **kwargs)
+            finally:
+                merge_cpu[0] += time.thread_time() - started
+
+        result = {'minutes': minutes, 'words': word_count}
+        if options['tracemalloc']:
+            tracemalloc.start()
+        with mock.patch.object(split_main, 'merge_segments_based_on_sentences', timed_merge):
+            server.reset_stats()
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            segmentation = split_main.optimise_srt(raw_path, optimised_path, num_threads=options['threads'])
+            result['optimise'] = {
+                'wall_s': round(time.perf_counter() - started, 3),
+                'cpu_s': round(time.process_time() - cpu_started, 3),
+                'merge_cpu_s': round(merge_cpu[0], 3),
+                'local_chunks': (segmentation or {}).get('local_chunks', 0),
+                'llm_chunks': (segmentation or {}).get('llm_chunks', 0),
+                **self.server_stats(server),
+            }
+        if not options['skip_translate']:
+            server.reset_stats()
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            usage = split_main.translate_srt(
+                optimised_path, translated_path,
+                raw_lang='en', target_lang=options['target_lang'],
+                num_threads=options['threads'], incremental=False,
+            )
+            result['translate'] = {
+                'wall_s': round(time.perf_counter() - started, 3),
+                'cpu_s': round(time.process_time() - cpu_started, 3),
+                'batches': (usage or {}).get('batches', 0),
+                **self.server_stats(server),
+            }
+        if options['tracemalloc']:
+            result['peak_heap_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            tracemalloc.stop()
+        # ru_maxrss 是整个进程的峰值（Linux 上单位为KB），只会随用例增大
+        result['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        result['gateway'] = get_llm_gateway().stats().get(server.base_url, {})
+        return result
+
+    @staticmethod
+    def server_stats(server):
+        stats = server.stats()
+        return {
+            'llm_requests': stats['requests'],
+            'rate_limited': stats['rate_limited'],
+            'split_calls': stats['split_calls'],
+            'translate_calls': stats['translate_calls'],
+            'max_in_flight': stats['max_in_flight'],
+        }
+
+    def report(self, result):
+        self.stdout.write(f'\n{result["minutes"]:g} min, {result["words"]} words')
+        for stage in ('optimise', 'translate'):
+            if stage in result:
+                fields = ', '.join(f'{key}={value}' for key, value in result[stage].items())
+                self.stdout.write(f'  {stage:<9} {fields}')
+        memory = f'max_rss={result["max_rss_mb"]}MB'
+        if 'peak_heap_mb' in result:
+            memory += f', peak_heap={result["peak_heap_mb"]}MB'
+        self.stdout.write(f'  memory    {memory}')
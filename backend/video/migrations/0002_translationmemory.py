@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(help_text='规范化原文的sha256', max_length=64)),
+                ('source_text', models.TextField(help_text='规范化后的原文')),
+                ('source_length', models.IntegerField(help_text='规范化原文长度，近似匹配时按长度筛选候选')),
+                ('source_lang', models.CharField(max_length=5)),
+                ('target_lang', models.CharField(max_length=5)),
+                ('model', models.CharField(help_text='生成该译文的LLM模型', max_length=128)),
+                ('direct', models.TextField(blank=True, default='', help_text='直译')),
+                ('free', models.TextField(help_text='意译')),
+                ('hit_count', models.IntegerField(default=0, help_text='被精确命中的次数')),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'translation_memory',
+                'indexes': [models.Index(fields=['source_lang', 'target_lang', 'model', 'source_length'], name='translation_memory_len_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source_hash', 'source_lang', 'target_lang', 'model'), name='translation_memory_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0002_translationmemory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='相对 MEDIA_ROOT 的路径（不在其下时为绝对路径）', max_length=512, unique=True)),
+                ('file_size', models.BigIntegerField()),
+                ('file_mtime_ns', models.BigIntegerField(help_text='探测时文件的修改时间（纳秒）')),
+                ('container', models.CharField(blank=True, default='', help_text='ffprobe format_name', max_length=128)),
+                ('mime_type', models.CharField(blank=True, default='', help_text='带codecs参数的Content-Type', max_length=128)),
+                ('video_codec', models.CharField(blank=True, default='', max_length=32)),
+                ('audio_codec', models.CharField(blank=True, default='', max_length=32)),
+                ('duration', models.FloatField(blank=True, help_text='时长（秒）', null=True)),
+                ('width', models.IntegerField(blank=True, null=True)),
+                ('height', models.IntegerField(blank=True, null=True)),
+                ('bit_rate', models.BigIntegerField(blank=True, help_text='视频流比特率（bps）', null=True)),
+                ('format_bit_rate', models.BigIntegerField(blank=True, help_text='整个文件的比特率（bps）', null=True)),
+                ('probed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'media_metadata',
+            },
+        ),
+    ]
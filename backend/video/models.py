@@ -1,6 +1,6 @@
 from django.db import models
 from django.utils import timezone
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
 import os
@@ -169,6 +169,111 @@ class Video(models.Model):
         db_table = 'video'
 
 
+class TranslationMemory(models.Model):
+    """
+    跨视频翻译记忆：规范化原文 + 语言对 + 模型 -> 译文
+    同一合集中反复出现的片头、片尾、口播等句子可以直接复用已有译文
+    """
+    source_hash = models.CharField(max_length=64, help_text="规范化原文的sha256")
+    source_text = models.TextField(help_text="规范化后的原文")
+    source_length = models.IntegerField(help_text="规范化原文长度，近似匹配时按长度筛选候选")
+    source_lang = models.CharField(max_length=5)
+    target_lang = models.CharField(max_length=5)
+    model = models.CharField(max_length=128, help_text="生成该译文的LLM模型")
+    direct = models.TextField(blank=True, default="", help_text="直译")
+    free = models.TextField(help_text="意译")
+    hit_count = models.IntegerField(default=0, help_text="被精确命中的次数")
+    created_time = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'translation_memory'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_hash', 'source_lang', 'target_lang', 'model'],
+                name='translation_memory_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['source_lang', 'target_lang', 'model', 'source_length'], name='translation_memory_len_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source_text[:30]} ({self.source_lang}->{self.target_lang}, {self.model})"
+
+
+class MediaMetadata(models.Model):
+    """
+    媒体文件的 ffprobe 结果缓存，按文件路径存储
+    文件大小或修改时间变化时视为失效，下次访问时重新探测
+    """
+    path = models.CharField(max_length=512, unique=True, help_text="相对 MEDIA_ROOT 的路径（不在其下时为绝对路径）")
+    file_size = models.BigIntegerField()
+    file_mtime_ns = models.BigIntegerField(help_text="探测时文件的修改时间（纳秒）")
+    container = models.CharField(max_length=128, blank=True, default="", help_text="ffprobe format_name")
+    mime_type = models.CharField(max_length=128, blank=True, default="", help_text="带codecs参数的Content-Type")
+    video_codec = models.CharField(max_length=32, blank=True, default="")
+    audio_codec = models.CharField(max_length=32, blank=True, default="")
+    duration = models.FloatField(blank=True, null=True, help_text="时长（秒）")
+    width = models.IntegerField(blank=True, null=True)
+    height = models.IntegerField(blank=True, null=True)
+    bit_rate = models.BigIntegerField(blank=True, null=True, help_text="视频流比特率（bps）")
+    format_bit_rate = models.BigIntegerField(blank=True, null=True, help_text="整个文件的比特率（bps）")
+    probed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'media_metadata'
+
+    def __str__(self):
+        return f"{self.path} ({self.video_codec or '-'}/{self.audio_codec or '-'})"
+
+
+@receiver(post_save, sender=Video)
+def warm_media_metadata(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
+    """
+    新建Video时探测一次媒体元数据（编码、时长、分辨率等）并写入 MediaMetadata，
+    之后播放、导出等请求直接读取缓存，不再逐次运行ffprobe
+    """
+    if not created or not instance.url:
+        return
+    try:
+        from .services.audio_processing import get_media_path_info
+        from .services.media_metadata import warm
+        directory_name, _ = get_media_path_info(instance.url)
+        warm(os.path.join(settings.MEDIA_ROOT, directory_name, instance.url))
+    except Exception as e:
+        print(f"信号：探测媒体元数据失败 {instance.url}: {e}")
+
+
+@receiver(post_save, sender=Video)
+def queue_trickplay_sprites(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
+    """新建视频（非纯音频）时排队生成拖动预览雪碧图，播放器悬停预览无需再逐帧截图"""
+    if not created or not instance.url or not getattr(settings, 'TRICKPLAY_AT_INGEST', True):
+        return
+    try:
+        from .services.audio_processing import is_audio_file
+        from .tasks import queue_trickplay
+        if not is_audio_file(instance.url):
+            queue_trickplay(instance.pk)
+    except Exception as e:
+        print(f"信号：排队生成雪碧图失败 {instance.url}: {e}")
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Collection)
+def pregenerate_thumbnail_variants(sender, instance, created, update_fields=None, **kwargs):  # pylint: disable=unused-argument
+    """缩略图保存后在后台预生成常用宽度的 WebP 缩略图，媒体库首屏无需现场缩放"""
+    if not instance.thumbnail_url or not getattr(settings, 'THUMBNAIL_VARIANTS_AT_INGEST', True):
+        return
+    if update_fields is not None and 'thumbnail_url' not in update_fields:
+        return
+    try:
+        from .services.thumbnail_variants import pregenerate_async
+        pregenerate_async(instance.thumbnail_url)
+    except Exception as e:
+        print(f"信号：排队生成缩略图尺寸失败 {instance.thumbnail_url}: {e}")
+
+
 @receiver(pre_delete, sender=Video)  
 def delete_video_files(sender, instance, **kwargs):  # pylint: disable=unused-argument
     """
@@ -183,5 +288,7 @@ def delete_video_files(sender, instance, **kwargs):  # pylint: disable=unused-ar
             if os.path.exists(thumbnail_path):
                 os.remove(thumbnail_path)
                 print(f"信号：已删除缩略图 {instance.thumbnail_url}")
+            from .services.thumbnail_variants import remove_variants
+            remove_variants(instance.thumbnail_url)
         except Exception as e:
             print(f"信号：删除缩略图失败 {instance.thumbnail_url}: {e}")
@@ -0,0 +1,149 @@
+"""
+Adaptive bitrate (ABR) HLS packaging.
+
+One ffmpeg run decodes the source once, scales it to each rung of the ladder (settings.ABR_LADDER)
+and writes stream_video/<name>_abr/master.m3u8 with one media playlist per rendition:
+- rungs above the source resolution are skipped (no upscaling)
+- an H.264/HEVC source is reused as the top rendition by stream copy instead of being re-encoded
+  at its own size; other codecs (VP9, AV1, ...) are transcoded for every rung
+- an audio-only rendition lets players on very weak links keep the sound going
+The job runs at the lowest CPU priority with a bounded encoder thread count
+(settings.ABR_CPU_THREADS), so playback and other tasks keep the machine responsive.
+"""
+import os
+import shutil
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+
+from .audio_processing import is_hls_compatible, run_ffmpeg_with_progress
+from .hls_packaging import replace_stream, stream_dir
+from .media_metadata import get_media_info
+
+SEGMENT_SECONDS = 6
+MASTER_PLAYLIST = 'master.m3u8'
+ABR_SUFFIX = '_abr'
+
+
+@dataclass(frozen=True)
+class Rung:
+    name: str
+    height: Optional[int]           # None: the source rendition, stream-copied
+    video_bitrate: Optional[str]    # e.g. '2800k'; None when copied
+
+
+def parse_ladder(spec: str) -> List[Rung]:
+    """'1080:5000k,720:2800k,480:1400k' -> rungs, highest first"""
+    rungs = []
+    for item in (spec or '').split(','):
+        height, _, bitrate = item.strip().partition(':')
+        if not height.strip().isdigit() or not bitrate.strip():
+            continue
+        rungs.append(Rung(f'{int(height)}p', int(height), bitrate.strip()))
+    return sorted(rungs, key=lambda r: r.height, reverse=True)
+
+
+def plan_ladder(source_height: Optional[int], reuse_source: bool, ladder: List[Rung]) -> List[Rung]:
+    """Renditions to produce for a source of `source_height` pixels"""
+    if reuse_source:
+        # the copied source covers its own resolution; only strictly smaller rungs are encoded
+        return [Rung('source', None, None)] + [r for r in ladder if source_height and r.height < source_height]
+    rungs = [r for r in ladder if not source_height or r.height <= source_height]
+    if not rungs and ladder:
+        # smaller than every rung: one rendition at the source size with the lowest bitrate
+        rungs = [Rung(f'{source_height}p', source_height, ladder[-1].video_bitrate)]
+    return rungs
+
+
+def _cpu_threads() -> int:
+    threads = int(getattr(settings, 'ABR_CPU_THREADS', 0) or 0)
+    return threads if threads > 0 else max(1, (os.cpu_count() or 2) // 2)
+
+
+def build_command(video_path: str, out: str, rungs: List[Rung], has_audio: bool,
+                  copy_audio: bool, audio_only: bool) -> List[str]:
+    audio_bitrate = getattr(settings, 'ABR_AUDIO_BITRATE', '128k')
+    encoded = [r for r in rungs if r.height is not None]
+
+    cmd = ['ffmpeg', '-v', 'error', '-nostats', '-progress', 'pipe:1', '-y',
+           '-threads', str(_cpu_threads()), '-i', video_path]
+    if encoded:
+        labels = ''.join(f'[s{i}]' for i in range(len(encoded)))
+        graph = [f'[0:v:0]split={len(encoded)}{labels}']
+        graph += [f'[s{i}]scale=-2:{r.height}[v{i}]' for i, r in enumerate(encoded)]
+        cmd += ['-filter_complex', ';'.join(graph), '-filter_complex_threads', str(_cpu_threads())]
+
+    stream_map = []
+    audio_index = 0
+    for index, rung in enumerate(rungs):
+        if rung.height is None:
+            cmd += ['-map', '0:v:0', f'-c:v:{index}', 'copy']
+        else:
+            bitrate = int(rung.video_bitrate.rstrip('kK'))
+            cmd += ['-map', f'[v{encoded.index(rung)}]', f'-c:v:{index}', 'libx264',
+                    f'-b:v:{index}', rung.video_bitrate,
+                    f'-maxrate:v:{index}', f'{int(bitrate * 1.1)}k',
+                    f'-bufsize:v:{index}', f'{bitrate * 2}k']
+        entry = f'v:{index}'
+        if has_audio:
+            if rung.height is None and copy_audio:
+                cmd += ['-map', '0:a:0', f'-c:a:{audio_index}', 'copy']
+            else:
+                cmd += ['-map', '0:a:0', f'-c:a:{audio_index}', 'aac', f'-b:a:{audio_index}', audio_bitrate]
+            entry += f',a:{audio_index}'
+            audio_index += 1
+        stream_map.append(f'{entry},name:{rung.name}')
+    if has_audio and audio_only:
+        cmd += ['-map', '0:a:0', f'-c:a:{audio_index}', 'aac', f'-b:a:{audio_index}', audio_bitrate]
+        stream_map.append(f'a:{audio_index},name:audio')
+
+    if encoded:
+        # keyframes on the segment grid, so encoded renditions switch cleanly
+        cmd += ['-threads', str(_cpu_threads()), '-preset', 'veryfast', '-sc_threshold', '0',
+                '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})']
+    cmd += ['-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(out, '%v', 'seg%d.ts'),
+            '-master_pl_name', MASTER_PLAYLIST,
+            '-var_stream_map', ' '.join(stream_map),
+            os.path.join(out, '%v', 'index.m3u8')]
+    return cmd
+
+
+def package_abr(video_path: str, progress=None) -> tuple[bool, str, str]:
+    """
+    Produce the ABR ladder for `video_path`.
+    Returns: (success, error_or_empty, master playlist path relative to MEDIA_ROOT)
+    """
+    if not os.path.exists(video_path):
+        return False, 'not found', ''
+    info = get_media_info(video_path)
+    if info is None or not info.has_video:
+        return False, f'could not probe a video stream in {video_path}', ''
+
+    reuse_source, _ = is_hls_compatible(video_path)
+    rungs = plan_ladder(info.height, reuse_source, parse_ladder(getattr(settings, 'ABR_LADDER', '')))
+    if not rungs:
+        return False, 'empty ABR ladder', ''
+
+    name = f'{os.path.splitext(os.path.basename(video_path))[0]}{ABR_SUFFIX}'
+    out = f'{stream_dir(name)}.partial'
+    shutil.rmtree(out, ignore_errors=True)
+    for rung in rungs:
+        os.makedirs(os.path.join(out, rung.name), exist_ok=True)
+    audio_only = bool(getattr(settings, 'ABR_AUDIO_ONLY', True))
+    if info.has_audio and audio_only:
+        os.makedirs(os.path.join(out, 'audio'), exist_ok=True)
+
+    cmd = build_command(video_path, out, rungs, info.has_audio,
+                        copy_audio=info.audio_codec == 'aac', audio_only=audio_only)
+    try:
+        returncode, error = run_ffmpeg_with_progress(cmd, info.duration, progress, low_priority=True)
+        if returncode == 0 and os.path.exists(os.path.join(out, MASTER_PLAYLIST)):
+            replace_stream(name, out)
+            return True, '', f'stream_video/{name}/{MASTER_PLAYLIST}'
+        shutil.rmtree(out, ignore_errors=True)
+        return False, error, ''
+    except Exception as e:
+        shutil.rmtree(out, ignore_errors=True)
+        return False, str(e), ''
@@ -2,13 +2,15 @@
 Standalone audio and media processing utilities (FFmpeg/ffprobe wrappers, extraction, format checks).
 """
 import os
-import json
+import shutil
 import subprocess
+import tempfile
 from pathlib import Path
 
 from django.conf import settings
 
 from ..models import Video
+from .media_metadata import get_media_info
 
 
 def is_audio_file(filename: str) -> bool:
@@ -46,25 +48,16 @@ def detect_video_audio_format(video_path: str) -> str:
     Detect the original audio codec in a video file and map to extension
     Raises RuntimeError if no audio stream is found
     """
-    cmd = [
-        'ffprobe', '-v', 'quiet', '-print_format', 'json',
-        '-show_streams', '-select_streams', 'a:0', video_path
-    ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            streams = data.get('streams') or []
-            if streams:
-                codec = streams[0].get('codec_name', '')
-                mapping = {
-                    'opus': 'opus', 'aac': 'aac', 'mp3': 'mp3',
-                    'vorbis': 'ogg', 'flac': 'flac', 'pcm_s16le': 'wav',
-                    'ac-3': 'ac3', 'eac3': 'eac3'
-                }
-                return mapping.get(codec, 'aac')
-    except Exception as e:
-        raise RuntimeError(f"Failed to detect audio format: {str(e)}")
+    info = get_media_info(video_path)
+    if info is None:
+        raise RuntimeError(f"Failed to detect audio format: could not probe {video_path}")
+    if info.has_audio:
+        mapping = {
+            'opus': 'opus', 'aac': 'aac', 'mp3': 'mp3',
+            'vorbis': 'ogg', 'flac': 'flac', 'pcm_s16le': 'wav',
+            'ac-3': 'ac3', 'eac3': 'eac3'
+        }
+        return mapping.get(info.audio_codec, 'aac')
     raise RuntimeError("No audio stream found in video file")
 
 
@@ -148,50 +141,75 @@ def is_hls_compatible(video_path: str) -> tuple[bool, str]:
     Check if a video file is HLS-compatible (H264/H265 + AAC/MP3/AC3).
     Returns: (ok, message)
     """
-    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', video_path]
-    try:
-        res = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        if res.returncode != 0:
-            return False, res.stderr
-        info = json.loads(res.stdout)
-        vcodec = acodec = None
-        for s in info.get('streams', []):
-            if s.get('codec_type') == 'video' and not vcodec:
-                vcodec = s.get('codec_name')
-            if s.get('codec_type') == 'audio' and not acodec:
-                acodec = s.get('codec_name')
-        okv = vcodec in ('h264','hevc','h265')
-        oka = not acodec or acodec in ('aac','mp3','ac3')
-        if not okv: return False, f"video: {vcodec}"
-        if not oka: return False, f"audio: {acodec}"
-        return True, 'ok'
-    except Exception as e:
-        return False, str(e)
-
-
-def extract_hls_from_video_file(video_path: str) -> tuple[bool, str, str]:
+    info = get_media_info(video_path)
+    if info is None:
+        return False, f"could not probe {video_path}"
+    vcodec = info.video_codec or None
+    acodec = info.audio_codec or None
+    okv = vcodec in ('h264','hevc','h265')
+    oka = not acodec or acodec in ('aac','mp3','ac3')
+    if not okv: return False, f"video: {vcodec}"
+    if not oka: return False, f"audio: {acodec}"
+    return True, 'ok'
+
+
+def run_ffmpeg_with_progress(cmd: list, duration, progress=None, low_priority: bool = False) -> tuple[int, str]:
+    """
+    Run an ffmpeg command that includes '-progress pipe:1' and report the percentage done.
+    duration: length of the input in seconds (None: no progress reports).
+    low_priority: run it under `nice -n 19` (POSIX, when nice is available), so background
+    encoders yield the CPU; the priority is set before ffmpeg starts any thread.
+    Returns: (returncode, stderr)
+    """
+    if low_priority and os.name == 'posix' and shutil.which('nice'):
+        cmd = ['nice', '-n', '19', *cmd]
+    with tempfile.TemporaryFile(mode='w+') as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        # out_time_us and out_time_ms are both in microseconds
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if progress and duration and key in ('out_time_us', 'out_time_ms') and value.isdigit():
+                progress(min(99, int(int(value) / 1e6 / duration * 100)))
+        process.wait()
+        stderr.seek(0)
+        return process.returncode, stderr.read()
+
+
+def extract_hls_from_video_file(video_path: str, progress=None) -> tuple[bool, str, str]:
     """
     Generate HLS segments and playlist for a compatible video file.
+    Runs in the HLS background task; the output is written to a temporary directory and
+    swapped in at the end, so a lazy stream of the same video keeps playing meanwhile.
+    progress: optional callable receiving a percentage (0-100) parsed from ffmpeg -progress.
     Returns: (success, error_or_empty, rel_dir)
     """
+    from .hls_packaging import replace_stream, stream_dir
+
     if not os.path.exists(video_path):
         return False, 'not found', ''
     name = Path(video_path).stem
     ok, msg = is_hls_compatible(video_path)
     if not ok:
         return False, msg, ''
-    out = os.path.join(settings.MEDIA_ROOT, 'stream_video', name)
+    info = get_media_info(video_path)
+    duration = info.duration if info else None
+    out = f"{stream_dir(name)}.partial"
+    shutil.rmtree(out, ignore_errors=True)
     os.makedirs(out, exist_ok=True)
     playlist = os.path.join(out, 'index.m3u8')
-    cmd = ['ffmpeg', '-i', video_path, '-c:v', 'copy', '-c:a', 'copy',
+    cmd = ['ffmpeg', '-v', 'error', '-nostats', '-progress', 'pipe:1', '-i', video_path,
+           '-c:v', 'copy', '-c:a', 'copy',
            '-hls_time', '10', '-hls_list_size', '0', '-hls_segment_filename',
            os.path.join(out, 'seg%d.ts'), playlist]
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if res.returncode == 0 and os.path.exists(playlist):
+        returncode, error = run_ffmpeg_with_progress(cmd, duration, progress)
+        if returncode == 0 and os.path.exists(playlist):
+            replace_stream(name, out)
             return True, '', f"stream_video/{name}"
-        return False, res.stderr, ''
+        shutil.rmtree(out, ignore_errors=True)
+        return False, error, ''
     except Exception as e:
+        shutil.rmtree(out, ignore_errors=True)
         return False, str(e), ''
 
 def get_video_file_paths(video_id: int) -> tuple[Video, str, str]:
@@ -0,0 +1,311 @@
+"""
+On-demand HLS packaging.
+
+A lazy stream needs no upfront transcode or remux:
+- create_lazy_stream() probes keyframe positions (one seek per segment, not a full read) and
+  writes index.m3u8 plus a segments.json manifest right away
+- ensure_segment() cuts lazy<N>.ts with a stream copy between two keyframes on first request,
+  and prefetches the next few segments in the background
+- generated segments form a cache with LRU eviction under settings.HLS_SEGMENT_CACHE_MB;
+  an evicted segment is simply regenerated on its next request
+
+Full packaging (every segment written by one ffmpeg run) is extract_hls_from_video_file,
+run as a queued background task (tasks.package_hls_video).
+"""
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from .media_metadata import get_media_info
+
+SEGMENT_SECONDS = 6         # target segment length; segments start on keyframes
+PREFETCH_SEGMENTS = 2       # segments generated ahead of the one requested
+PROBE_TIMEOUT = 120         # seconds, keyframe probe
+SEGMENT_TIMEOUT = 120       # seconds, one segment
+
+MANIFEST_NAME = 'segments.json'
+PLAYLIST_NAME = 'index.m3u8'
+
+# Lazy segments have their own names: a full packaging that later replaces the stream cuts
+# at different points, and its seg<N>.ts must not be confused with a cached lazy<N>.ts
+_SEGMENT_RE = re.compile(r'^lazy(\d+)\.ts$')
+
+_lock = threading.Lock()
+_segment_locks: Dict[str, list] = {}             # segment path -> [lock, holders and waiters]
+_cache: "OrderedDict[str, int]" = OrderedDict()   # segment path -> size, least recently used first
+_cache_bytes = 0
+_cache_loaded = False
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hls-prefetch")
+
+
+def stream_dir(name: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, 'stream_video', name)
+
+
+def _quota_bytes() -> int:
+    return int(getattr(settings, 'HLS_SEGMENT_CACHE_MB', 2048)) * 1024 * 1024
+
+
+def probe_keyframes(video_path: str, duration: float, step: float = SEGMENT_SECONDS) -> List[float]:
+    """
+    Keyframe times near every `step` seconds
+    ffprobe seeks to each nominal boundary and reads a single packet: seeking lands on the
+    keyframe at or before that time, so the cost is one index lookup per segment
+    """
+    points = [i * step for i in range(int(duration // step) + 1)]
+    intervals = ','.join(f'{t:.3f}%+#1' for t in points)
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-read_intervals', intervals,
+           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or 'ffprobe failed')
+    keyframes = set()
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        if 'K' not in flags:
+            continue
+        try:
+            keyframes.add(round(float(pts), 3))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+
+def segment_boundaries(keyframes: List[float], duration: float, step: float = SEGMENT_SECONDS) -> List[float]:
+    """Segment start times: keyframes at least step/2 apart, followed by the end of the file"""
+    starts: List[float] = []
+    for t in keyframes:
+        if t >= duration:
+            break
+        if not starts or t - starts[-1] >= step / 2:
+            starts.append(t)
+    if not starts:
+        starts = [0.0]
+    if duration - starts[-1] < step / 4 and len(starts) > 1:
+        starts.pop()   # avoid a sliver at the end
+    return starts + [duration]
+
+
+def write_playlist(path: str, boundaries: List[float]) -> None:
+    durations = [end - start for start, end in zip(boundaries, boundaries[1:])]
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{math.ceil(max(durations))}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    for index, duration in enumerate(durations):
+        lines.append(f'#EXTINF:{duration:.3f},')
+        lines.append(f'lazy{index}.ts')
+    lines.append('#EXT-X-ENDLIST')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def create_lazy_stream(video_path: str) -> str:
+    """
+    Write the playlist and manifest for `video_path`; segments are produced on request
+    Returns the stream directory relative to MEDIA_ROOT
+    """
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    out = stream_dir(name)
+    if os.path.exists(os.path.join(out, PLAYLIST_NAME)):
+        return f'stream_video/{name}'
+
+    info = get_media_info(video_path)
+    if info is None or not info.duration:
+        raise RuntimeError(f'could not probe {video_path}')
+    boundaries = segment_boundaries(probe_keyframes(video_path, info.duration), info.duration)
+
+    os.makedirs(out, exist_ok=True)
+    manifest = {
+        'source': os.path.relpath(video_path, settings.MEDIA_ROOT),
+        'boundaries': boundaries,
+    }
+    with open(os.path.join(out, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    write_playlist(os.path.join(out, PLAYLIST_NAME), boundaries)
+    return f'stream_video/{name}'
+
+
+def _load_manifest(hls_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(hls_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_cache() -> None:
+    """Index the segments already on disk, oldest first (called once, under _lock)"""
+    global _cache_bytes, _cache_loaded
+    root = os.path.join(settings.MEDIA_ROOT, 'stream_video')
+    found = []
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            hls_dir = os.path.join(root, name)
+            if not os.path.exists(os.path.join(hls_dir, MANIFEST_NAME)):
+                continue   # fully packaged streams are not part of the cache
+            for filename in os.listdir(hls_dir):
+                if _SEGMENT_RE.match(filename):
+                    path = os.path.join(hls_dir, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, path, stat.st_size))
+    for _, path, size in sorted(found):
+        _cache[path] = size
+        _cache_bytes += size
+    _cache_loaded = True
+
+
+def _touch(path: str, size: Optional[int] = None) -> None:
+    """Mark a segment as recently used (and add it if new), then evict down to the quota"""
+    global _cache_bytes
+    evicted = []
+    with _lock:
+        if not _cache_loaded:
+            _load_cache()
+        if path in _cache:
+            _cache.move_to_end(path)
+        elif size is not None:
+            _cache[path] = size
+            _cache_bytes += size
+        quota = _quota_bytes()
+        while _cache_bytes > quota and len(_cache) > 1:
+            old_path, old_size = _cache.popitem(last=False)
+            _cache_bytes -= old_size
+            evicted.append(old_path)
+    for old_path in evicted:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+
+
+def _forget_dir(hls_dir: str) -> None:
+    global _cache_bytes
+    prefix = os.path.join(hls_dir, '')
+    with _lock:
+        for path in [p for p in _cache if p.startswith(prefix)]:
+            _cache_bytes -= _cache.pop(path)
+
+
+@contextmanager
+def _segment_lock(path: str):
+    """Serialize builds of one segment; the entry is dropped once nobody holds or waits for it"""
+    with _lock:
+        entry = _segment_locks.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _segment_locks[path]
+
+
+def _generate_segment(source: str, start: float, end: float, path: str) -> None:
+    """Stream-copy [start, end) into an MPEG-TS segment, keeping the source timestamps"""
+    tmp_path = f'{path}.part'
+    cmd = ['ffmpeg', '-v', 'error', '-y',
+           '-ss', f'{start:.3f}', '-i', source, '-t', f'{end - start:.3f}',
+           '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy', '-copyts',
+           '-f', 'mpegts', tmp_path]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=SEGMENT_TIMEOUT)
+    if result.returncode != 0 or not os.path.exists(tmp_path):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise RuntimeError(result.stderr.strip() or 'ffmpeg failed')
+    os.replace(tmp_path, path)
+
+
+def _build_segment(hls_dir: str, manifest: dict, index: int) -> bool:
+    boundaries = manifest['boundaries']
+    if index < 0 or index >= len(boundaries) - 1:
+        return False
+    path = os.path.join(hls_dir, f'lazy{index}.ts')
+    with _segment_lock(path):
+        if os.path.exists(path):
+            return True
+        source = os.path.join(settings.MEDIA_ROOT, manifest['source'])
+        _generate_segment(source, boundaries[index], boundaries[index + 1], path)
+    _touch(path, os.path.getsize(path))
+    return True
+
+
+def _prefetch(hls_dir: str, manifest: dict, index: int) -> None:
+    try:
+        _build_segment(hls_dir, manifest, index)
+    except Exception as e:
+        print(f"[hls] Prefetch of segment {index} in {hls_dir} failed: {e}")
+
+
+def ensure_segment(hls_dir: str, relpath: str) -> None:
+    """
+    Make sure a requested segment of a lazy stream exists; no-op for fully packaged streams
+    Errors propagate to the view (the segment then answers 404)
+    """
+    match = _SEGMENT_RE.match(relpath)
+    if not match:
+        return
+    manifest = _load_manifest(hls_dir)
+    if manifest is None:
+        return
+    index = int(match.group(1))
+    path = os.path.join(hls_dir, relpath)
+    if os.path.exists(path):
+        _touch(path)
+    elif not _build_segment(hls_dir, manifest, index):
+        return
+    for ahead in range(index + 1, index + 1 + PREFETCH_SEGMENTS):
+        if ahead < len(manifest['boundaries']) - 1 and \
+                not os.path.exists(os.path.join(hls_dir, f'lazy{ahead}.ts')):
+            _prefetch_pool.submit(_prefetch, hls_dir, manifest, ahead)
+
+
+def replace_stream(name: str, packaged_dir: str) -> None:
+    """Swap a fully packaged directory in place of the current stream (lazy or not)"""
+    out = stream_dir(name)
+    old = f'{out}.old'
+    if os.path.exists(out):
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(out, old)
+        _forget_dir(out)
+    os.replace(packaged_dir, out)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def remove_stream(name: str) -> bool:
+    """Delete the stream directory of a video; True if something was removed"""
+    out = stream_dir(name)
+    if not os.path.isdir(out):
+        return False
+    _forget_dir(out)
+    shutil.rmtree(out, ignore_errors=True)
+    return True
+
+
+def cache_stats() -> dict:
+    with _lock:
+        if not _cache_loaded:
+            _load_cache()
+        return {'segments': len(_cache), 'bytes': _cache_bytes, 'quota_bytes': _quota_bytes()}
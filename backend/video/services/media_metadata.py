@@ -0,0 +1,217 @@
+"""
+Persistent media metadata cache backed by the MediaMetadata table.
+
+One ffprobe call per file version (size + mtime) fills in codecs, container MIME type, duration,
+dimensions and bitrates:
+- an in-process LRU answers repeated lookups (every Range request while seeking) with a single os.stat
+- the table keeps the result across restarts; it is filled at ingest via warm()
+- a changed size or mtime invalidates the entry, so files replaced in place (conversion) are re-probed
+"""
+import json
+import mimetypes
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+from ..models import MediaMetadata
+
+PROBE_TIMEOUT = 30      # seconds
+MEMORY_ENTRIES = 1024   # files kept in the in-process LRU
+
+_AV1_CODECS = 'codecs="av01.0.08M.08"'
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, Tuple[int, int, Optional[MediaInfo]]]" = OrderedDict()
+_stats = {"memory_hits": 0, "db_hits": 0, "probes": 0, "probe_failures": 0}
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    container: str = ""
+    mime_type: str = ""
+    video_codec: str = ""
+    audio_codec: str = ""
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    bit_rate: Optional[int] = None          # video stream, bps
+    format_bit_rate: Optional[int] = None   # whole file, bps
+
+    @property
+    def has_video(self) -> bool:
+        return bool(self.video_codec)
+
+    @property
+    def has_audio(self) -> bool:
+        return bool(self.audio_codec)
+
+
+_INFO_FIELDS = [f.name for f in fields(MediaInfo)]
+
+
+def guess_mime_type(path: str) -> str:
+    content_type, _ = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+
+def video_mime_type(path: str, video_codec: str) -> str:
+    """Content-Type with a codecs parameter the browser can use to pick a decoder"""
+    base_mime_type, _ = mimetypes.guess_type(path)
+    if video_codec == 'av1':
+        if base_mime_type in ('video/mp4', 'video/webm'):
+            return f'{base_mime_type}; {_AV1_CODECS}'
+        return f'{base_mime_type or "video/mp4"}; {_AV1_CODECS}'
+    if video_codec == 'h264':
+        if base_mime_type == 'video/mp4':
+            return 'video/mp4; codecs="avc1.42E01E, mp4a.40.2"'
+        return base_mime_type or 'video/mp4'
+    if video_codec == 'hevc':
+        if base_mime_type == 'video/mp4':
+            # Generic HEVC codec string for better browser compatibility
+            return 'video/mp4; codecs="hvc1"'
+        return base_mime_type or 'video/mp4'
+    if video_codec == 'vp9':
+        return 'video/webm; codecs="vp9"'
+    if video_codec == 'vp8':
+        return 'video/webm; codecs="vp8"'
+    return base_mime_type or 'application/octet-stream'
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float_or_none(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_media(path: str) -> Optional[MediaInfo]:
+    """Run ffprobe once for streams and format; None if ffprobe is missing or fails"""
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', '-show_format', path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        if result.returncode != 0:
+            return None
+        data = json.loads(result.stdout or '{}')
+    except (subprocess.TimeoutExpired, OSError, ValueError):
+        return None
+
+    video = audio = None
+    for stream in data.get('streams') or []:
+        if stream.get('codec_type') == 'video' and video is None \
+                and not (stream.get('disposition') or {}).get('attached_pic'):
+            video = stream
+        elif stream.get('codec_type') == 'audio' and audio is None:
+            audio = stream
+    fmt = data.get('format') or {}
+    video_codec = (video or {}).get('codec_name', '')
+    return MediaInfo(
+        container=fmt.get('format_name', ''),
+        mime_type=video_mime_type(path, video_codec) if video_codec else guess_mime_type(path),
+        video_codec=video_codec,
+        audio_codec=(audio or {}).get('codec_name', ''),
+        duration=_float_or_none(fmt.get('duration')),
+        width=_int_or_none((video or {}).get('width')),
+        height=_int_or_none((video or {}).get('height')),
+        bit_rate=_int_or_none((video or {}).get('bit_rate')),
+        format_bit_rate=_int_or_none(fmt.get('bit_rate')),
+    )
+
+
+def _key(path: str) -> str:
+    """Store paths relative to MEDIA_ROOT so the table survives moving the media directory"""
+    path = os.path.abspath(path)
+    media_root = os.path.abspath(str(settings.MEDIA_ROOT))
+    if path.startswith(media_root + os.sep):
+        return os.path.relpath(path, media_root)
+    return path
+
+
+def _remember(key: str, size: int, mtime_ns: int, info: Optional[MediaInfo]) -> None:
+    with _lock:
+        _memory[key] = (size, mtime_ns, info)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _count(field: str) -> None:
+    with _lock:
+        _stats[field] += 1
+
+
+def get_media_info(path: str) -> Optional[MediaInfo]:
+    """
+    Metadata for the current version of the file; None if it is missing or cannot be probed.
+    A failed probe is remembered in memory for that file version, so a missing ffprobe
+    does not cost a subprocess on every request.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = _key(path)
+    size, mtime_ns = stat.st_size, stat.st_mtime_ns
+
+    with _lock:
+        cached = _memory.get(key)
+        if cached is not None and cached[:2] == (size, mtime_ns):
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return cached[2]
+
+    try:
+        row = MediaMetadata.objects.filter(path=key, file_size=size, file_mtime_ns=mtime_ns).first()
+    except Exception:
+        row = None  # table not migrated yet; still usable as an in-memory cache
+    if row is not None:
+        info = MediaInfo(**{name: getattr(row, name) for name in _INFO_FIELDS})
+        _count("db_hits")
+        _remember(key, size, mtime_ns, info)
+        return info
+
+    info = probe_media(path)
+    _count("probes" if info is not None else "probe_failures")
+    _remember(key, size, mtime_ns, info)
+    if info is not None:
+        try:
+            MediaMetadata.objects.update_or_create(
+                path=key,
+                defaults={"file_size": size, "file_mtime_ns": mtime_ns,
+                          **{name: getattr(info, name) for name in _INFO_FIELDS}},
+            )
+        except Exception as e:
+            print(f"[media_metadata] Failed to store metadata for {key}: {e}")
+    return info
+
+
+def warm(path: str) -> Optional[MediaInfo]:
+    """Probe at ingest so the first playback request does not pay for ffprobe"""
+    return get_media_info(path)
+
+
+def invalidate(path: str) -> None:
+    """Forget the cached metadata for a file (e.g. when it is deleted)"""
+    key = _key(path)
+    with _lock:
+        _memory.pop(key, None)
+    try:
+        MediaMetadata.objects.filter(path=key).delete()
+    except Exception:
+        pass
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "memory_entries": len(_memory)}
@@ -0,0 +1,192 @@
+"""
+Resized thumbnail renditions.
+
+Library pages show thumbnails at card size, but thumbnail/<name> is the full picture (a 480px
+frame grab, or a downloaded cover of up to 1280px). Variants are smaller WebP/JPEG copies in
+width buckets (settings.THUMBNAIL_VARIANT_WIDTHS):
+- stored as media/thumbnail/<width>/<source name>.<version>.<webp|jpg>, where <version> is a
+  short hash of the source bytes; a replaced thumbnail gets new variant names, so variants
+  never change under a name and are served as immutable
+- generated with Pillow on first request (serve_img), and the WebP set is pre-generated in the
+  background when a video or collection is saved with a thumbnail
+- never upscaled: a bucket wider than the source holds a re-encode at the source size
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from PIL import Image
+
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+DEFAULT_FORMAT = 'webp'
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+VERSION_LENGTH = 8
+
+# <width>/<source name>.<version>.<format>
+VARIANT_RE = re.compile(r'^(\d+)/([^/]+)\.([0-9a-f]{%d})\.(webp|jpg)$' % VERSION_LENGTH)
+
+_lock = threading.Lock()
+_versions: "OrderedDict[str, tuple]" = OrderedDict()   # source path -> (size, mtime_ns, version)
+_VERSIONS_MAX = 4096
+_pregenerate_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumb-variants")
+
+
+def thumbnail_root() -> str:
+    return os.path.join(settings.MEDIA_ROOT, 'thumbnail')
+
+
+def variant_widths() -> List[int]:
+    spec = getattr(settings, 'THUMBNAIL_VARIANT_WIDTHS', '160,320,480,640')
+    return sorted({int(w) for w in str(spec).split(',') if w.strip().isdigit() and int(w) > 0})
+
+
+def source_version(source: str) -> Optional[str]:
+    """Short hash of the thumbnail bytes, computed once per file version; None if missing"""
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _versions.get(source)
+        if cached is not None and cached[:2] == key:
+            _versions.move_to_end(source)
+            return cached[2]
+    with open(source, 'rb') as f:
+        version = hashlib.md5(f.read()).hexdigest()[:VERSION_LENGTH]
+    with _lock:
+        _versions[source] = key + (version,)
+        _versions.move_to_end(source)
+        while len(_versions) > _VERSIONS_MAX:
+            _versions.popitem(last=False)
+    return version
+
+
+def variant_name(filename: str, width: int, version: str, fmt: str = DEFAULT_FORMAT) -> str:
+    return f'{width}/{filename}.{version}.{fmt}'
+
+
+def variant_urls(filename: Optional[str], fmt: str = DEFAULT_FORMAT) -> Dict[str, str]:
+    """
+    {width: "img/<variant>"} for a thumbnail file name, for the library JSON
+    The other format is the same name with the other extension (.jpg for clients without WebP)
+    """
+    if not filename or '/' in filename:
+        return {}
+    version = source_version(os.path.join(thumbnail_root(), filename))
+    if version is None:
+        return {}
+    return {str(w): f'img/{variant_name(filename, w, version, fmt)}' for w in variant_widths()}
+
+
+def _encode(source: str, path: str, width: int, fmt: str) -> None:
+    with Image.open(source) as image:
+        # JPEG sources decode straight at a reduced scale (DCT scaling) instead of full size
+        image.draft('RGB', (width, max(1, width * image.height // max(1, image.width))))
+        image.thumbnail((width, image.height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if fmt == 'webp':
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            options = {'quality': WEBP_QUALITY, 'method': 4}
+        else:
+            image = image.convert('RGB')
+            options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            image.save(tmp_path, FORMATS[fmt], **options)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+def _remove_other_versions(directory: str, filename: str, version: str) -> None:
+    """Drop the variants of earlier versions of the thumbnail (every format)"""
+    prefix, current = f'{filename}.', f'{filename}.{version}.'
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and not name.startswith(current) and not name.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def ensure_variant(filename: str, width: int, fmt: str = DEFAULT_FORMAT) -> Optional[str]:
+    """
+    Absolute path of the current variant of thumbnail `filename`, generating it if needed
+    Returns None when the source is missing or the width/format is not offered
+    """
+    if fmt not in FORMATS or width not in variant_widths() or not filename or '/' in filename:
+        return None
+    source = os.path.join(thumbnail_root(), filename)
+    version = source_version(source)
+    if version is None:
+        return None
+    directory = os.path.join(thumbnail_root(), str(width))
+    path = os.path.join(thumbnail_root(), variant_name(filename, width, version, fmt))
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    _encode(source, path, width, fmt)
+    _remove_other_versions(directory, filename, version)
+    return path
+
+
+def resolve_variant(relpath: str) -> Optional[tuple[str, str]]:
+    """
+    For a request path "<width>/<name>.<version>.<fmt>": (absolute path, current relpath)
+    The current relpath differs from the requested one when the thumbnail has been replaced
+    since the client got the URL. None if `relpath` is not a variant name or has no source.
+    """
+    match = VARIANT_RE.match(relpath)
+    if not match:
+        return None
+    width, filename, _, fmt = match.groups()
+    path = ensure_variant(filename, int(width), fmt)
+    if path is None:
+        return None
+    return path, os.path.relpath(path, thumbnail_root()).replace(os.sep, '/')
+
+
+def pregenerate(filename: Optional[str], fmt: str = DEFAULT_FORMAT) -> None:
+    for width in variant_widths():
+        try:
+            ensure_variant(filename, width, fmt)
+        except Exception as e:
+            print(f"[thumbnail] Variant {width}px of {filename} failed: {e}")
+            return
+
+
+def pregenerate_async(filename: Optional[str]) -> None:
+    """Queue the default-format variants of a thumbnail on a background thread"""
+    if filename and '/' not in filename:
+        _pregenerate_pool.submit(pregenerate, filename)
+
+
+def remove_variants(filename: Optional[str]) -> None:
+    """Delete every variant (all widths, formats and versions) of a thumbnail"""
+    if not filename:
+        return
+    root = thumbnail_root()
+    prefix = f'{filename}.'
+    for width in os.listdir(root) if os.path.isdir(root) else []:
+        directory = os.path.join(root, width)
+        if not width.isdigit() or not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+    with _lock:
+        _versions.pop(os.path.join(root, filename), None)
@@ -0,0 +1,203 @@
+"""
+Cross-video translation memory backed by the TranslationMemory table.
+
+Entries are keyed by normalized source text + language pair + model:
+- exact matches are reused directly, so the cue never reaches the LLM
+- close matches (same language pair and model, similar length) are returned as hints for the prompt
+- completed translate_srt runs write their cues back, so intros, outros and sponsor reads
+  repeated across a collection are translated once
+"""
+import difflib
+import hashlib
+import heapq
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from ..models import TranslationMemory
+
+MIN_MEMORY_CHARS = 12          # shorter cues ("Yes.", "Okay") depend too much on context to reuse
+NEAR_MATCH_THRESHOLD = 0.85    # minimum similarity for a hint
+NEAR_MATCH_CANDIDATES = 50     # candidates scored per cue, most-used first
+LENGTH_TOLERANCE = 0.15        # candidate length window around the cue length
+QUERY_CHUNK = 500              # keep IN (...) clauses below SQLite's variable limit
+
+_SPACE_RE = re.compile(r'\s+')
+
+_stats_lock = threading.Lock()
+_stats = {"lookups": 0, "exact_hits": 0, "near_hits": 0, "stored": 0}
+
+
+def normalize_source(text: str) -> str:
+    """Case-fold and collapse whitespace so trivial differences still hit the same entry"""
+    return _SPACE_RE.sub(' ', text or '').strip().casefold()
+
+
+def source_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _count(field: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[field] += amount
+
+
+def lookup_exact(texts: Dict[int, str], source_lang: str, target_lang: str, model: str) -> Dict[int, Tuple[str, str]]:
+    """
+    Find exact matches for the given cues
+    texts: {cue index: source text}
+    Returns: {cue index: (direct, free)}
+    """
+    keys: Dict[str, List[int]] = {}
+    for idx, text in texts.items():
+        normalized = normalize_source(text)
+        if len(normalized) >= MIN_MEMORY_CHARS:
+            keys.setdefault(source_hash(normalized), []).append(idx)
+    _count("lookups", len(texts))
+    if not keys:
+        return {}
+
+    found: Dict[int, Tuple[str, str]] = {}
+    matched_ids = []
+    hashes = list(keys)
+    for i in range(0, len(hashes), QUERY_CHUNK):
+        rows = TranslationMemory.objects.filter(
+            source_hash__in=hashes[i:i + QUERY_CHUNK],
+            source_lang=source_lang,
+            target_lang=target_lang,
+            model=model,
+        ).values_list('id', 'source_hash', 'direct', 'free')
+        for row_id, digest, direct, free in rows:
+            matched_ids.append(row_id)
+            for idx in keys[digest]:
+                found[idx] = (direct, free)
+
+    if matched_ids:
+        for i in range(0, len(matched_ids), QUERY_CHUNK):
+            TranslationMemory.objects.filter(id__in=matched_ids[i:i + QUERY_CHUNK]).update(
+                hit_count=F('hit_count') + 1, last_used=timezone.now()
+            )
+    _count("exact_hits", len(found))
+    return found
+
+
+def _length_window(length: int) -> Tuple[int, int]:
+    return int(length * (1 - LENGTH_TOLERANCE)), int(length * (1 + LENGTH_TOLERANCE)) + 1
+
+
+def _merge_windows(windows: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[List[int]] = []
+    for low, high in sorted(windows):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return [(low, high) for low, high in merged]
+
+
+def lookup_near(texts: Dict[int, str], source_lang: str, target_lang: str, model: str) -> Dict[int, Tuple[str, str, float]]:
+    """
+    Find the most similar stored cue for each given cue
+    Returns: {cue index: (stored source text, free translation, similarity)} for matches above NEAR_MATCH_THRESHOLD
+
+    A cue's candidates are the NEAR_MATCH_CANDIDATES most-used entries within LENGTH_TOLERANCE of its length.
+    Those are always among the most-used entries of each single length in the window, so one query
+    fetches the top NEAR_MATCH_CANDIDATES per length for every length any cue needs, and each cue
+    picks its candidates from that pool in memory.
+    """
+    cues: Dict[int, str] = {}
+    for idx, text in texts.items():
+        normalized = normalize_source(text)
+        if len(normalized) >= MIN_MEMORY_CHARS:
+            cues[idx] = normalized
+    if not cues:
+        return {}
+
+    length_filter = Q()
+    for low, high in _merge_windows(_length_window(len(normalized)) for normalized in set(cues.values())):
+        length_filter |= Q(source_length__gte=low, source_length__lte=high)
+    rows = (
+        TranslationMemory.objects.filter(length_filter, source_lang=source_lang, target_lang=target_lang, model=model)
+        .annotate(length_rank=Window(RowNumber(), partition_by=[F('source_length')], order_by=F('hit_count').desc()))
+        .filter(length_rank__lte=NEAR_MATCH_CANDIDATES)
+        .values_list('source_length', 'hit_count', 'source_text', 'free')
+    )
+    by_length: Dict[int, List[Tuple[int, str, str]]] = {}
+    for length, hit_count, candidate_text, free in rows:
+        by_length.setdefault(length, []).append((hit_count, candidate_text, free))
+
+    hints: Dict[int, Tuple[str, str, float]] = {}
+    for idx, normalized in cues.items():
+        low, high = _length_window(len(normalized))
+        pool = [row for length in range(low, high + 1) for row in by_length.get(length, ())]
+        candidates = heapq.nlargest(NEAR_MATCH_CANDIDATES, pool, key=lambda row: row[0])
+
+        # seq2 is the cue itself so SequenceMatcher analyses it once and reuses it for every candidate
+        matcher = difflib.SequenceMatcher(None, '', normalized, autojunk=False)
+        best: Optional[Tuple[str, str, float]] = None
+        for _, candidate_text, free in candidates:
+            matcher.set_seq1(candidate_text)
+            if matcher.real_quick_ratio() < NEAR_MATCH_THRESHOLD or matcher.quick_ratio() < NEAR_MATCH_THRESHOLD:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= NEAR_MATCH_THRESHOLD and (best is None or ratio > best[2]):
+                best = (candidate_text, free, ratio)
+        if best is not None:
+            hints[idx] = best
+    _count("near_hits", len(hints))
+    return hints
+
+
+def remember(cues: Iterable[Tuple[str, str, str]], source_lang: str, target_lang: str, model: str) -> int:
+    """
+    Store translated cues, updating entries that already exist
+    cues: (source text, direct, free) tuples; untranslated cues (free empty or equal to the source) are skipped
+    Returns the number of entries written
+    """
+    entries: Dict[str, TranslationMemory] = {}
+    now = timezone.now()
+    for text, direct, free in cues:
+        normalized = normalize_source(text)
+        if len(normalized) < MIN_MEMORY_CHARS or not free or free.strip() == (text or '').strip():
+            continue
+        entries[source_hash(normalized)] = TranslationMemory(
+            source_hash=source_hash(normalized),
+            source_text=normalized,
+            source_length=len(normalized),
+            source_lang=source_lang,
+            target_lang=target_lang,
+            model=model,
+            direct=direct or '',
+            free=free,
+            last_used=now,
+        )
+    if not entries:
+        return 0
+    TranslationMemory.objects.bulk_create(
+        list(entries.values()),
+        batch_size=QUERY_CHUNK,
+        update_conflicts=True,
+        unique_fields=['source_hash', 'source_lang', 'target_lang', 'model'],
+        update_fields=['direct', 'free', 'last_used'],
+    )
+    _count("stored", len(entries))
+    return len(entries)
+
+
+def stats() -> Dict[str, float]:
+    """Process-wide lookup counters plus table totals"""
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters["lookups"]
+    totals = TranslationMemory.objects.aggregate(total_hits=Sum('hit_count'))
+    return {
+        **counters,
+        "hit_rate": round(counters["exact_hits"] / lookups, 4) if lookups else 0.0,
+        "near_hit_rate": round(counters["near_hits"] / lookups, 4) if lookups else 0.0,
+        "entries": TranslationMemory.objects.count(),
+        "lifetime_hits": totals["total_hits"] or 0,
+    }
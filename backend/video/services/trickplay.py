@@ -0,0 +1,163 @@
+"""
+Trickplay (scrub preview) sprite sheets.
+
+One ffmpeg pass decodes the video once and chains fps -> scale -> tile, so a frame every
+`interval` seconds lands in JPEG sheets of COLUMNS x ROWS tiles. An index is written next to them:
+- index.vtt: WebVTT cues "sprite_000.jpg#xywh=x,y,w,h", the format players use for thumbnail tracks
+- index.json: the same grid as plain numbers, for custom hover previews
+
+Output lives in media/thumbnail/trickplay/<video md5>_<interval>s_<width>w/. The key is derived
+from the content hash of the video and the sprite parameters, so the files never change and can be
+served as immutable; a hover costs the server nothing beyond static file serving.
+"""
+import json
+import math
+import os
+import shutil
+from typing import Optional
+
+from django.conf import settings
+
+from .audio_processing import run_ffmpeg_with_progress
+from .media_metadata import get_media_info
+
+INTERVAL_SECONDS = 10
+THUMB_WIDTH = 160
+COLUMNS = 10
+ROWS = 10
+JPEG_QUALITY = 5    # ffmpeg -q:v, 2 (best) .. 31
+
+INDEX_JSON = 'index.json'
+INDEX_VTT = 'index.vtt'
+
+
+def trickplay_key(video_path: str, interval: int = INTERVAL_SECONDS, width: int = THUMB_WIDTH) -> str:
+    md5 = os.path.splitext(os.path.basename(video_path))[0]
+    return f'{md5}_{interval}s_{width}w'
+
+
+def trickplay_dir(key: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, 'thumbnail', 'trickplay', key)
+
+
+def base_url(key: str) -> str:
+    """Sprite location relative to the img media route (/media/img/ serves MEDIA_ROOT/thumbnail)"""
+    return f'trickplay/{key}/'
+
+
+def load_index(video_path: str, interval: int = INTERVAL_SECONDS, width: int = THUMB_WIDTH) -> Optional[dict]:
+    """The JSON index if the sprites for these parameters exist, else None"""
+    key = trickplay_key(video_path, interval, width)
+    try:
+        with open(os.path.join(trickplay_dir(key), INDEX_JSON), encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # indexes written before the img-route fix stored 'thumbnail/trickplay/<key>/'
+    index['base_url'] = base_url(key)
+    return index
+
+
+def _timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}'
+
+
+def build_index(key: str, duration: float, interval: int, width: int, height: int) -> dict:
+    count = max(1, math.ceil(duration / interval))
+    per_sheet = COLUMNS * ROWS
+    sheets = [f'sprite_{i:03d}.jpg' for i in range(math.ceil(count / per_sheet))]
+    return {
+        'key': key,
+        'base_url': base_url(key),
+        'duration': duration,
+        'interval': interval,
+        'width': width,
+        'height': height,
+        'columns': COLUMNS,
+        'rows': ROWS,
+        'count': count,
+        'sheets': sheets,
+    }
+
+
+def build_vtt(index: dict) -> str:
+    per_sheet = index['columns'] * index['rows']
+    width, height = index['width'], index['height']
+    lines = ['WEBVTT', '']
+    for i in range(index['count']):
+        start = i * index['interval']
+        end = min(index['duration'], start + index['interval'])
+        cell = i % per_sheet
+        x = (cell % index['columns']) * width
+        y = (cell // index['columns']) * height
+        lines.append(f'{_timestamp(start)} --> {_timestamp(end)}')
+        lines.append(f'{index["sheets"][i // per_sheet]}#xywh={x},{y},{width},{height}')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def generate_trickplay(video_path: str, interval: int = INTERVAL_SECONDS, width: int = THUMB_WIDTH,
+                       progress=None) -> tuple[bool, str, Optional[dict]]:
+    """
+    Produce the sprite sheets and indexes for `video_path` (no-op if they already exist).
+    Returns: (success, error_or_empty, index)
+    """
+    existing = load_index(video_path, interval, width)
+    if existing is not None:
+        return True, '', existing
+    info = get_media_info(video_path)
+    if info is None or not info.has_video or not info.duration:
+        return False, f'could not probe a video stream in {video_path}', None
+
+    # Tile height from the display aspect ratio, even for the JPEG encoder
+    height = max(2, int(round(width * (info.height or 9) / (info.width or 16) / 2)) * 2)
+    key = trickplay_key(video_path, interval, width)
+    out = trickplay_dir(key)
+    partial = f'{out}.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial, exist_ok=True)
+
+    cmd = ['ffmpeg', '-v', 'error', '-nostats', '-progress', 'pipe:1', '-y',
+           '-threads', '2', '-i', video_path, '-map', '0:v:0', '-an', '-sn',
+           '-vf', f'fps=1/{interval},scale={width}:{height},tile={COLUMNS}x{ROWS}',
+           '-q:v', str(JPEG_QUALITY), os.path.join(partial, 'sprite_%03d.jpg')]
+    try:
+        returncode, error = run_ffmpeg_with_progress(cmd, info.duration, progress, low_priority=True)
+        if returncode != 0:
+            raise RuntimeError(error or 'ffmpeg failed')
+        # ffmpeg numbers image sequences from 1
+        for number in range(1, len(os.listdir(partial)) + 1):
+            os.replace(os.path.join(partial, f'sprite_{number:03d}.jpg'),
+                       os.path.join(partial, f'sprite_{number - 1:03d}.jpg'))
+
+        index = build_index(key, info.duration, interval, width, height)
+        index['sheets'] = [s for s in index['sheets'] if os.path.exists(os.path.join(partial, s))]
+        if not index['sheets']:
+            raise RuntimeError('no sprite sheets were written')
+        index['count'] = min(index['count'], len(index['sheets']) * COLUMNS * ROWS)
+        with open(os.path.join(partial, INDEX_VTT), 'w', encoding='utf-8') as f:
+            f.write(build_vtt(index))
+        with open(os.path.join(partial, INDEX_JSON), 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+
+        shutil.rmtree(out, ignore_errors=True)
+        os.replace(partial, out)
+        return True, '', index
+    except Exception as e:
+        shutil.rmtree(partial, ignore_errors=True)
+        return False, str(e), None
+
+
+def remove_trickplay(video_path: str) -> None:
+    """Delete every trickplay set of a video (all intervals and widths)"""
+    md5 = os.path.splitext(os.path.basename(video_path))[0]
+    root = os.path.join(settings.MEDIA_ROOT, 'thumbnail', 'trickplay')
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        if name.startswith(f'{md5}_'):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
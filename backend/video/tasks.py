@@ -5,7 +5,9 @@ from collections import defaultdict
 from django.http import JsonResponse
 from django.db import transaction
 from .models import Video
+from .services.media_metadata import get_media_info
 from utils.split_subtitle.main import optimise_srt
+from utils.word_store import word_store_path, write_word_store_from_srt
 from django.conf import settings  # 确保这个在顶部
 import hashlib
 from .views.set_setting import load_all_settings
@@ -111,7 +113,7 @@ subtitle_task_status = defaultdict(lambda: {
     "translate_total_chunks": 0,    # 翻译任务总chunk数
     "translate_completed_chunks": 0, # 翻译已完成chunk数
 })
-FIXED_NUM_THREADS = 8
+FIXED_NUM_THREADS = 16  # 翻译线程数上限，实际LLM并发由 utils.llm_gateway 自适应控制
 
 # subtitle_task_status[20000]={
 #     "filename": "A default subtitle task",
@@ -228,8 +230,8 @@ def preprocess_audio_for_transcription(video_id):
     except Exception as e:
         raise Exception(f"Audio preprocessing error: {str(e)}")
 
-def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str, emphasize_dst: str = "") -> None:
-    """处理仅翻译模式的字幕任务"""
+def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str, emphasize_dst: str = "", incremental: bool = True) -> None:
+    """处理仅翻译模式的字幕任务；incremental为True时只重新翻译原文改动过的句子"""
     try:
         # 获取视频的原始语言，如果没有设置则使用src_lang
         original_lang = video.raw_lang or src_lang
@@ -255,22 +257,26 @@ def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str
         
         print(f"Using original subtitle file: {original_srt_path}")
         
-        # 设置翻译字幕路径
-        translated_srt_name = f"{video_id}_{trans_lang}.srt"
-        translated_srt_path = os.path.join(SAVE_DIR, translated_srt_name)
+        # 设置翻译字幕路径；trans_lang 可以是多个目标语言，一次任务内共享原文并发翻译
+        target_langs = [trans_lang] if isinstance(trans_lang, str) else list(trans_lang)
+        translated_srt_names = {lang: f"{video_id}_{lang}.srt" for lang in target_langs}
+        translated_srt_paths = {lang: os.path.join(SAVE_DIR, name) for lang, name in translated_srt_names.items()}
+        # 数据库只记录一条译文路径，多语言时以第一个目标语言为准
+        translated_srt_name = translated_srt_names[target_langs[0]]
         
         # 执行翻译
         _update(video_id, "translate", "Running")
         from utils.split_subtitle.main import translate_srt
         translate_srt(
             raw_srt_path=original_srt_path,
-            translate_srt_path=translated_srt_path,
+            translate_srt_path=translated_srt_paths,
             raw_lang=original_lang,
-            target_lang=trans_lang,
+            target_lang=target_langs,
             use_translation_cache=True,
             num_threads=FIXED_NUM_THREADS,
             progress_cb=lambda status: _update(video_id, "translate", status),
             terms_to_note=emphasize_dst,
+            incremental=incremental,
         )
         _update(video_id, "translate", "Completed")
         
@@ -279,7 +285,7 @@ def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str
             video.translated_srt_path = translated_srt_name
             video.save(update_fields=["translated_srt_path"])
         
-        print(f"Translation completed for video {video_id}: {original_lang} -> {trans_lang}")
+        print(f"Translation completed for video {video_id}: {original_lang} -> {', '.join(target_langs)}")
         
     except Exception as exc:
         print(f"Translation-only failed for video {video_id}: {exc}")
@@ -348,7 +354,7 @@ def generate_subtitles_for_video(video_id: int) -> None:
         _update(video_id, "optimize", "Skipped")
         
         # 执行翻译
-        handle_translation_only(video_id, video, src_lang, trans_lang, emphasize_dst)
+        handle_translation_only(video_id, video, src_lang, trans_lang, emphasize_dst, task.get("incremental", True))
         return
 
     # 1. 音频转录阶段
@@ -446,6 +452,12 @@ def generate_subtitles_for_video(video_id: int) -> None:
         import shutil
         shutil.copy2(work_srt_path, original_srt_path)
         print(f"直接复制原始SRT到: {original_srt_path}")
+        # 词级时间戳另存为二进制文件，后续环节按时间随机访问，不必重新解析SRT
+        try:
+            word_count = write_word_store_from_srt(word_store_path(original_srt_path), srt_content)
+            print(f"已写入词级存储: {word_count} 个词")
+        except Exception as exc:
+            print(f"写入词级存储失败: {exc}")
         _update(video_id, "optimize", "Completed")
         
         # 跳过翻译阶段
@@ -1025,53 +1037,13 @@ def export_update_status(task_id: str, status: str, progress: int = 0, error_mes
         export_task_status[task_id]["error_message"] = error_message
 
 def get_video_bitrate(video_path: str) -> str:
-    """使用 ffprobe 获取视频比特率"""
-    import subprocess
-    import json
-    
-    try:
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=bit_rate',
-            '-of', 'json',
-            video_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            if 'streams' in data and len(data['streams']) > 0:
-                bit_rate = data['streams'][0].get('bit_rate')
-                if bit_rate:
-                    # Convert to k format (e.g., 1339k)
-                    bit_rate_k = int(int(bit_rate) / 1000)
-                    return f"{bit_rate_k}k"
-        
-        # Fallback: try to get format bitrate
-        cmd_format = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-show_entries', 'format=bit_rate',
-            '-of', 'json',
-            video_path
-        ]
-        
-        result = subprocess.run(cmd_format, capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            if 'format' in data:
-                bit_rate = data['format'].get('bit_rate')
-                if bit_rate:
-                    bit_rate_k = int(int(bit_rate) / 1000)
-                    return f"{bit_rate_k}k"
-                    
-        return "2000k"  # Default fallback bitrate
-        
-    except Exception as e:
-        print(f"Error getting video bitrate: {e}")
-        return "2000k"  # Default fallback bitrate
+    """获取视频比特率（来自媒体元数据缓存），优先视频流，其次整个文件"""
+    info = get_media_info(video_path)
+    bit_rate = info and (info.bit_rate or info.format_bit_rate)
+    if bit_rate:
+        # Convert to k format (e.g., 1339k)
+        return f"{int(bit_rate / 1000)}k"
+    return "2000k"  # Default fallback bitrate
 
 def export_video_with_subtitles(task_id: str):
     """导出带硬嵌入字幕的视频"""
@@ -1199,7 +1171,7 @@ def export_video_with_subtitles(task_id: str):
 
 def generate_ass_content(video_id: int, subtitle_type: str, raw_srt_path: str = None, trans_srt_path: str = None) -> str:
     """生成ASS字幕内容"""
-    from utils.split_subtitle.ASRData import from_srt
+    from utils.srt_io import format_ass_times, parse_srt
     from .views.set_setting import load_all_settings
     
     # 加载字幕设置
@@ -1274,13 +1246,6 @@ def generate_ass_content(video_id: int, subtitle_type: str, raw_srt_path: str =
         return f"&H00{b:02X}{g:02X}{r:02X}"
     
     # 格式化时间为ASS格式
-    def format_ass_time(seconds: float) -> str:
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        centisecs = int((seconds % 1) * 100)
-        return f"{hours}:{minutes:02d}:{secs:02d}.{centisecs:02d}"
-    
     # ASS文件头部（获取实际视频分辨率信息以确保正确缩放）
     video = Video.objects.get(pk=video_id)
     
@@ -1365,36 +1330,33 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
     
     # 加载字幕文件并生成对话行
-    raw_asr_data = None
-    trans_asr_data = None
+    raw_cues = None
+    trans_texts = []
     
     if raw_srt_path and os.path.exists(raw_srt_path):
         with open(raw_srt_path, 'r', encoding='utf-8') as f:
-            raw_asr_data = from_srt(f.read())
+            raw_cues = parse_srt(f.read())
     
     if trans_srt_path and os.path.exists(trans_srt_path):
         with open(trans_srt_path, 'r', encoding='utf-8') as f:
-            trans_asr_data = from_srt(f.read())
+            trans_texts = parse_srt(f.read()).texts
     
-    # 合并字幕（使用原文字幕的时间戳）
-    if raw_asr_data and raw_asr_data.has_data():
-        for i, raw_seg in enumerate(raw_asr_data.segments):
-            # 转换时间戳（从毫秒到秒）
-            start_time = format_ass_time(raw_seg.start_time / 1000.0)
-            end_time = format_ass_time(raw_seg.end_time / 1000.0)
-            
+    # 合并字幕（使用原文字幕的时间戳），时间戳整列一次性转换
+    if raw_cues and raw_cues.texts:
+        start_times = format_ass_times(raw_cues.starts)
+        end_times = format_ass_times(raw_cues.ends)
+        lines = []
+        for i, (start_time, end_time, raw_text) in enumerate(zip(start_times, end_times, raw_cues.texts)):
             if subtitle_type == 'raw':
-                ass_content += f"Dialogue: 0,{start_time},{end_time},Raw,,0,0,0,,{raw_seg.text}\n"
+                lines.append(f"Dialogue: 0,{start_time},{end_time},Raw,,0,0,0,,{raw_text}\n")
             elif subtitle_type == 'translated':
-                if trans_asr_data and i < len(trans_asr_data.segments):
-                    trans_text = trans_asr_data.segments[i].text
-                else:
-                    trans_text = raw_seg.text
-                ass_content += f"Dialogue: 0,{start_time},{end_time},Foreign,,0,0,0,,{trans_text}\n"
+                trans_text = trans_texts[i] if i < len(trans_texts) else raw_text
+                lines.append(f"Dialogue: 0,{start_time},{end_time},Foreign,,0,0,0,,{trans_text}\n")
             elif subtitle_type == 'both':
-                ass_content += f"Dialogue: 0,{start_time},{end_time},Raw,,0,0,0,,{raw_seg.text}\n"
-                if trans_asr_data and i < len(trans_asr_data.segments):
-                    ass_content += f"Dialogue: 0,{start_time},{end_time},Foreign,,0,0,0,,{trans_asr_data.segments[i].text}\n"
+                lines.append(f"Dialogue: 0,{start_time},{end_time},Raw,,0,0,0,,{raw_text}\n")
+                if i < len(trans_texts):
+                    lines.append(f"Dialogue: 0,{start_time},{end_time},Foreign,,0,0,0,,{trans_texts[i]}\n")
+        ass_content += ''.join(lines)
     
     return ass_content
 
@@ -1581,4 +1543,137 @@ def process_tts_task() -> None:
     try:
         generate_tts_audio(task_id)
     finally:
-        tts_queue.task_done()
\ No newline at end of file
+        tts_queue.task_done()
+
+"""
+HLS 打包任务：整段流复制为 m3u8+ts，在后台队列中执行并报告进度
+（按需切片的懒加载模式无需排队，见 services/hls_packaging.py）
+"""
+hls_queue: Queue[int] = Queue()
+hls_task_status = defaultdict(lambda: {
+    "status": "Queued",  # Queued/Running/Completed/Failed
+    "progress": 0,       # 进度百分比（按 ffmpeg 已输出时长计算）
+    "hls_path": "",
+    "error_message": "",
+})
+
+
+def package_hls_video(video_id: int) -> None:
+    """将视频完整打包为 HLS，完成后替换 stream_video/<name>（含懒加载生成的目录）"""
+    from .services.audio_processing import extract_hls_from_video_file, get_video_file_paths
+
+    task = hls_task_status[video_id]
+    task["status"] = "Running"
+    task["progress"] = 1
+    try:
+        _, video_path, _ = get_video_file_paths(video_id)
+
+        def on_progress(percent):
+            task["progress"] = max(task["progress"], percent)
+
+        ok, err, rel_dir = extract_hls_from_video_file(video_path, progress=on_progress)
+        if not ok:
+            raise Exception(err or "HLS conversion failed")
+        task["hls_path"] = rel_dir
+        task["progress"] = 100
+        task["status"] = "Completed"
+    except Exception as exc:
+        print(f"[HLS] Packaging failed for video {video_id}: {exc}")
+        task["status"] = "Failed"
+        task["error_message"] = str(exc)
+
+
+abr_queue: Queue[int] = Queue()   # 由 apps.py 中的专用线程阻塞读取
+abr_task_status = defaultdict(lambda: {
+    "status": "Queued",  # Queued/Running/Completed/Failed
+    "progress": 0,
+    "master_playlist": "",
+    "error_message": "",
+})
+
+
+def package_abr_video(video_id: int) -> None:
+    """生成多档码率（ABR）HLS，完成后输出 stream_video/<name>_abr/master.m3u8"""
+    from .services.abr_ladder import package_abr
+    from .services.audio_processing import get_video_file_paths
+
+    task = abr_task_status[video_id]
+    task["status"] = "Running"
+    task["progress"] = 1
+    try:
+        _, video_path, _ = get_video_file_paths(video_id)
+
+        def on_progress(percent):
+            task["progress"] = max(task["progress"], percent)
+
+        ok, err, master = package_abr(video_path, progress=on_progress)
+        if not ok:
+            raise Exception(err or "ABR packaging failed")
+        task["master_playlist"] = master
+        task["progress"] = 100
+        task["status"] = "Completed"
+    except Exception as exc:
+        print(f"[ABR] Packaging failed for video {video_id}: {exc}")
+        task["status"] = "Failed"
+        task["error_message"] = str(exc)
+
+
+trickplay_queue: Queue[int] = Queue()   # 由 apps.py 中的专用线程阻塞读取
+trickplay_task_status = defaultdict(lambda: {
+    "status": "Queued",  # Queued/Running/Completed/Failed
+    "progress": 0,
+    "error_message": "",
+})
+
+
+def generate_trickplay_for_video(video_id: int) -> None:
+    """一次解码生成拖动预览雪碧图和 WebVTT/JSON 索引（见 services/trickplay.py）"""
+    from .services.trickplay import generate_trickplay
+    from .services.audio_processing import get_media_path_info
+
+    task = trickplay_task_status[video_id]
+    task["status"] = "Running"
+    task["progress"] = 1
+    try:
+        video = Video.objects.get(pk=video_id)
+        directory_name, _ = get_media_path_info(video.url)
+        video_path = os.path.join(settings.MEDIA_ROOT, directory_name, video.url)
+
+        def on_progress(percent):
+            task["progress"] = max(task["progress"], percent)
+
+        ok, err, _ = generate_trickplay(video_path, progress=on_progress)
+        if not ok:
+            raise Exception(err or "Trickplay generation failed")
+        task["progress"] = 100
+        task["status"] = "Completed"
+    except Exception as exc:
+        print(f"[Trickplay] Generation failed for video {video_id}: {exc}")
+        task["status"] = "Failed"
+        task["error_message"] = str(exc)
+
+
+def queue_trickplay(video_id: int) -> dict:
+    """排队生成雪碧图；已在排队或运行中的任务不重复添加"""
+    task = trickplay_task_status.get(video_id)
+    if task is None or task["status"] in ("Completed", "Failed"):
+        trickplay_task_status[video_id].update({
+            "status": "Queued",
+            "progress": 0,
+            "error_message": "",
+        })
+        trickplay_queue.put(video_id)
+    return trickplay_task_status[video_id]
+
+
+def process_hls_task() -> None:
+    """被后台线程循环调用处理HLS打包任务"""
+    try:
+        video_id = hls_queue.get_nowait()
+    except Empty:
+        return
+
+    try:
+        package_hls_video(video_id)
+    finally:
+        hls_queue.task_done()
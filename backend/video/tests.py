@@ -1,3 +1,407 @@
-from django.test import TestCase
+import difflib
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import unittest
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from utils.audio.waveform_generator import _min_max_pairs, _reduce_stream, _samples_per_peak
+from utils.split_subtitle.ASRData import ASRData, ASRDataSeg
+from utils.split_subtitle.asr_columnar import ColumnarASRData
+from utils.split_subtitle.cnt_tokens import cnt_display_words, count_words
+from utils.split_subtitle.main import MIN_DISPLAY_COUNT, merge_short_segments_iteratively, preprocess_text
+from utils.split_subtitle.sentence_align import align_sentences
+from utils.srt_io import shift_srt_timestamps
+from video.services import abr_ladder, hls_packaging, trickplay
+from video.services.abr_ladder import Rung
+from video.services.audio_processing import run_ffmpeg_with_progress
+
+
+def _reference_merge_short_segments(segments):
+    """
+    merge_short_segments_iteratively 改写前的实现（逐轮扫描 + 列表拼接），作为回归测试的基准
+    """
+    result = segments.copy()
+    changed = True
+
+    while changed:
+        changed = False
+        i = 0
+
+        while i < len(result):
+            seg = result[i]
+            display_len = cnt_display_words(seg.text)
+
+            if display_len < MIN_DISPLAY_COUNT:
+                prev_time_diff = float('inf')
+                next_time_diff = float('inf')
+
+                if i > 0:
+                    prev_time_diff = seg.start_time - result[i - 1].end_time
+
+                if i < len(result) - 1:
+                    next_time_diff = result[i + 1].start_time - seg.end_time
+
+                if prev_time_diff <= next_time_diff and i > 0:
+                    prev_seg = result[i - 1]
+                    result[i - 1:i + 1] = [ASRDataSeg(prev_seg.text + seg.text, prev_seg.start_time, seg.end_time, "", "", "")]
+                    changed = True
+                elif next_time_diff < prev_time_diff and i < len(result) - 1:
+                    next_seg = result[i + 1]
+                    result[i:i + 2] = [ASRDataSeg(seg.text + next_seg.text, seg.start_time, next_seg.end_time, "", "", "")]
+                    changed = True
+                else:
+                    i += 1
+            else:
+                i += 1
+
+    return result
+
+
+_WORDS = ["the", "git", "remote", "ok", "so", "main", "branch", "3.5", "v2", "x", "I", "it's"]
+_CJK = ["我们", "仓库", "的", "是", "这个", "分支", "つまり", "です", "한국어"]
+_PUNCT = ["", "", ",", ".", "?", "，", "。", "!", " "]
+
+
+def _generate_transcript(rng, n):
+    """生成带随机文本长度、中英混排、空白和时间间隔（含重叠、相等）的字幕分段"""
+    segments = []
+    t = 0
+    for _ in range(n):
+        pieces = []
+        for _ in range(rng.choice([0, 1, 1, 2, 3, 5, 8])):
+            pieces.append(rng.choice(_WORDS) if rng.random() < 0.5 else rng.choice(_CJK))
+            pieces.append(rng.choice([" ", "", " "]))
+        text = "".join(pieces) + rng.choice(_PUNCT)
+        if rng.random() < 0.1:
+            text = " " + text
+        gap = rng.choice([0, 0, 10, 50, 200, 800, -20])
+        duration = rng.randint(0, 3000)
+        start = t + gap
+        segments.append(ASRDataSeg(text, start, start + duration))
+        t = start + duration
+    return segments
+
+
+class MergeShortSegmentsTest(SimpleTestCase):
+    def assertSameSegments(self, expected, actual):
+        self.assertEqual(
+            [(s.text, s.start_time, s.end_time) for s in expected],
+            [(s.text, s.start_time, s.end_time) for s in actual],
+        )
+
+    def test_matches_reference_on_generated_transcripts(self):
+        rng = random.Random(20240601)
+        for n in list(range(0, 12)) + [50, 200, 1000]:
+            for _ in range(20 if n < 200 else 3):
+                segments = _generate_transcript(rng, n)
+                self.assertSameSegments(
+                    _reference_merge_short_segments(segments),
+                    merge_short_segments_iteratively(segments),
+                )
+
+    def test_unmerged_segments_are_kept(self):
+        segments = [
+            ASRDataSeg("这是一个足够长的句子用于测试", 0, 1000),
+            ASRDataSeg("短", 1000, 1100),
+            ASRDataSeg("another sentence that is long enough", 3000, 4000),
+        ]
+        result = merge_short_segments_iteratively(segments)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0].text, "这是一个足够长的句子用于测试短")
+        self.assertIs(result[1], segments[2])
+
+
+def _reference_align_sentences(asr_texts, sentences, threshold=0.5, max_shift=10):
+    """
+    align_sentences 改写前的实现（窗口大小 × 起点偏移 × SequenceMatcher），作为回归测试的基准
+    """
+    asr_len = len(asr_texts)
+    asr_index = 0
+    spans = []
+
+    for sentence in sentences:
+        sentence_proc = preprocess_text(sentence)
+        word_count = count_words(sentence_proc)
+        best_ratio = 0.0
+        best_pos = None
+        best_window_size = 0
+
+        min_window_size = max(1, word_count // 2)
+        max_window_size = min(word_count * 2, asr_len - asr_index)
+        window_sizes = sorted(range(min_window_size, max_window_size + 1), key=lambda x: abs(x - word_count))
+
+        for window_size in window_sizes:
+            max_start = min(asr_index + max_shift + 1, asr_len - window_size + 1)
+            for start in range(asr_index, max_start):
+                substr = ''.join(asr_texts[start:start + window_size])
+                ratio = difflib.SequenceMatcher(None, sentence_proc, preprocess_text(substr)).ratio()
+                if ratio > best_ratio:
+                    best_ratio = ratio
+                    best_pos = start
+                    best_window_size = window_size
+                if ratio == 1.0:
+                    break
+            if best_ratio == 1.0:
+                break
+
+        if best_ratio >= threshold and best_pos is not None:
+            spans.append((best_pos, best_pos + best_window_size - 1))
+            asr_index = best_pos + best_window_size
+        else:
+            spans.append(None)
+            asr_index += 1
+
+    return spans
+
+
+_ALIGN_WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "we", "are", "going", "to",
+                "talk", "about", "git", "remote", "branches", "today", "and", "how", "they", "work", "main"]
+_ALIGN_CJK = ["我们", "今天", "讨论", "远程", "分支", "的", "工作", "方式", "仓库"]
+
+
+def _generate_alignment(rng, n, edits):
+    """
+    生成ASR token流和对应的句子列表；edits 中的 drop/insert/typo 分别在句子里删词、插词、改错字母
+    英文token带尾随空格，中文token不带
+    """
+    tokens = []
+    sentences = []
+    for _ in range(n):
+        cjk = rng.random() < 0.25
+        words = [rng.choice(_ALIGN_CJK if cjk else _ALIGN_WORDS) for _ in range(rng.randint(1, 14))]
+        tokens += words if cjk else [w + ' ' for w in words]
+        if 'drop' in edits and len(words) > 3 and rng.random() < 0.5:
+            del words[rng.randrange(len(words))]
+        if 'insert' in edits and rng.random() < 0.5:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(_ALIGN_CJK if cjk else _ALIGN_WORDS))
+        if 'typo' in edits and not cjk and rng.random() < 0.5:
+            k = rng.randrange(len(words))
+            p = rng.randrange(len(words[k]))
+            words[k] = words[k][:p] + rng.choice('aeiouxyz') + words[k][p + 1:]
+        text = ''.join(words) if cjk else ' '.join(words).capitalize()
+        sentences.append(text + rng.choice(['', '.', '?', ',', '。']))
+    return tokens, sentences
+
+
+class AlignSentencesTest(SimpleTestCase):
+    @staticmethod
+    def score(tokens, sentence, span):
+        if span is None:
+            return 0.0
+        substr = ''.join(tokens[span[0]:span[1] + 1])
+        return difflib.SequenceMatcher(None, preprocess_text(sentence), preprocess_text(substr)).ratio()
+
+    def test_no_worse_than_reference_on_generated_transcripts(self):
+        rng = random.Random(20240526)
+        for edits in [(), ('drop',), ('insert',), ('typo',), ('drop', 'insert', 'typo')]:
+            for n in list(range(0, 6)) + [20]:
+                for _ in range(3):
+                    tokens, sentences = _generate_alignment(rng, n, edits)
+                    expected = _reference_align_sentences(tokens, sentences)
+                    actual = align_sentences(tokens, sentences)
+                    self.assertEqual(len(actual), len(sentences))
+                    for sentence, old, new in zip(sentences, expected, actual):
+                        if new != old:
+                            self.assertGreaterEqual(self.score(tokens, sentence, new),
+                                                    self.score(tokens, sentence, old), (edits, sentence))
+
+    def test_exact_match_at_token_boundaries(self):
+        tokens = ["Hello ", "world. ", "How ", "are ", "you? ", "我们", "开始", "吧"]
+        self.assertEqual(align_sentences(tokens, ["hello world", "How are you?", "我们开始吧。"]),
+                         [(0, 1), (2, 4), (5, 7)])
+
+
+class ColumnarASRDataTest(SimpleTestCase):
+    def test_ranges_match_segment_lists(self):
+        rng = random.Random(20240615)
+        for n in [1, 2, 7, 60, 400]:
+            segments = _generate_transcript(rng, n)
+            data = ColumnarASRData.from_segments(segments).build_display_index()
+            self.assertEqual(data.to_srt(), ASRData(segments).to_srt())
+            for _ in range(50):
+                start = rng.randint(0, n)
+                end = rng.randint(start, n)
+                texts = ''.join(seg.text for seg in segments[start:end])
+                self.assertEqual(data.concat_text(start, end), texts)
+                self.assertEqual(data.display_width(start, end), cnt_display_words(texts))
+                part = data[start:end]
+                self.assertEqual([seg.start_time for seg in part], [seg.start_time for seg in segments[start:end]])
+                self.assertEqual(part.display_width(), cnt_display_words(texts))
+
+
+class ShiftSrtTimestampsTest(SimpleTestCase):
+    def test_shift_clamps_at_zero(self):
+        content = "1\n00:00:01,000 --> 00:00:02,500\nhi\n"
+        self.assertEqual(shift_srt_timestamps(content, 1.5), "1\n00:00:02,500 --> 00:00:04,000\nhi\n")
+        self.assertEqual(shift_srt_timestamps(content, -2), "1\n00:00:00,000 --> 00:00:00,500\nhi\n")
+
+    def test_non_ascii_digits_fall_back(self):
+        content = "1\n\u0660\u0660:\u0660\u0660:\u0660\u0663,\u0660\u0660\u0660 --> 00:00:04,000\nx\n"
+        self.assertEqual(shift_srt_timestamps(content, 1), "1\n00:00:04,000 --> 00:00:05,000\nx\n")
+
+
+def _reference_calculate_peaks(audio_data, samples_per_second, duration):
+    """
+    流式计算改写前的 _calculate_peaks（整段解码后逐窗口循环求 RMS），作为回归测试的基准
+    """
+    total_samples = len(audio_data)
+    target_peaks = int(duration * samples_per_second)
+    samples_per_peak = total_samples // target_peaks if target_peaks > 0 else total_samples
+    peaks = []
+    for i in range(0, total_samples, samples_per_peak):
+        segment = audio_data[i:i + samples_per_peak]
+        if len(segment) > 0:
+            peaks.append(float(np.clip(np.sqrt(np.mean(segment ** 2)), -1.0, 1.0)))
+    return peaks
+
+
+class WaveformPeaksTest(SimpleTestCase):
+    def test_streaming_matches_reference(self):
+        rng = np.random.default_rng(20240620)
+        # (解码样本数, 时长)：包括解码结果略短于时长（窗口变为 99）和短于一个峰值窗口的情况
+        for total, duration in [(14613, 7.3), (200000, 100.0), (199950, 100.0), (37, 0.02), (300001, 150.0)]:
+            audio = (rng.standard_normal(total) * 0.7).astype(np.float32)
+            window = _samples_per_peak(total, 20, duration)
+            windows = sorted({max(1, window - 1), window, window + 1})
+            # 默认块大小，以及最小的块（所有窗口的最小公倍数），后者会切成很多块
+            for chunk_samples in (None, math.lcm(*windows, 20)):
+                peaks, base_pairs, count = _reduce_stream(
+                    io.BytesIO(audio.tobytes()), windows, 20, chunk_samples=chunk_samples)
+                self.assertEqual(count, total)
+                self.assertEqual(peaks[window], _reference_calculate_peaks(audio, 20, duration))
+                self.assertTrue(np.array_equal(base_pairs, _min_max_pairs(audio, 20)))
+
+    def test_chunks_must_hold_whole_windows(self):
+        with self.assertRaises(ValueError):
+            _reduce_stream(io.BytesIO(b''), [100], 20, chunk_samples=150)
+
+
+class HlsPackagingTest(SimpleTestCase):
+    def test_segment_boundaries(self):
+        # 关键帧间隔不足 step/2 的被跳过，超出时长的被忽略
+        self.assertEqual(hls_packaging.segment_boundaries([0.0, 2.0, 6.1, 12.0, 30.0], 20.0, 6),
+                         [0.0, 6.1, 12.0, 20.0])
+        # 末尾不足 step/4 的碎片并入前一段
+        self.assertEqual(hls_packaging.segment_boundaries([0.0, 6.0, 12.0], 13.0, 6), [0.0, 6.0, 13.0])
+        # 没有关键帧时整段从0开始
+        self.assertEqual(hls_packaging.segment_boundaries([], 4.5, 6), [0.0, 4.5])
+
+    def test_write_playlist(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index.m3u8')
+            hls_packaging.write_playlist(path, [0.0, 6.1, 12.0, 13.5])
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(os.listdir(tmp), ['index.m3u8'])
+        self.assertEqual(lines[2], '#EXT-X-TARGETDURATION:7')
+        self.assertEqual(lines[5:], ['#EXTINF:6.100,', 'lazy0.ts', '#EXTINF:5.900,', 'lazy1.ts',
+                                     '#EXTINF:1.500,', 'lazy2.ts', '#EXT-X-ENDLIST'])
+
+    def test_segment_locks_are_released(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with hls_packaging._segment_lock('/tmp/x/lazy0.ts'):
+                entered.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        entered.wait()
+        waiter = threading.Thread(target=hold)
+        waiter.start()
+        self.assertIn('/tmp/x/lazy0.ts', hls_packaging._segment_locks)
+        release.set()
+        holder.join()
+        waiter.join()
+        self.assertNotIn('/tmp/x/lazy0.ts', hls_packaging._segment_locks)
+
+
+@override_settings(ABR_CPU_THREADS=2, ABR_AUDIO_BITRATE='96k')
+class AbrLadderTest(SimpleTestCase):
+    LADDER = abr_ladder.parse_ladder('480:1400k, 1080:5000k,bad,720:2800k,360:')
+
+    def test_parse_ladder(self):
+        self.assertEqual(self.LADDER, [Rung('1080p', 1080, '5000k'), Rung('720p', 720, '2800k'),
+                                       Rung('480p', 480, '1400k')])
+
+    def test_plan_ladder(self):
+        # 可复用的源作为最高一档，只编码更低的档位
+        self.assertEqual([r.name for r in abr_ladder.plan_ladder(720, True, self.LADDER)], ['source', '480p'])
+        # 不放大
+        self.assertEqual([r.name for r in abr_ladder.plan_ladder(720, False, self.LADDER)], ['720p', '480p'])
+        # 低于所有档位时按源尺寸、最低码率编码一档
+        self.assertEqual(abr_ladder.plan_ladder(240, False, self.LADDER), [Rung('240p', 240, '1400k')])
+
+    def test_build_command(self):
+        rungs = abr_ladder.plan_ladder(720, True, self.LADDER)
+        cmd = abr_ladder.build_command('in.mp4', 'out', rungs, has_audio=True, copy_audio=True, audio_only=True)
+        joined = ' '.join(cmd)
+        self.assertEqual(cmd[cmd.index('-filter_complex') + 1], '[0:v:0]split=1[s0];[s0]scale=-2:480[v0]')
+        self.assertIn('-map 0:v:0 -c:v:0 copy -map 0:a:0 -c:a:0 copy', joined)
+        self.assertIn('-map [v0] -c:v:1 libx264 -b:v:1 1400k -maxrate:v:1 1540k -bufsize:v:1 2800k', joined)
+        self.assertIn('-c:a:1 aac -b:a:1 96k', joined)
+        self.assertEqual(cmd[cmd.index('-var_stream_map') + 1],
+                         'v:0,a:0,name:source v:1,a:1,name:480p a:2,name:audio')
+        self.assertEqual(cmd[-1], os.path.join('out', '%v', 'index.m3u8'))
+
+    def test_build_command_without_audio(self):
+        rungs = abr_ladder.plan_ladder(1080, False, self.LADDER)
+        cmd = abr_ladder.build_command('in.mp4', 'out', rungs, has_audio=False, copy_audio=False, audio_only=True)
+        self.assertNotIn('0:a:0', cmd)
+        self.assertEqual(cmd[cmd.index('-var_stream_map') + 1], 'v:0,name:1080p v:1,name:720p v:2,name:480p')
+
+
+class RunFfmpegWithProgressTest(SimpleTestCase):
+    # 用一个输出 -progress 格式的 Python 子进程代替 ffmpeg
+    SCRIPT = "import os, sys; print('out_time_us=1000000'); print('progress=end'); sys.stderr.write(str(os.nice(0)))"
+
+    def test_progress_and_stderr(self):
+        reported = []
+        code, err = run_ffmpeg_with_progress([sys.executable, '-c', self.SCRIPT], 4.0, reported.append)
+        self.assertEqual((code, reported), (0, [25]))
+        self.assertEqual(int(err), os.nice(0))
+
+    @unittest.skipUnless(os.name == 'posix', 'nice is POSIX only')
+    def test_low_priority(self):
+        code, err = run_ffmpeg_with_progress([sys.executable, '-c', self.SCRIPT], None, low_priority=True)
+        self.assertEqual((code, int(err)), (0, 19))
+
+
+class TrickplayIndexTest(SimpleTestCase):
+    def test_build_index_and_vtt(self):
+        index = trickplay.build_index('abc_10s_160w', 1005.0, 10, 160, 90)
+        self.assertEqual(index['count'], 101)
+        self.assertEqual(index['sheets'], ['sprite_000.jpg', 'sprite_001.jpg'])
+        cues = trickplay.build_vtt(index).rstrip('\n').split('\n\n')
+        self.assertEqual(cues[0], 'WEBVTT')
+        self.assertEqual(cues[1], '00:00:00.000 --> 00:00:10.000\nsprite_000.jpg#xywh=0,0,160,90')
+        self.assertEqual(cues[12], '00:01:50.000 --> 00:02:00.000\nsprite_000.jpg#xywh=160,90,160,90')
+        self.assertEqual(cues[101], '00:16:40.000 --> 00:16:45.000\nsprite_001.jpg#xywh=0,0,160,90')
+
+    def test_sprites_load_from_base_url(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            index = trickplay.build_index('abc_10s_160w', 30.0, 10, 160, 90)
+            os.makedirs(trickplay.trickplay_dir(index['key']))
+            with open(os.path.join(trickplay.trickplay_dir(index['key']), 'sprite_000.jpg'), 'wb') as f:
+                f.write(b'\xff\xd8\xff\xd9')
+            response = self.client.get(f"/api/media/img/{index['base_url']}sprite_000.jpg")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content if response.streaming else [response.content]),
+                             b'\xff\xd8\xff\xd9')
+            self.assertIn('immutable', response['Cache-Control'])
+
+            # 旧版本写入的索引里 base_url 带有多余的 thumbnail/ 前缀，读取时按 key 重新生成
+            with open(os.path.join(trickplay.trickplay_dir(index['key']), trickplay.INDEX_JSON), 'w') as f:
+                json.dump(dict(index, base_url=f"thumbnail/trickplay/{index['key']}/"), f)
+            loaded = trickplay.load_index(os.path.join(media_root, 'saved_video', 'abc.mp4'))
+            self.assertEqual(loaded['base_url'], index['base_url'])
@@ -9,7 +9,7 @@ from .views.videos import (
     LastVideoDataView,
     VideoSearchView,
 )
-from .views.processing_views import ConvertAudioView, ConvertHLSView
+from .views.processing_views import ConvertAudioView, ConvertHLSView, HLSStatusView, ConvertABRView, ABRStatusView
 from .views.download import VideoDownloadView
 from .views.categories import CategoryActionView
 from .views.media import MediaActionView
@@ -37,8 +37,19 @@ import django
 from urllib.parse import urlparse
 from django.views.decorators.http import require_GET
 from django.http import JsonResponse
+from django.conf import settings
 app_name="video"
 
+# ASGI 下使用异步流式视图（见 views/async_media.py）
+if settings.MEDIA_ASYNC_VIEWS:
+    from .views.async_media import (
+        AsyncMediaActionView as MediaView,
+        AsyncVideoDownloadView as DownloadView,
+        AsyncExportedVideoDownloadView as ExportDownloadView,
+    )
+else:
+    MediaView, DownloadView, ExportDownloadView = MediaActionView, VideoDownloadView, ExportedVideoDownloadView
+
 @ensure_csrf_cookie
 def get_csrf_token(request):
   token = django.middleware.csrf.get_token(request)
@@ -109,7 +120,7 @@ urlpatterns = [
     # B站视频封面图片代理 - 必须在通用媒体模式之前
     path('media/thumbnail/', thumbnail_proxy, name='proxy-thumbnail'),
     # 媒体文件服务
-    path('media/<str:type>/<path:filename>', MediaActionView.as_view(), name='serve_media'),
+    path('media/<str:type>/<path:filename>', MediaView.as_view(), name='serve_media'),
 
     # 配置与引擎测试
     path('config/', ConfigAPIView.as_view(), name='config_api'),
@@ -128,10 +139,13 @@ urlpatterns = [
     path('videos/<int:video_id>/language', VideoLanguageView.as_view(), name='set_video_language'),
     path('videos/<int:video_id>/<str:action>', VideoActionView.as_view(), name='video_action'),
     path('videos/batch_action', BatchVideoActionView.as_view(), name='batch_video_action'),
-    path('videos/<int:video_id>/download/<str:format_type>', VideoDownloadView.as_view(), name='video_download'),
+    path('videos/<int:video_id>/download/<str:format_type>', DownloadView.as_view(), name='video_download'),
 
     # 转换为HLS/音频格式
     path('convert-hls/<int:video_id>', ConvertHLSView.as_view(), name='convert_hls_api'),
+    path('convert-hls/<int:video_id>/status', HLSStatusView.as_view(), name='convert_hls_status'),
+    path('convert-abr/<int:video_id>', ConvertABRView.as_view(), name='convert_abr_api'),
+    path('convert-abr/<int:video_id>/status', ABRStatusView.as_view(), name='convert_abr_status'),
     path('convert-audio/<int:video_id>/', ConvertAudioView.as_view(), name='convert_audio'),
 
     # 字幕与思维导图
@@ -161,7 +175,7 @@ urlpatterns = [
     path('export/<str:task_id>/status', ExportStatusView.as_view(), name='export_status_single'),
     path('export/<str:task_id>/delete', DeleteExportTaskView.as_view(), name='export_delete'),
     path('export/<str:task_id>/retry', RetryExportTaskView.as_view(), name='export_retry'),
-    path('export/<str:task_id>/download', ExportedVideoDownloadView.as_view(), name='export_download'),
+    path('export/<str:task_id>/download', ExportDownloadView.as_view(), name='export_download'),
 
     # 外部转录服务
     path('external_transcription/submit', ExternalTranscriptionSubmitView.as_view(), name='external_transcription_submit'),
@@ -175,6 +189,8 @@ urlpatterns = [
     path('tasks/subtitle_generate/add', subtitles.SubtitleGenerationAddView.as_view()),
     path('tasks/subtitle_translation/add', subtitles.SubtitleTranslationAddView.as_view()),
     path('tasks/subtitle_generate/<int:video_id>/<str:action>', subtitles.SubtitleGenerationTaskView.as_view(), name='subtitle-task-action'),
+    path('translation_memory/stats', subtitles.TranslationMemoryStatsView.as_view(), name='translation_memory_stats'),
+    path('subtitles/words/<int:video_id>', subtitles.WordTimingsView.as_view(), name='subtitle_word_timings'),
 
     # TTS配音生成
     path('tts/generate/<int:video_id>', TTSGenerateView.as_view(), name='tts_generate'),
@@ -1,20 +1,18 @@
 from django.utils import timezone
 from django.conf import settings
-import ffmpeg
 import os
 
 def get_video_duration(file_path):
-    """使用ffmpeg获取视频时长(秒)"""
+    """获取视频时长(秒)，来自媒体元数据缓存：入库时调用一次即完成探测，之后的请求不再运行ffprobe"""
     if not os.path.exists(file_path):
         return None
-        
-    try:
-        probe = ffmpeg.probe(file_path)
-        duration = float(probe['format']['duration'])
-        return duration
-    except Exception as e:
-        print(f"Failed to get duration for {file_path}: {str(e)}")
+
+    from .services.media_metadata import get_media_info
+    info = get_media_info(file_path)
+    if info is None or info.duration is None:
+        print(f"Failed to get duration for {file_path}")
         return None
+    return info.duration
 
 def format_duration(seconds):
     """将秒数转换为 HH:MM:SS 格式"""
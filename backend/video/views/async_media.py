@@ -0,0 +1,39 @@
+# views/async_media.py
+"""
+Async variants of the media, export and download views, used when the app runs under ASGI
+(settings.MEDIA_ASYNC_VIEWS, set by vid_go/asgi.py).
+
+The request handling (lookups, stat, validators, conditional responses) runs once in a thread
+via sync_to_async; the body is streamed by range_serving.aiter_file, so a slow client holds
+a suspended coroutine instead of a worker thread for the length of the download.
+"""
+from asgiref.sync import sync_to_async
+
+from .download import VideoDownloadView
+from .export import ExportedVideoDownloadView
+from .media import MediaActionView
+from .range_serving import aiter_file
+
+
+class AsyncMediaActionView(MediaActionView):
+    file_stream = staticmethod(aiter_file)
+
+    async def get(self, request, filename):
+        return await sync_to_async(super().get)(request, filename)
+
+
+class AsyncExportedVideoDownloadView(ExportedVideoDownloadView):
+    file_stream = staticmethod(aiter_file)
+
+    async def get(self, request, task_id):
+        return await sync_to_async(super().get)(request, task_id)
+
+
+class AsyncVideoDownloadView(VideoDownloadView):
+    file_stream = staticmethod(aiter_file)
+
+    async def head(self, request, video_id: int, format_type: str):
+        return await sync_to_async(super().head)(request, video_id, format_type)
+
+    async def get(self, request, video_id: int, format_type: str):
+        return await sync_to_async(super().get)(request, video_id, format_type)
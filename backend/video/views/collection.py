@@ -8,6 +8,7 @@ from .base import JsonView
 from django.views import View
 from ..models import Collection, Category
 from ..utils import calc_diff_time
+from ..services.thumbnail_variants import variant_urls
 from .videos import get_user_combined_hidden_categories
 import os
 import json
@@ -87,6 +88,7 @@ class CollectionActionView(View):
                 "category_id": collection.category.id if collection.category else 0,
                 "category_name": collection.category.name if collection.category else "No Category",
                 "thumbnail_url": collection.thumbnail_url,
+                "thumbnails": variant_urls(collection.thumbnail_url),
                 "created_time": collection.created_time.isoformat() if collection.created_time else None,
                 "last_modified": collection.last_modified.isoformat() if collection.last_modified else None,
                 "video_count": video_count
@@ -146,6 +148,7 @@ class CollectionActionView(View):
                 "name": video.name,
                 "url": video.url,
                 "thumbnail_url": video.thumbnail_url,
+                "thumbnails": variant_urls(video.thumbnail_url),
                 "video_length": video.video_length,
                 "last_modified": video.last_modified.isoformat() if video.last_modified else None,
             })
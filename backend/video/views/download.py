@@ -5,6 +5,7 @@ from django.utils.decorators import method_decorator
 from django.conf import settings
 from ..models import Video
 from .videos import is_audio_file, get_media_path_info
+from .range_serving import serve_file
 import os
 import subprocess
 import tempfile
@@ -12,8 +13,10 @@ import tempfile
 
 @method_decorator(csrf_exempt, name='dispatch')
 class VideoDownloadView(View):
-    """Stream video/audio files for download with progress support using StreamingHttpResponse"""
+    """Serve video/audio files for download (zero-copy, resumable via Range)"""
     http_method_names = ['get', 'head']
+    # Body factory for serve_file; AsyncVideoDownloadView streams with range_serving.aiter_file
+    file_stream = None
 
     def get_file_info(self, video_id: int, format_type: str):
         """Get file path and validate format using existing helper functions"""
@@ -67,17 +70,7 @@ class VideoDownloadView(View):
         if not file_path or not os.path.exists(file_path):
             return HttpResponse(status=404)
         
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Set appropriate content type
-        content_type = 'video/mp4' if format_type == 'mp4' else 'audio/mpeg'
-        
-        response = HttpResponse(status=200)
-        response['Content-Length'] = str(file_size)
-        response['Content-Type'] = content_type
-        response['Accept-Ranges'] = 'bytes'
-        return response
+        return self.stream_file(request, file_path, filename, format_type)
 
     def get(self, request, video_id: int, format_type: str):
         """Stream file download with chunked response using StreamingHttpResponse"""
@@ -98,37 +91,17 @@ class VideoDownloadView(View):
             return self.stream_extracted_audio(file_path, filename)
         
         # Direct file streaming
-        return self.stream_file(file_path, filename, format_type)
+        return self.stream_file(request, file_path, filename, format_type)
 
-    def stream_file(self, file_path: str, filename: str, format_type: str):
-        """Stream file directly with StreamingHttpResponse for memory efficiency"""
-        from django.http import StreamingHttpResponse
-        
-        file_size = os.path.getsize(file_path)
+    def stream_file(self, request, file_path: str, filename: str, format_type: str):
+        """Send the file zero-copy (os.sendfile / X-Accel-Redirect), with Range and HEAD support"""
         content_type = 'video/mp4' if format_type == 'mp4' else 'audio/mpeg'
-        
-        def file_iterator(chunk_size=8192):
-            """Generator that yields file chunks without loading entire file into memory"""
-            try:
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        yield chunk
-            except IOError as e:
-                print(f"Error reading file {file_path}: {e}")
-                yield b''
-        
-        response = StreamingHttpResponse(
-            file_iterator(),
-            content_type=content_type
+        return serve_file(
+            request, file_path, content_type,
+            filename=filename, as_attachment=True,
+            headers={'Cache-Control': 'no-cache'},
+            stream=self.file_stream,
         )
-        response['Content-Length'] = str(file_size)
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response['Accept-Ranges'] = 'bytes'
-        response['Cache-Control'] = 'no-cache'
-        return response
 
     def stream_extracted_audio(self, video_path: str, original_filename: str):
         """Extract audio from video and stream as MP3 using StreamingHttpResponse"""
@@ -182,8 +155,12 @@ class VideoDownloadView(View):
             # Generate appropriate filename for MP3
             mp3_filename = os.path.splitext(original_filename)[0] + '.mp3'
             
+            if self.file_stream is not None:
+                body = self.file_stream(temp_audio_path, 0, file_size, delete=True)
+            else:
+                body = audio_iterator()
             response = StreamingHttpResponse(
-                audio_iterator(),
+                body,
                 content_type='audio/mpeg'
             )
             response['Content-Length'] = str(file_size)
@@ -1,5 +1,5 @@
 from django.views import View
-from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.http import JsonResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 import json
@@ -9,6 +9,7 @@ import os
 import mimetypes
 from ..tasks import export_queue, export_task_status, export_update_status
 from ..models import Video
+from .range_serving import serve_file
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ExportTaskAddView(View):
@@ -164,7 +165,9 @@ class RetryExportTaskView(View):
 
 class ExportedVideoDownloadView(View):
     """Download exported video file"""
-    
+    # Body factory for serve_file; the async variant streams with range_serving.aiter_file
+    file_stream = None
+
     def get(self, request, task_id):
         if task_id not in export_task_status:
             raise Http404("Task does not exist")
@@ -183,66 +186,9 @@ class ExportedVideoDownloadView(View):
             raise Http404("File does not exist")
         
         # Get file information
-        file_size = os.path.getsize(file_path)
         content_type, encoding = mimetypes.guess_type(file_path)
         if not content_type:
             content_type = 'video/mp4'
         
-        # Handle Range requests (for supporting resume and video player seek)
-        range_header = request.headers.get('Range')
-        if range_header:
-            import re
-            # Parse Range request header
-            range_match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-            if range_match:
-                start = int(range_match.group(1))
-                end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
-                
-                if end >= file_size:
-                    end = file_size - 1
-                
-                length = end - start + 1
-                
-                # Create partial response
-                def file_iterator(file_path, start, length, chunk_size=8192):
-                    with open(file_path, 'rb') as f:
-                        f.seek(start)
-                        remaining = length
-                        while remaining > 0:
-                            chunk_size = min(chunk_size, remaining)
-                            chunk = f.read(chunk_size)
-                            if not chunk:
-                                break
-                            remaining -= len(chunk)
-                            yield chunk
-                
-                response = StreamingHttpResponse(
-                    file_iterator(file_path, start, length),
-                    status=206,  # Partial Content
-                    content_type=content_type
-                )
-                response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
-                response['Content-Length'] = str(length)
-                response['Accept-Ranges'] = 'bytes'
-                
-                return response
-        
-        # Normal complete file download
-        def file_iterator(file_path, chunk_size=8192):
-            with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    yield chunk
-        
-        response = StreamingHttpResponse(
-            file_iterator(file_path),
-            content_type=content_type
-        )
-        
-        response['Content-Length'] = str(file_size)
-        response['Accept-Ranges'] = 'bytes'
-        response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
-        
-        return response
\ No newline at end of file
+        # Range requests (resume and video player seek) and HEAD, sent zero-copy
+        return serve_file(request, file_path, content_type, as_attachment=True, stream=self.file_stream)
@@ -0,0 +1,142 @@
+# views/http_cache.py
+"""
+HTTP validators and cache policy for media, thumbnails and waveform JSON.
+
+- Saved videos/audio are named by the MD5 of their content, so the name is a strong ETag
+  and the response can be cached forever (`immutable`)
+- Other assets keep a stable name while their content may change (a thumbnail is overwritten
+  when the user uploads a new one), so they get a strong ETag from a hash of the bytes and
+  `no-cache`: the client keeps its copy and revalidates, and an unchanged file costs a 304
+- Content hashes are memoized per file version (size + mtime), so a 304 does not re-read the file
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+
+HASH_CHUNK = 1024 * 1024
+HASH_MAX_BYTES = 64 * 1024 * 1024   # larger files without a hash name only get Last-Modified
+MEMO_ENTRIES = 4096
+
+_MD5_NAME_RE = re.compile(r'^[0-9a-f]{32}$')
+
+_lock = threading.Lock()
+_etags = OrderedDict()   # path -> (size, mtime_ns, etag)
+
+
+def is_content_addressed(path):
+    """True when the file name (without extension) is an MD5 content hash"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return bool(_MD5_NAME_RE.match(stem))
+
+
+def name_etag(path, stat):
+    """Strong ETag for a content-addressed file: its MD5 name plus its size"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f'"{stem}-{stat.st_size:x}"'
+
+
+def content_etag(path, stat=None):
+    """Strong ETag from an MD5 of the file bytes, computed once per file version"""
+    stat = stat or os.stat(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _etags.get(path)
+        if cached is not None and cached[:2] == version:
+            _etags.move_to_end(path)
+            return cached[2]
+
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()}"'
+
+    with _lock:
+        _etags[path] = (*version, etag)
+        _etags.move_to_end(path)
+        while len(_etags) > MEMO_ENTRIES:
+            _etags.popitem(last=False)
+    return etag
+
+
+def file_validators(path, content_addressed=False):
+    """
+    (etag, cache_control) for a file about to be served
+    content_addressed: the directory only holds files named by the MD5 of their content and
+    never rewrites them (saved_video, saved_audio); other files are revalidated on every use
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    if content_addressed and is_content_addressed(path):
+        return name_etag(path, stat), IMMUTABLE
+    if stat.st_size <= HASH_MAX_BYTES:
+        return content_etag(path, stat), REVALIDATE
+    return None, REVALIDATE
+
+
+def validator_headers(etag=None, last_modified=None, cache_control=None):
+    headers = {}
+    if etag:
+        headers['ETag'] = etag
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    return headers
+
+
+def conditional_response(request, etag=None, last_modified=None, headers=None):
+    """
+    304 (or 412) response when the request's preconditions say so, otherwise None
+    headers: validators and other headers a 304 must repeat (ETag, Cache-Control, CORS...)
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        return None
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def if_range_matches(request, etag=None, last_modified=None):
+    """
+    Whether a Range request may be honoured under If-Range: the validator must match
+    exactly (strong ETag comparison or the same Last-Modified); otherwise send the full file
+    """
+    value = (request.headers.get('If-Range') or '').strip()
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        return bool(etag) and not etag.startswith('W/') and value == etag
+    parsed = parse_http_date_safe(value)
+    return parsed is not None and last_modified is not None and parsed == last_modified
+
+
+def cached_json_response(request, data, cache_control=REVALIDATE, **kwargs):
+    """JsonResponse with a strong ETag over the body; answers 304 when the client copy is current"""
+    return with_content_etag(request, JsonResponse(data, **kwargs), cache_control)
+
+
+def with_content_etag(request, response, cache_control=REVALIDATE):
+    """Add a strong ETag over an in-memory response body, or answer 304 in its place"""
+    if response.status_code != 200:
+        return response
+    etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+    headers = validator_headers(etag, cache_control=cache_control)
+    not_modified = conditional_response(request, etag=etag, headers=headers)
+    if not_modified is not None:
+        return not_modified
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -1,71 +1,37 @@
 # This file is for serve media
-from django.http import JsonResponse,HttpResponse,HttpResponseNotAllowed,HttpResponseNotFound,Http404,FileResponse
-from django.http import StreamingHttpResponse
+from django.http import JsonResponse,HttpResponse,HttpResponseNotAllowed,HttpResponseNotFound,HttpResponseRedirect,Http404
 from ..models import Category, Video
 from django.views import View
 from django.conf import settings  # Ensure this is at the top
 from django.shortcuts import get_object_or_404,render
 from django.urls import reverse
 from urllib.parse import unquote
-from django.views.static import serve
 import json 
 import os
 import mimetypes
-import subprocess
+
+from ..services.media_metadata import get_media_info, guess_mime_type
+from .range_serving import serve_file
+from .http_cache import IMMUTABLE, file_validators
+from ..services.hls_packaging import ensure_segment
+from ..services.thumbnail_variants import VARIANT_RE, resolve_variant
 
 def detect_video_codec(file_path):
     """
-    Detect video codec using ffprobe to determine if it's AV1
-    Returns the appropriate MIME type with codec information
+    Return the appropriate MIME type with codec information (e.g. AV1, HEVC)
+    Read from the media metadata cache, so ffprobe runs once per file version
+    instead of on every (Range) request
     """
-    try:
-        # Use ffprobe to detect video codec
-        result = subprocess.run([
-            'ffprobe', '-v', 'quiet', '-select_streams', 'v:0',
-            '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', file_path
-        ], capture_output=True, text=True, timeout=10)
-        
-        if result.returncode == 0:
-            codec = result.stdout.strip()
-            
-            # Get container format
-            base_mime_type, _ = mimetypes.guess_type(file_path)
-            
-            if codec == 'av1':
-                if base_mime_type == 'video/mp4':
-                    return 'video/mp4; codecs="av01.0.08M.08"'
-                elif base_mime_type == 'video/webm':
-                    return 'video/webm; codecs="av01.0.08M.08"'
-                else:
-                    # For other containers with AV1, still specify the codec
-                    return f'{base_mime_type or "video/mp4"}; codecs="av01.0.08M.08"'
-            elif codec == 'h264':
-                if base_mime_type == 'video/mp4':
-                    return 'video/mp4; codecs="avc1.42E01E, mp4a.40.2"'
-                return base_mime_type or 'video/mp4'
-            elif codec == 'hevc':
-                if base_mime_type == 'video/mp4':
-                    # Use more generic HEVC codec string for better browser compatibility
-                    return 'video/mp4; codecs="hvc1"'
-                return base_mime_type or 'video/mp4'
-            elif codec == 'vp9':
-                return 'video/webm; codecs="vp9"'
-            elif codec == 'vp8':
-                return 'video/webm; codecs="vp8"'
-            else:
-                # Unknown codec, return basic MIME type
-                return base_mime_type or 'application/octet-stream'
-        else:
-            # ffprobe failed, fall back to basic MIME type detection
-            content_type, _ = mimetypes.guess_type(file_path)
-            return content_type or 'application/octet-stream'
-            
-    except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
+    info = get_media_info(file_path)
+    if info is None or not info.mime_type:
         # ffprobe not available or failed, fall back to basic MIME type detection
-        content_type, _ = mimetypes.guess_type(file_path)
-        return content_type or 'application/octet-stream'
+        return guess_mime_type(file_path)
+    return info.mime_type
 
 class MediaActionView(View):
+    # Body factory for serve_file; AsyncMediaActionView streams with range_serving.aiter_file
+    file_stream = None
+
     def dispatch(self, request, *args, **kwargs):
         self.type = kwargs.pop('type', None)
         print(self.type)
@@ -99,7 +65,7 @@ class MediaActionView(View):
             return self.serve_audio(request, filename)
         
         return HttpResponseNotAllowed(['GET'])
-    # Memory-efficient chunked streaming for large video files
+    # Zero-copy range serving for large video files
     def serve_video(self, request, filename):
         file_path = os.path.join(settings.MEDIA_ROOT, "saved_video", filename)
     
@@ -127,183 +93,49 @@ class MediaActionView(View):
                 print(f"[MediaActionView] Invalid time parameter: {time_param}")
                 initial_seek_time = None
         
-        # Memory limit configuration
-        CHUNK_SIZE = 8192 * 8  # 64KB chunks - adjust based on your needs
+        # Cap per Range request so one seek does not occupy a worker for the whole file
         MAX_RANGE_SIZE = 100 * 1024 * 1024  # Max 100MB per range request
         
         print(f"[MediaActionView] Serving video: {filename}")
         print(f"[MediaActionView] Detected content type: {content_type}")
         print(f"[MediaActionView] File size: {file_size} bytes")
 
-        # Handle range requests for video seeking
-        range_header = request.headers.get('Range', None)
-        if range_header:
-            import re
-            
-            # Parse range header
-            match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-            if not match:
-                # Invalid range header
-                response = HttpResponse(status=416)
-                response['Content-Range'] = f'bytes */{file_size}'
-                return response
-                
-            first_byte, last_byte = match.groups()
-            first_byte = int(first_byte)
-            last_byte = int(last_byte) if last_byte else file_size - 1
-            
-            if last_byte >= file_size:
-                last_byte = file_size - 1
-            
-            if first_byte > last_byte or first_byte < 0:
-                response = HttpResponse(status=416)
-                response['Content-Range'] = f'bytes */{file_size}'
-                return response
-            
-            length = last_byte - first_byte + 1
-            
-            # Limit range size to prevent excessive memory usage
-            if length > MAX_RANGE_SIZE:
-                last_byte = first_byte + MAX_RANGE_SIZE - 1
-                length = MAX_RANGE_SIZE
-            
-            # Generator function for chunked reading
-            def file_iterator():
-                with open(file_path, 'rb') as f:
-                    f.seek(first_byte)
-                    remaining = length
-                    while remaining > 0:
-                        chunk_size = min(CHUNK_SIZE, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-            
-            # Create streaming response with chunked data
-            response = StreamingHttpResponse(
-                file_iterator(),
-                status=206,
-                content_type=content_type
-            )
-            response['Content-Range'] = f'bytes {first_byte}-{last_byte}/{file_size}'
-            response['Content-Length'] = str(length)
-            response['Accept-Ranges'] = 'bytes'
+        headers = {
             # Add CORS headers
-            response['Access-Control-Allow-Origin'] = '*'
-            response['Access-Control-Allow-Headers'] = 'Range'
-            response['Access-Control-Expose-Headers'] = 'Content-Range, Content-Length, Accept-Ranges, X-Initial-Time'
-            
-            # Add initial seek time header if specified in query params
-            if initial_seek_time is not None:
-                response['X-Initial-Time'] = str(initial_seek_time)
-            
-            return response
-        else:
-            # Regular full file response with chunked streaming
-            def file_iterator():
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(CHUNK_SIZE)
-                        if not chunk:
-                            break
-                        yield chunk
-            
-            response = StreamingHttpResponse(
-                file_iterator(),
-                content_type=content_type
-            )
-            response['Content-Length'] = str(file_size)
-            response['Accept-Ranges'] = 'bytes'
-            # Add CORS headers
-            response['Access-Control-Allow-Origin'] = '*'
-            response['Access-Control-Allow-Headers'] = 'Range'
-            response['Access-Control-Expose-Headers'] = 'Content-Range, Content-Length, Accept-Ranges, X-Initial-Time'
-            
-            # Add initial seek time header if specified in query params
-            if initial_seek_time is not None:
-                response['X-Initial-Time'] = str(initial_seek_time)
-            
-            return response
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Range',
+            'Access-Control-Expose-Headers': 'Content-Range, Content-Length, Accept-Ranges, X-Initial-Time',
+        }
+        # Add initial seek time header if specified in query params
+        if initial_seek_time is not None:
+            headers['X-Initial-Time'] = str(initial_seek_time)
+
+        # Hash-named file: strong ETag from the name, cached as immutable
+        etag, cache_control = file_validators(file_path, content_addressed=True)
 
-    # Memory-efficient chunked streaming for audio files  
+        # Zero-copy range serving (os.sendfile / X-Accel-Redirect), handles Range, HEAD and 304s
+        return serve_file(request, file_path, content_type, max_range=MAX_RANGE_SIZE, headers=headers,
+                          etag=etag, cache_control=cache_control, stream=self.file_stream)
+
+    # Zero-copy range serving for audio files
     def serve_audio(self, request, filename):
         """
-        Stream an audio file from MEDIA_ROOT/saved_audio/{filename}, with full
-        Range-header support and memory-efficient chunked streaming.
+        Serve an audio file from MEDIA_ROOT/saved_audio/{filename}, with
+        Range-header support and zero-copy sending.
         """
         file_path = os.path.join(settings.MEDIA_ROOT, "saved_audio", filename)
 
         if not os.path.exists(file_path):
             raise Http404("File not found")
 
-        file_size = os.path.getsize(file_path)
         content_type, _ = mimetypes.guess_type(file_path)
         content_type = content_type or "application/octet-stream"
         
-        # Memory limit configuration  
-        CHUNK_SIZE = 8192 * 4  # 32KB chunks for audio
         MAX_RANGE_SIZE = 10 * 1024 * 1024  # Max 10MB per range request
 
-        range_header = request.headers.get("Range")
-        if range_header:
-            import re
-            m = re.match(r"bytes=(\d+)-(\d*)", range_header)
-            if m:
-                first_byte = int(m.group(1))
-                last_byte = int(m.group(2) or file_size - 1)
-
-                if last_byte >= file_size:
-                    last_byte = file_size - 1
-                    
-                if first_byte > last_byte or first_byte < 0:
-                    response = HttpResponse(status=416)
-                    response['Content-Range'] = f'bytes */{file_size}'
-                    return response
-
-                length = last_byte - first_byte + 1
-                
-                # Limit range size to prevent excessive memory usage
-                if length > MAX_RANGE_SIZE:
-                    last_byte = first_byte + MAX_RANGE_SIZE - 1
-                    length = MAX_RANGE_SIZE
-                
-                # Generator function for chunked reading
-                def audio_iterator():
-                    with open(file_path, "rb") as f:
-                        f.seek(first_byte)
-                        remaining = length
-                        while remaining > 0:
-                            chunk_size = min(CHUNK_SIZE, remaining)
-                            chunk = f.read(chunk_size)
-                            if not chunk:
-                                break
-                            remaining -= len(chunk)
-                            yield chunk
-
-                response = StreamingHttpResponse(
-                    audio_iterator(),
-                    status=206,
-                    content_type=content_type,
-                )
-                response["Content-Range"] = f"bytes {first_byte}-{last_byte}/{file_size}"
-                response["Accept-Ranges"] = "bytes"
-                response["Content-Length"] = str(length)
-                return response
-
-        # No Range header: send entire file with chunked streaming
-        def audio_iterator():
-            with open(file_path, "rb") as f:
-                while True:
-                    chunk = f.read(CHUNK_SIZE)
-                    if not chunk:
-                        break
-                    yield chunk
-                    
-        response = StreamingHttpResponse(audio_iterator(), content_type=content_type)
-        response["Content-Length"] = str(file_size)
-        response["Accept-Ranges"] = "bytes"
-        return response    
+        etag, cache_control = file_validators(file_path, content_addressed=True)
+        return serve_file(request, file_path, content_type, max_range=MAX_RANGE_SIZE,
+                          etag=etag, cache_control=cache_control, stream=self.file_stream)
 
     from django.views.decorators.http import require_http_methods
     from django.utils.http import http_date
@@ -328,6 +160,13 @@ class MediaActionView(View):
         
         if not file_path.startswith(hls_dir):
             raise Http404('Invalid file path')
+
+        # Lazy streams cut segments on first request (and keep them in an LRU disk cache)
+        if relpath.endswith('.ts'):
+            try:
+                ensure_segment(hls_dir, relpath)
+            except Exception as e:
+                print(f"[MediaActionView] Failed to generate HLS segment {filename}: {e}")
         
         if not os.path.exists(file_path):
             raise Http404(f'File not found: {relpath}')
@@ -341,36 +180,47 @@ class MediaActionView(View):
             if not content_type:
                 content_type = 'application/octet-stream'
         
-        try:
-            response = FileResponse(
-                open(file_path, 'rb'),
-                content_type=content_type,
-                as_attachment=False
-            )
-            
-            # Add CORS headers for HLS streaming
-            response['Access-Control-Allow-Origin'] = '*'
-            response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-            response['Access-Control-Allow-Headers'] = 'Range, Content-Type'
-            response['Access-Control-Expose-Headers'] = 'Content-Length, Content-Range'
-            
-            # Add caching headers
-            if relpath.endswith('.ts'):
-                response['Cache-Control'] = 'public, max-age=31536000'  # 1 year
-            elif relpath.endswith('.m3u8'):
-                response['Cache-Control'] = 'public, max-age=10'
-            
-            return response
-            
-        except IOError:
-            raise Http404('Cannot read file')
+        # Add CORS headers for HLS streaming
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, HEAD, OPTIONS',
+            'Access-Control-Allow-Headers': 'Range, Content-Type',
+            'Access-Control-Expose-Headers': 'Content-Length, Content-Range',
+        }
+
+        # Add caching headers
+        cache_control = None
+        if relpath.endswith('.ts'):
+            cache_control = 'public, max-age=31536000'  # 1 year
+        elif relpath.endswith('.m3u8'):
+            cache_control = 'public, max-age=10'
+
+        return serve_file(request, file_path, content_type, headers=headers,
+                          cache_control=cache_control, stream=self.file_stream)
     def serve_img(self,request, filename):
+        if VARIANT_RE.match(filename):
+            return self.serve_thumbnail_variant(request, filename)
         file_path = os.path.join(settings.MEDIA_ROOT, "thumbnail", filename)
         if not os.path.exists(file_path):
             from django.http import Http404
             raise Http404("File not found")
-        # Serve the image file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        # Trickplay sprites live under a key derived from the video hash and never change;
+        # thumbnails keep their name when a custom one is uploaded, so they are revalidated (304)
+        return self.serve_asset(request, file_path, immutable=filename.startswith('trickplay/'))
+
+    def serve_thumbnail_variant(self, request, filename):
+        """
+        Serve a resized WebP/JPEG thumbnail "<width>/<name>.<version>.<fmt>", generated on first request
+        The version is a hash of the source thumbnail, so the response is immutable; a URL for a
+        replaced thumbnail redirects to the current version
+        """
+        resolved = resolve_variant(filename)
+        if resolved is None:
+            raise Http404("Thumbnail not found")
+        file_path, current = resolved
+        if current != filename:
+            return HttpResponseRedirect(request.path[:len(request.path) - len(filename)] + current)
+        return self.serve_asset(request, file_path, immutable=True)
 
     def serve_screenshot(self, request, filename):
         """
@@ -381,7 +231,7 @@ class MediaActionView(View):
             from django.http import Http404
             raise Http404("Screenshot file not found")
         # Serve the screenshot image file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        return self.serve_asset(request, file_path)
 
     def serve_note_image(self, request, filename):
         """
@@ -392,7 +242,7 @@ class MediaActionView(View):
             from django.http import Http404
             raise Http404("Note image file not found")
         # Serve the note image file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        return self.serve_asset(request, file_path)
 
     def serve_attachments(self, request, filename):
         """
@@ -404,4 +254,15 @@ class MediaActionView(View):
             from django.http import Http404
             raise Http404("Attachment file not found")
         # Serve the attachment file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        return self.serve_asset(request, file_path)
+
+    def serve_asset(self, request, file_path, immutable=False):
+        """
+        Serve a small media asset with a strong content ETag and Last-Modified;
+        the client revalidates each use and gets a 304 while the file is unchanged
+        (immutable: the file never changes under this name, cache it for a year)
+        """
+        etag, cache_control = file_validators(file_path)
+        if immutable:
+            cache_control = IMMUTABLE
+        return serve_file(request, file_path, etag=etag, cache_control=cache_control, stream=self.file_stream)
@@ -19,8 +19,9 @@ from django.views.decorators.csrf import csrf_exempt
 
 import cv2
 import numpy as np
-from openai import OpenAI
 
+from utils.llm_cache import get_llm_cache
+from utils.llm_gateway import get_llm_gateway
 from ..models import Video
 
 
@@ -185,25 +186,32 @@ def analyze_subtitles(
     """
     使用 LLM 分析字幕内容，生成结构化笔记
     """
-    client = OpenAI(
-        api_key=api_key,
-        base_url=base_url if base_url else "https://api.openai.com/v1"
-    )
-
+    base_url = base_url if base_url else "https://api.openai.com/v1"
     system_prompt = get_system_prompt(style)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"请分析以下字幕内容并生成结构化笔记：\n\n{subtitle_text}"}
+    ]
+    temperature = 0.3
+    cache = get_llm_cache()
+    content = ""
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"请分析以下字幕内容并生成结构化笔记：\n\n{subtitle_text}"}
-            ],
-            temperature=0.3,
-            max_tokens=4096
-        )
-
-        content = response.choices[0].message.content.strip()
+        cached = cache.get(messages, model, temperature, base_url)
+        if cached is not None:
+            print("笔记分析结果命中LLM缓存")
+            raw_content = cached
+        else:
+            raw_content = get_llm_gateway().chat(
+                messages,
+                model=model,
+                api_key=api_key,
+                base_url=base_url,
+                temperature=temperature,
+                max_tokens=4096
+            )
+
+        content = raw_content.strip()
         
         # 尝试提取JSON部分
         json_match = re.search(r'\[.*\]', content, re.DOTALL)
@@ -211,6 +219,8 @@ def analyze_subtitles(
             content = json_match.group(0)
         
         result = json.loads(content)
+        if cached is None and result:
+            cache.set(messages, model, temperature, base_url, raw_content)
         return result
         
     except json.JSONDecodeError as e:
@@ -1,6 +1,7 @@
 """
 Views for standalone audio/HLS conversion endpoints.
 """
+import json
 import os
 
 from django.http import JsonResponse, HttpRequest
@@ -13,9 +14,11 @@ from ..services.audio_processing import (
     get_video_file_paths,
     detect_video_audio_format,
     extract_audio_from_video_file,
-    extract_hls_from_video_file,
+    is_hls_compatible,
 )
+from ..services.hls_packaging import create_lazy_stream
 from ..models import Video
+from ..tasks import hls_queue, hls_task_status, abr_queue, abr_task_status
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -54,19 +57,93 @@ class ConvertAudioView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ConvertHLSView(View):
-    """Convert a video file to HLS (m3u8+ts) and update the DB with HLS path."""
+    """
+    Make a video streamable as HLS (m3u8+ts).
+
+    mode "lazy" (default): the playlist is written from keyframe positions and returned at once;
+    segments are cut on first request. mode "full": packaging is queued as a background task,
+    poll convert-hls/<video_id>/status for progress.
+    """
     http_method_names = ['post']
 
     def post(self, request: HttpRequest, video_id: int, *args, **kwargs):
-        video = get_object_or_404(Video, pk=video_id)
+        get_object_or_404(Video, pk=video_id)
         _, video_path, _ = get_video_file_paths(video_id)
+        try:
+            data = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            data = {}
+        mode = data.get('mode', 'lazy')
 
-        ok, err, rel_dir = extract_hls_from_video_file(video_path)
+        if not os.path.exists(video_path):
+            return JsonResponse({'success': False, 'error': 'not found'}, status=404)
+        ok, msg = is_hls_compatible(video_path)
         if not ok:
-            return JsonResponse(
-                {'success': False, 'error': err or 'HLS conversion failed'},
-                status=500,
-            )
+            return JsonResponse({'success': False, 'error': msg}, status=400)
+
+        if mode == 'full':
+            task = hls_task_status.get(video_id)
+            if task is None or task['status'] in ('Completed', 'Failed'):
+                # Initialize task status and add to queue
+                hls_task_status[video_id].update({
+                    "status": "Queued",
+                    "progress": 0,
+                    "hls_path": "",
+                    "error_message": "",
+                })
+                hls_queue.put(video_id)
+            return JsonResponse({'success': True, 'mode': 'full', 'data': hls_task_status[video_id]}, status=202)
+
+        try:
+            rel_dir = create_lazy_stream(video_path)
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e) or 'HLS conversion failed'}, status=500)
+        return JsonResponse({'success': True, 'mode': 'lazy', 'hls_path': rel_dir})
+
+
+class HLSStatusView(View):
+    """Progress of the background HLS packaging task of a video."""
+    http_method_names = ['get']
+
+    def get(self, request: HttpRequest, video_id: int, *args, **kwargs):
+        if video_id not in hls_task_status:
+            return JsonResponse({'success': False, 'message': 'Task does not exist'}, status=404)
+        return JsonResponse({'success': True, 'data': hls_task_status[video_id]})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ConvertABRView(View):
+    """
+    Queue multi-rendition (ABR) HLS packaging: a ladder of resolutions plus audio-only,
+    with a master playlist. Runs as a low-priority background task; poll
+    convert-abr/<video_id>/status for progress and the master playlist path.
+    """
+    http_method_names = ['post']
+
+    def post(self, request: HttpRequest, video_id: int, *args, **kwargs):
+        get_object_or_404(Video, pk=video_id)
+        _, video_path, _ = get_video_file_paths(video_id)
+        if not os.path.exists(video_path):
+            return JsonResponse({'success': False, 'error': 'not found'}, status=404)
+
+        task = abr_task_status.get(video_id)
+        if task is None or task['status'] in ('Completed', 'Failed'):
+            # Initialize task status and add to queue
+            abr_task_status[video_id].update({
+                "status": "Queued",
+                "progress": 0,
+                "master_playlist": "",
+                "error_message": "",
+            })
+            abr_queue.put(video_id)
+        return JsonResponse({'success': True, 'data': abr_task_status[video_id]}, status=202)
+
+
+class ABRStatusView(View):
+    """Progress of the background ABR packaging task of a video."""
+    http_method_names = ['get']
 
-        video.save(update_fields=['url'])
-        return JsonResponse({'success': True, 'hls_path': rel_dir})
+    def get(self, request: HttpRequest, video_id: int, *args, **kwargs):
+        if video_id not in abr_task_status:
+            return JsonResponse({'success': False, 'message': 'Task does not exist'}, status=404)
+        return JsonResponse({'success': True, 'data': abr_task_status[video_id]})
@@ -0,0 +1,229 @@
+# views/range_serving.py
+"""
+Unified file serving with single-range and HEAD support.
+
+The body is a FileResponse over a range-limited file object:
+- under gunicorn, wsgi.file_wrapper hands the file descriptor to os.sendfile, so the kernel copies
+  the requested range straight to the socket and no byte passes through Python
+- other servers (runserver, ASGI) fall back to reading the range in FileResponse.block_size chunks
+
+With settings.MEDIA_SENDFILE_MODE set, the response only carries a header and the fronting server
+sends the file itself (and handles Range/HEAD):
+- 'x-accel-redirect': nginx, using the internal locations in settings.MEDIA_ACCEL_LOCATIONS
+- 'x-sendfile': Apache mod_xsendfile / lighttpd, using the absolute path
+
+Under ASGI the views pass stream=aiter_file: the body is an async iterator whose reads run on a
+small dedicated thread pool, so a slow client only holds a suspended coroutine, not a worker thread
+(a sync file body would make Django's ASGI handler read the whole file into memory first).
+
+Every response carries Last-Modified (and the ETag/Cache-Control passed in); conditional requests
+are answered with 304/412 before any file is opened, and If-Range falls back to the full file
+when the client's copy is stale.
+"""
+import asyncio
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from .http_cache import conditional_response, if_range_matches, validator_headers
+
+_RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.IGNORECASE)
+
+ASYNC_CHUNK_SIZE = 256 * 1024
+_read_pool = None
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header ("bytes=a-b", "bytes=a-", "bytes=-n")
+    Returns (start, end) inclusive, or None when the header should be ignored
+    (missing, malformed or multiple ranges: the full file is served with 200)
+    Raises RangeNotSatisfiable when the range lies outside the file
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header)
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class RangeFile:
+    """
+    Read-only file limited to [start, start + length)
+    Unbuffered, so the descriptor offset is exactly `start` when the server calls
+    os.sendfile(fileno) with the Content-Length as byte count
+    """
+    def __init__(self, path, start, length):
+        self._file = open(path, 'rb', buffering=0)
+        self._file.seek(start)
+        self._remaining = length
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        size = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def _get_read_pool():
+    global _read_pool
+    if _read_pool is None:
+        workers = getattr(settings, 'MEDIA_ASYNC_READ_THREADS', 0) or 8
+        _read_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-read')
+    return _read_pool
+
+
+async def aiter_file(path, start, length, chunk_size=ASYNC_CHUNK_SIZE, delete=False):
+    """
+    Async body for [start, start + length) of `path`
+    Each read runs on the media read pool; between reads the coroutine waits on the client,
+    so the number of concurrent streams is not bounded by threads
+    delete: remove the file once it has been sent (or the client went away)
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_read_pool()
+    f = await loop.run_in_executor(pool, open, path, 'rb', 0)
+    try:
+        await loop.run_in_executor(pool, f.seek, start)
+        remaining = length
+        while remaining > 0:
+            data = await loop.run_in_executor(pool, f.read, min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        f.close()
+        if delete:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def _accel_location(path):
+    """Internal nginx URL for `path`, or None if it is not under a configured location"""
+    path = os.path.abspath(path)
+    for root, prefix in getattr(settings, 'MEDIA_ACCEL_LOCATIONS', {}).items():
+        root = os.path.abspath(str(root))
+        if path.startswith(root + os.sep):
+            relpath = os.path.relpath(path, root).replace(os.sep, '/')
+            return prefix.rstrip('/') + '/' + quote(relpath)
+    return None
+
+
+def _offload(path, content_type):
+    """Response that lets the fronting server send the file, or None to serve it ourselves"""
+    mode = (getattr(settings, 'MEDIA_SENDFILE_MODE', '') or '').lower()
+    if mode == 'x-accel-redirect':
+        location = _accel_location(path)
+        if location is None:
+            return None
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = location
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = os.path.abspath(path)
+        return response
+    return None
+
+
+def serve_file(request, path, content_type=None, *, filename=None, as_attachment=False,
+               max_range=None, headers=None, etag=None, cache_control=None, stream=None):
+    """
+    Serve `path` with Range (single range), HEAD and conditional request support
+    max_range: cap on the bytes returned for one Range request; the client asks for the rest
+    headers: extra response headers (CORS, ...), also sent on 304
+    etag: strong validator for the current file content (see http_cache)
+    cache_control: Cache-Control value, e.g. http_cache.IMMUTABLE or http_cache.REVALIDATE
+    stream: body factory stream(path, start, length) for async views (aiter_file); default is
+    a FileResponse sent with os.sendfile under WSGI
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404("File not found")
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    if content_type is None:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    cache_headers = validator_headers(etag, last_modified, cache_control)
+    not_modified = conditional_response(request, etag, last_modified, {**cache_headers, **(headers or {})})
+    if not_modified is not None:
+        return not_modified
+
+    response = _offload(path, content_type)
+    if response is None:
+        range_header = request.headers.get('Range')
+        if range_header and not if_range_matches(request, etag, last_modified):
+            range_header = None
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+        if byte_range is None:
+            start, end, status = 0, size - 1, 200
+        else:
+            start, end = byte_range
+            if max_range and end - start + 1 > max_range:
+                end = start + max_range - 1
+            status = 206
+        length = max(0, end - start + 1)
+
+        if request.method == 'HEAD':
+            response = HttpResponse(status=status, content_type=content_type)
+        elif stream is not None:
+            response = StreamingHttpResponse(stream(path, start, length), status=status, content_type=content_type)
+        else:
+            response = FileResponse(RangeFile(path, start, length), status=status, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        if status == 206:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    if filename or as_attachment:
+        disposition = content_disposition_header(as_attachment, filename or os.path.basename(path))
+        if disposition:
+            response['Content-Disposition'] = disposition
+    for name, value in {**cache_headers, **(headers or {})}.items():
+        response[name] = value
+    return response
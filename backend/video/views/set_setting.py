@@ -5,8 +5,8 @@ from django.views import View
 from django.http import JsonResponse, HttpRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from openai import OpenAI
 import json
+from utils.llm_gateway import get_llm_gateway
 from utils.wsr.transcription_engine import TranscriptionEngineFactory 
 
 
@@ -20,6 +20,9 @@ def _ensure_ini():
         cfg['DEFAULT'] = {
             'selected_model_provider': 'deepseek',
             'enable_thinking': 'true',
+            'translation_single_call': 'false',
+            'translation_memory': 'true',
+            'local_segmentation': 'true',
             'use_proxy': 'false',
             'deepseek_api_key': '',
             'deepseek_base_url': 'https://api.deepseek.com',
@@ -173,18 +176,6 @@ def save_all_settings(settings_dict: dict):
         cfg.write(fp)
 
 
-client = None
-
-
-def _init_client(api_key: str, base_url: str):
-    """(Re)initialise global OpenAI client instance."""
-    global client
-    if api_key and base_url:
-        client = OpenAI(api_key=api_key, base_url=base_url)
-    else:
-        client = None
-
-
 @method_decorator(csrf_exempt, name='dispatch')
 class ConfigAPIView(View):
     """API endpoints for getting and setting all configuration."""
@@ -213,30 +204,6 @@ class ConfigAPIView(View):
             
             save_all_settings(settings_dict)
             
-            # Update OpenAI client if API settings changed
-            if 'DEFAULT' in settings_dict:
-                cfg = settings_dict['DEFAULT']
-                selected_provider = cfg.get('selected_model_provider', 'deepseek')
-                
-                # Get provider-specific API key and base URL
-                if selected_provider == 'deepseek':
-                    api_key = cfg.get('deepseek_api_key', '')
-                    base_url = cfg.get('deepseek_base_url', 'https://api.deepseek.com')
-                elif selected_provider == 'openai':
-                    api_key = cfg.get('openai_api_key', '')
-                    base_url = cfg.get('openai_base_url', 'https://api.openai.com/v1')
-                elif selected_provider == 'glm':
-                    api_key = cfg.get('glm_api_key', '')
-                    base_url = cfg.get('glm_base_url', 'https://open.bigmodel.cn/api/paas/v4')
-                elif selected_provider == 'qwen':
-                    api_key = cfg.get('qwen_api_key', '')
-                    base_url = cfg.get('qwen_base_url', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
-                else:
-                    api_key = cfg.get('deepseek_api_key', '')
-                    base_url = cfg.get('deepseek_base_url', 'https://api.deepseek.com')
-                
-                _init_client(api_key, base_url)
-            
             return JsonResponse({'success': True, 'message': 'Settings updated successfully'})
             
         except json.JSONDecodeError:
@@ -323,17 +290,17 @@ class LLMTestAPIView(View):
             if not api_key or not base_url:
                 return JsonResponse({'success': False, 'error': f'API key or base URL not configured for provider: {selected_provider}'}, status=400)
             
-            _init_client(api_key, base_url)
-            
-            # Send test prompt
+            # Send test prompt (no retries, so connection problems surface immediately)
             prompt = 'Hello, please respond with "Connection successful!"'
             print(f'Sending test prompt to model {model} at {base_url}')
-            response = client.chat.completions.create(
+            content = get_llm_gateway().chat(
+                [{'role': 'user', 'content': prompt}],
                 model=model,
-                messages=[{'role': 'user', 'content': prompt}],
-                timeout=60
+                api_key=api_key,
+                base_url=base_url,
+                timeout=60,
+                max_retries=0
             )
-            content = response.choices[0].message.content
             return JsonResponse({'success': True, 'response': content})
         except Exception as exc:
             return JsonResponse({'success': False, 'error': str(exc)}, status=500)
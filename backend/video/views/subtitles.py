@@ -11,6 +11,9 @@ import json,copy
 import os
 import time
 from ..tasks import subtitle_task_queue, subtitle_task_status
+from utils.split_subtitle.incremental import count_changed_cues
+from ..services import translation_memory
+from utils.word_store import open_word_store, remove_word_store, word_store_path
 
 def _new_subtitle_task():
     """
@@ -99,16 +102,30 @@ class SubtitleActionView(View):
             # 写入文件
             with open(file_path, 'w', encoding='utf-8') as srt_file:
                 srt_file.write(srt_content)
+            # 上传的字幕通常已合并为句级，不再是词级时间戳；删除转录时写入的词级存储，
+            # 避免 /subtitles/words 继续返回编辑前的时间戳
+            remove_word_store(file_path)
             
             # 更新数据库记录
             video.srt_path = file_name
             video.save()
             
+            # 上传的是原文字幕且已有译文时，统计需要增量重新翻译的句数，供前端提示
+            changed_cues = None
+            if video.translated_srt_path and self.lang == (video.raw_lang or 'en'):
+                translated_path = os.path.abspath(os.path.join(SAVE_DIR, video.translated_srt_path))
+                trans_lang = os.path.splitext(video.translated_srt_path)[0].rsplit('_', 1)[-1]
+                try:
+                    changed_cues = count_changed_cues(srt_content, translated_path, self.lang, trans_lang)
+                except ValueError:
+                    changed_cues = None
+            
             # logger.info(f"Updated subtitles for video {video_id}")
             return JsonResponse({
                 "message": "Subtitles saved and path updated successfully",
                 "path": video.srt_path,
                 "success":True,
+                "translation_changed_cues": changed_cues,
             }, status=201)  # 201 Created 更符合语义
         except Exception as e:
             # logger.error(f"Unexpected error: {str(e)}")
@@ -301,13 +318,17 @@ class SubtitleTranslationAddView(View):
         video_name_list = payload.get('video_name_list')
         target_lang = payload.get('target_lang')
         emphasize_dst = payload.get('emphasize_dst', '')
+        incremental = bool(payload.get('incremental', True))  # 只重新翻译原文改动过的句子
         
         if not video_id_list:
             return JsonResponse({'error': 'Missing "video_id_list" field'}, status=400)
         if not video_name_list:
             return HttpResponseBadRequest('Missing "video_name_list"')
-        if not target_lang or target_lang not in ['zh', 'en', 'jp']:
+        # target_lang 可以是单个语言，也可以是语言列表（一次任务生成多个译文）
+        target_langs = [target_lang] if isinstance(target_lang, str) else target_lang
+        if not target_langs or not isinstance(target_langs, list) or any(lang not in ['zh', 'en', 'jp'] for lang in target_langs):
             return JsonResponse({'error': 'Invalid target language'}, status=400)
+        target_lang = target_langs[0] if len(target_langs) == 1 else list(dict.fromkeys(target_langs))
         
         # 检查所有视频是否存在原始字幕
         for vid in video_id_list:
@@ -327,9 +348,9 @@ class SubtitleTranslationAddView(View):
                 return JsonResponse({'error': f'Video with ID {vid} not found'}, status=404)
         
         # 生成翻译任务
-        return self.enqueue_translation_task(request, video_id_list, video_name_list, target_lang, emphasize_dst)
+        return self.enqueue_translation_task(request, video_id_list, video_name_list, target_lang, emphasize_dst, incremental)
     
-    def enqueue_translation_task(self, request, video_id_list: list, video_name_list: list, target_lang: str, emphasize_dst: str):
+    def enqueue_translation_task(self, request, video_id_list: list, video_name_list: list, target_lang, emphasize_dst: str, incremental: bool = True):
         # 添加仅翻译任务到队列
         for idx, vid in enumerate(video_id_list, start=1):
             title = f"{video_name_list[idx-1]}"
@@ -341,6 +362,7 @@ class SubtitleTranslationAddView(View):
                 "emphasize_dst": emphasize_dst,
                 "video_id": vid,
                 "translation_only": True,  # 标志表示仅翻译模式
+                "incremental": incremental,  # 增量翻译：沿用未改动句子的旧译文
                 "stages": {
                     "transcribe": "Skipped",  # 跳过转录
                     "optimize": "Skipped",    # 跳过优化
@@ -365,4 +387,59 @@ class SubtitleTranslationAddView(View):
             }
             subtitle_task_queue.put(str(vid))
 
-        return JsonResponse({"success": True, "message": f"Translation tasks queued for {len(video_id_list)} videos"})
\ No newline at end of file
+        return JsonResponse({"success": True, "message": f"Translation tasks queued for {len(video_id_list)} videos"})
+
+
+class WordTimingsView(View):
+    """
+    GET /subtitles/words/<video_id>?start=<ms>&end=<ms>
+    从转录时写入的词级存储中返回与时间段重叠的词及其所在句子序号，
+    用于逐词高亮、按时间定位等；未指定时间段时返回全部词
+    """
+    MAX_WORDS = 5000
+
+    def get(self, request, video_id):
+        video = get_object_or_404(Video, pk=video_id)
+        if not video.srt_path:
+            return JsonResponse({"error": "No subtitle for this video"}, status=404)
+        store = open_word_store(word_store_path(os.path.join(SAVE_DIR, video.srt_path)))
+        if store is None:
+            return JsonResponse({"error": "No word timings for this video"}, status=404)
+
+        with store:
+            try:
+                start_ms = int(request.GET.get("start", 0))
+                end_ms = int(request.GET["end"]) if "end" in request.GET else None
+            except ValueError:
+                return JsonResponse({"error": "start/end must be integers (ms)"}, status=400)
+            if end_ms is None:
+                first, last = store.index_at(start_ms), len(store)
+            else:
+                first, last = store.range_between(start_ms, end_ms)
+            last = min(last, first + self.MAX_WORDS)
+
+            texts = store.words(first, last)
+            starts = store.starts[first:last].tolist()
+            ends = store.ends[first:last].tolist()
+            sentence = store.sentence_of(first) if first < last else 0
+            words = []
+            for offset, (text, start, end) in enumerate(zip(texts, starts, ends)):
+                while first + offset >= store.sentences[sentence + 1]:
+                    sentence += 1
+                words.append({"text": text, "start": start, "end": end, "sentence": sentence})
+
+            return JsonResponse({
+                "video_id": video_id,
+                "total_words": len(store),
+                "first_index": first,
+                "words": words,
+            })
+
+
+class TranslationMemoryStatsView(View):
+    """
+    GET /translation_memory/stats
+    返回跨视频翻译记忆的命中统计：查询句数、精确/近似命中数、命中率、条目数等
+    """
+    def get(self, request):
+        return JsonResponse(translation_memory.stats())
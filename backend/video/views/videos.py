@@ -67,6 +67,13 @@ from ..services.audio_processing import (
     get_transcription_audio_path,
     get_video_file_paths,
 )
+from ..services.media_metadata import get_media_info, invalidate as invalidate_media_info
+from ..services.hls_packaging import remove_stream
+from ..services.trickplay import load_index as load_trickplay_index, remove_trickplay
+from ..services.thumbnail_variants import remove_variants as remove_thumbnail_variants, variant_urls
+from utils.split_subtitle.incremental import remove_translation_state
+from utils.srt_io import shift_srt_timestamps
+from utils.word_store import remove_word_store
 
 # 删除视频的缩略图文件  
 def delete_video_thumbnail(video):
@@ -83,6 +90,7 @@ def delete_video_thumbnail(video):
             print(f"Deleted thumbnail: {video.thumbnail_url}")
         else:
             print(f"[WARN] Thumbnail file not found: {thumbnail_path}")
+        remove_thumbnail_variants(video.thumbnail_url)
     except Exception as e:
         print(f"[ERROR] Failed to delete thumbnail {video.thumbnail_url}: {e}")
 
@@ -107,6 +115,7 @@ def delete_all_related_files(video):
                 deleted_files.append(f"{directory_name}/{video.url}")
             else:
                 print(f"[WARN] Main file not found: {file_path}")
+            invalidate_media_info(file_path)
         except Exception as e:
             errors.append(f"Main file deletion failed: {e}")
     
@@ -121,8 +130,16 @@ def delete_all_related_files(video):
                 deleted_files.append(f"thumbnail/{video.thumbnail_url}")
             else:
                 print(f"[WARN] Thumbnail not found: {thumbnail_path}")
+            remove_thumbnail_variants(video.thumbnail_url)
         except Exception as e:
             errors.append(f"Thumbnail deletion failed: {e}")
+
+    # 拖动预览雪碧图
+    if video.url:
+        try:
+            remove_trickplay(video.url)
+        except Exception as e:
+            errors.append(f"Trickplay deletion failed: {e}")
     
     # 3. 删除字幕文件
     if video.srt_path:
@@ -135,6 +152,7 @@ def delete_all_related_files(video):
                 deleted_files.append(f"saved_srt/{video.srt_path}")
             else:
                 print(f"[WARN] SRT file not found: {srt_path}")
+            remove_word_store(srt_path)
         except Exception as e:
             errors.append(f"SRT file deletion failed: {e}")
     
@@ -149,6 +167,7 @@ def delete_all_related_files(video):
                 deleted_files.append(f"saved_srt/{video.translated_srt_path}")
             else:
                 print(f"[WARN] Translated SRT file not found: {translated_srt_path}")
+            remove_translation_state(translated_srt_path)
         except Exception as e:
             errors.append(f"Translated SRT file deletion failed: {e}")
     
@@ -157,15 +176,15 @@ def delete_all_related_files(video):
         try:
             waveform_dir = os.path.join(settings.MEDIA_ROOT, 'waveform_data')
             if os.path.exists(waveform_dir):
-                # 查找匹配基础文件名的波形文件
-                waveform_pattern = f"{base_filename}.json"
-                waveform_path = os.path.join(waveform_dir, waveform_pattern)
-                
-                if os.path.exists(waveform_path):
-                    os.remove(waveform_path)
-                    deleted_files.append(f"waveform_data/{waveform_pattern}")
-                else:
-                    print(f"[WARN] Waveform file not found: {waveform_path}")
+                # 查找匹配基础文件名的波形文件（峰值 JSON 和波形金字塔）
+                for waveform_pattern in (f"{base_filename}.peaks.json", f"{base_filename}.peaks.bin"):
+                    waveform_path = os.path.join(waveform_dir, waveform_pattern)
+
+                    if os.path.exists(waveform_path):
+                        os.remove(waveform_path)
+                        deleted_files.append(f"waveform_data/{waveform_pattern}")
+                    else:
+                        print(f"[WARN] Waveform file not found: {waveform_path}")
         except Exception as e:
             errors.append(f"Waveform file deletion failed: {e}")
     
@@ -199,6 +218,9 @@ def delete_all_related_files(video):
                         if os.path.isfile(stream_path):
                             os.remove(stream_path)
                             deleted_files.append(f"stream_video/{file}")
+                        elif remove_stream(file):
+                            # HLS 目录（含懒加载分片缓存）
+                            deleted_files.append(f"stream_video/{file}/")
         except Exception as e:
             errors.append(f"Stream video deletion failed: {e}")
     
@@ -287,6 +309,7 @@ class VideoDataView(JsonView):
             "id": v.id,
             "name": v.name,
             "thumbnail": f"thumbnail/{v.thumbnail_url}",
+            "thumbnails": variant_urls(v.thumbnail_url),
             "url": v.url,
             "length": v.video_length,
             "last_modified": calc_diff_time(v.last_modified or timezone.now()),
@@ -297,6 +320,7 @@ class VideoDataView(JsonView):
             "id": col.id,
             "name": col.name,
             "thumbnail": f"thumbnail/{col.thumbnail_url}",
+            "thumbnails": variant_urls(col.thumbnail_url),
             "videos": [self.video_json(v) for v in col.videos.all()],
             "last_modified": calc_diff_time(col.last_modified or timezone.now()),
         }
@@ -380,6 +404,7 @@ class LastVideoDataView(JsonView):
             "id": v.id,
             "name": v.name,
             "thumbnail": f"thumbnail/{v.thumbnail_url}",
+            "thumbnails": variant_urls(v.thumbnail_url),
             "url": v.url,
             "length": v.video_length,
             "last_modified": calc_diff_time(v.last_modified if v.last_modified else timezone.now()),
@@ -513,6 +538,8 @@ class VideoActionView(View):
             return self.has_waveform_peaks(request, video_id)
         elif self.action == 'get_dimensions':
             return self.get_dimensions(request, video_id)
+        elif self.action == 'trickplay':
+            return self.trickplay(request, video_id)
 
     def upload(self, request, video_id):
         # 检查是否有文件上传
@@ -853,6 +880,7 @@ class VideoActionView(View):
                     if file_name not in media_urls:
                         # 删除对应的媒体文件
                         os.remove(file_path)
+                        invalidate_media_info(file_path)
                         print(f"Deleted {file_type.rstrip('s')}: {file_path}")
                     
                     # 删除对应的缩略图文件 (提取MD5值)
@@ -1853,6 +1881,28 @@ class VideoActionView(View):
                 'error': str(e)
             }, status=500)
     
+    def trickplay(self, request, video_id):
+        """
+        获取拖动预览雪碧图索引
+        GET /videos/<video_id>/trickplay
+        已生成时返回 JSON 索引（雪碧图与 index.vtt 位于 /media/img/<base_url> 下）；
+        否则排队生成并返回 202 与任务进度
+        """
+        try:
+            video = get_object_or_404(Video, pk=video_id)
+            if not video.url or is_audio_file(video.url):
+                return JsonResponse({'success': False, 'error': 'Not a video file'}, status=400)
+
+            directory_name, _ = get_media_path_info(video.url)
+            index = load_trickplay_index(os.path.join(settings.MEDIA_ROOT, directory_name, video.url))
+            if index is not None:
+                return JsonResponse({'success': True, 'ready': True, 'trickplay': index}, status=200)
+
+            from ..tasks import queue_trickplay
+            return JsonResponse({'success': True, 'ready': False, 'task': queue_trickplay(video_id)}, status=202)
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
     def has_waveform_peaks(self, request, video_id):
         """
         检查视频是否有对应的波形峰值JSON文件
@@ -2094,51 +2144,26 @@ class VideoActionView(View):
                     'error': 'Cannot get dimensions for audio file'
                 }, status=400)
             
-            # 使用 ffprobe 获取视频分辨率
-            import json as json_lib
-            
-            cmd = [
-                'ffprobe',
-                '-v', 'quiet',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=width,height',
-                '-of', 'json',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                data = json_lib.loads(result.stdout)
-                if 'streams' in data and len(data['streams']) > 0:
-                    stream = data['streams'][0]
-                    width = stream.get('width', 1920)
-                    height = stream.get('height', 1080)
-                    
-                    return JsonResponse({
-                        'success': True,
-                        'width': width,
-                        'height': height,
-                        'message': 'Video dimensions retrieved successfully'
-                    })
-                else:
-                    # 没有视频流
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'No video stream found in file'
-                    }, status=400)
-            else:
+            # 分辨率来自媒体元数据缓存（每个文件版本只运行一次 ffprobe）
+            info = get_media_info(video_path)
+            if info is None:
                 return JsonResponse({
                     'success': False,
-                    'error': 'Failed to analyze video file',
-                    'details': result.stderr
+                    'error': 'Failed to analyze video file'
                 }, status=500)
-        
-        except subprocess.TimeoutExpired:
+            if not info.has_video:
+                # 没有视频流
+                return JsonResponse({
+                    'success': False,
+                    'error': 'No video stream found in file'
+                }, status=400)
             return JsonResponse({
-                'success': False,
-                'error': 'Video analysis timed out'
-            }, status=500)
+                'success': True,
+                'width': info.width or 1920,
+                'height': info.height or 1080,
+                'message': 'Video dimensions retrieved successfully'
+            })
+        
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -2539,33 +2564,7 @@ class BatchVideoActionView(View):
     
     def _adjust_subtitle_timestamps(self, subtitle_content, time_offset):
         """Adjust SRT subtitle timestamps by adding time_offset seconds"""
-        import re
-        
-        def adjust_timestamp(match):
-            timestamp = match.group(0)
-            # Parse timestamp format: HH:MM:SS,mmm
-            time_parts = timestamp.replace(',', '.').split(':')
-            hours = int(time_parts[0])
-            minutes = int(time_parts[1])
-            seconds = float(time_parts[2])
-            
-            # Convert to total seconds and add offset
-            total_seconds = hours * 3600 + minutes * 60 + seconds + time_offset
-            
-            # Convert back to timestamp format
-            new_hours = int(total_seconds // 3600)
-            new_minutes = int((total_seconds % 3600) // 60)
-            new_seconds = total_seconds % 60
-            
-            return f"{new_hours:02d}:{new_minutes:02d}:{new_seconds:06.3f}".replace('.', ',')
-        
-        # Regex pattern to match SRT timestamps
-        timestamp_pattern = r'\d{2}:\d{2}:\d{2},\d{3}'
-        
-        # Adjust all timestamps in the subtitle content
-        adjusted_content = re.sub(timestamp_pattern, adjust_timestamp, subtitle_content)
-        
-        return adjusted_content
+        return shift_srt_timestamps(subtitle_content, time_offset)
     
     def _create_concatenated_video_record(self, original_videos, output_name, video_durations):
         """Create a new Video database record for the concatenated video"""
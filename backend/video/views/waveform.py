@@ -1,10 +1,14 @@
-from django.http import JsonResponse, Http404
+from django.http import HttpResponse, JsonResponse, Http404
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 import os
 import json
-from utils.audio.waveform_generator import get_waveform_for_file
+from utils.audio.waveform_generator import get_waveform_for_file, get_waveform_range_for_file
+from .http_cache import cached_json_response, with_content_etag
+
+# 区间查询参数；带任一参数时返回波形金字塔切片，否则返回完整峰值 JSON（旧接口）
+RANGE_PARAMS = ('start', 'end', 'width', 'format')
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -13,6 +17,10 @@ class WaveformAPIView(View):
     为音频文件提供波形峰值数据的API端点
     
     GET /api/waveform/<filename> - 获取指定音频文件的波形数据
+    GET /api/waveform/<filename>?start=&end=&width=&format= - 获取时间区间内适配像素宽度的 min/max 波形
+        start/end: 秒（默认整段），width: 目标像素宽度（默认 1000）
+        format=json（默认）返回 min/max 整数数组（除以 scale 得到振幅）；
+        format=int8 返回原始字节（min、max 交替的 int8），区间信息在 X-Waveform-* 响应头里
     """
     
     def get(self, request, filename):
@@ -23,7 +31,7 @@ class WaveformAPIView(View):
             filename: 音频文件名前缀或完整文件名（不含路径）
             
         Returns:
-            JsonResponse: 包含波形数据的JSON响应
+            JsonResponse: 包含波形数据的JSON响应；带强ETag，客户端缓存未变化时返回304
         """
         try:
             # 解码URL编码的文件名
@@ -38,6 +46,9 @@ class WaveformAPIView(View):
                     'prefix': decoded_filename
                 }, status=404)
             
+            if any(name in request.GET for name in RANGE_PARAMS):
+                return self._range_response(request, actual_filename)
+
             # 获取波形数据
             waveform_data = get_waveform_for_file(actual_filename)
             
@@ -55,7 +66,7 @@ class WaveformAPIView(View):
                 'matched_filename': actual_filename
             }
             
-            return JsonResponse(response_data)
+            return cached_json_response(request, response_data)
             
         except Exception as e:
             return JsonResponse({
@@ -63,6 +74,47 @@ class WaveformAPIView(View):
                 'filename': filename
             }, status=500)
     
+    def _range_response(self, request, filename):
+        """
+        按时间区间和像素宽度从波形金字塔中取出对应层级的切片，只读取所需字节
+        缩放到任意位置都只传输约 width~2*width 个 min/max 对
+        """
+        try:
+            start = float(request.GET.get('start') or 0)
+            end = float(request.GET['end']) if request.GET.get('end') else None
+            width = int(request.GET.get('width') or 1000)
+        except ValueError:
+            return JsonResponse({'error': 'start/end must be seconds and width an integer'}, status=400)
+        output_format = request.GET.get('format', 'json')
+        if output_format not in ('json', 'int8'):
+            return JsonResponse({'error': 'format must be json or int8'}, status=400)
+
+        data = get_waveform_range_for_file(filename, start, end, width)
+        if data is None:
+            return JsonResponse({
+                'error': 'Failed to generate or retrieve waveform data',
+                'filename': filename
+            }, status=404)
+
+        pairs = data.pop('pairs')
+        if output_format == 'int8':
+            response = HttpResponse(pairs.tobytes(), content_type='application/octet-stream')
+            for key in ('duration', 'level', 'bins_per_second', 'start', 'end', 'count'):
+                response[f"X-Waveform-{key.replace('_', '-').title()}"] = str(data[key])
+            response['X-Waveform-Scale'] = '127'
+            response['Access-Control-Expose-Headers'] = ', '.join(
+                f"X-Waveform-{key.replace('_', '-').title()}"
+                for key in ('duration', 'level', 'bins_per_second', 'start', 'end', 'count', 'scale'))
+            return with_content_etag(request, response)
+
+        return cached_json_response(request, {
+            **data,
+            'scale': 127,
+            'min': pairs[:, 0].tolist(),
+            'max': pairs[:, 1].tolist(),
+            'matched_filename': filename,
+        })
+
     def _find_audio_file_by_prefix(self, prefix):
         """
         根据前缀查找音频文件